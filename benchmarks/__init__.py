@@ -0,0 +1 @@
+"""Throughput benchmarks of the processors on synthetic data."""
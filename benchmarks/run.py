@@ -0,0 +1,303 @@
+"""Measure the throughput of the processors on synthetic data.
+
+Context
+-------
+
+A synthetic source (see `benchmarks.synthetic`) is run through the main
+processors in pipeline order, in the same way as the fused runner does it.
+The input of each step is the output of the previous steps, computed
+beforehand, so each step is timed on its own.
+
+Measures
+--------
+
+Each step runs in a forked process, which gives it a clean memory
+high-water mark, and a few times over to keep the fastest run. The results
+are the number of rows per second and the growth of the peak resident
+memory (in MB) while the step runs. The input rows are shared with the
+parent process, so the memory includes the pages copied on write when the
+step touches them.
+
+Baseline
+--------
+
+Results can be saved as a JSON baseline and compared with later runs. A
+step regresses when it is slower, or uses more memory, than the baseline
+by more than the tolerance. The comparison is only meaningful on the same
+machine with the same number of rows.
+
+Usage
+-----
+
+This module supports python3. For help: python3 -m benchmarks.run --help.
+
+"""
+
+import os
+import sys
+import json
+import logging
+import resource
+import traceback
+
+from copy import deepcopy
+from os.path import join, dirname, abspath
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from click import command, option, echo, secho
+
+from benchmarks.synthetic import (
+    FIELD_MAPPING,
+    FUND_ALIASES,
+    NUMBER_FIELDS,
+    DATE_FIELDS,
+    get_datapackage,
+    write_source,
+)
+from common.runner import FUSED_STEPS
+
+BASELINE_FILE = join(dirname(abspath(__file__)), 'baseline.json')
+DEFAULT_NB_ROWS = 20000
+TOLERANCE = 0.2
+# Memory growth below this is noise
+RSS_SLACK_MB = 5
+WARMUP_ROWS = 100
+# Each step is measured several times and the best run is kept
+REPEAT = 3
+INGESTION_FORMATS = ['.csv', '.json', '.xlsx']
+
+
+def set_fiscal_types(datapackage):
+    """Type the number and date fields (as `fiscal.model` does)."""
+
+    for field in datapackage['resources'][0]['schema']['fields']:
+        if field['name'] in NUMBER_FIELDS:
+            field['type'] = 'number'
+        elif field['name'] in DATE_FIELDS:
+            field['type'] = 'date'
+        else:
+            field['type'] = 'string'
+    return datapackage
+
+
+# The steps in pipeline order: (name, parameters, datapackage preparation)
+STEPS = [
+    ('ingest_local_file', {}, None),
+    ('map_values', {
+        'mappings': [{'field': 'Fundusz', 'mapping': FUND_ALIASES}]
+    }, None),
+    ('concatenate', {
+        'fields': {fiscal_name: [header]
+                   for header, fiscal_name in FIELD_MAPPING}
+    }, None),
+    ('reshape_data', {}, None),
+    ('fingerprint_beneficiaries', {'store': False}, None),
+    ('sniff_and_cast', {}, set_fiscal_types),
+    ('currency_convert', {
+        'column': 'total_amount',
+        'currency': 'PLN',
+        'currency-column': 'currency',
+        'date-columns': DATE_FIELDS,
+    }, None),
+    ('validate_values', {
+        'thresholds': {'beneficiary_name': 90, 'funding_period': 90},
+        'allowed_values': {
+            'fund_acronym': ['ERDF', 'ESF', 'CF', 'other'],
+            'funding_period': ['2007-2013', '2014-2020'],
+        },
+        'profile-file': 'fiscal.profile.json',
+    }, None),
+]
+
+
+def run_step(name, parameters, datapackage, rows):
+    """Run a step and return the datapackage and the output rows."""
+
+    resources = [iter(rows)] if rows is not None else []
+    datapackage, resources = FUSED_STEPS[name](deepcopy(parameters),
+                                               deepcopy(datapackage),
+                                               resources)
+    return datapackage, [row for resource in resources for row in resource]
+
+
+def _measure(name, parameters, datapackage, rows):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = perf_counter()
+    _, output = run_step(name, parameters, datapackage, rows)
+    seconds = perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        'rows': len(output),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(len(output) / seconds) if seconds else None,
+        # Linux reports kilobytes
+        'peak_rss_mb': round((after - before) / 1024, 1),
+    }
+
+
+def measure(name, parameters, datapackage, rows):
+    """Time a step in a forked process and return its measures."""
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        os.close(read_end)
+        try:
+            result = _measure(name, parameters, datapackage, rows)
+        except Exception:
+            result = {'error': traceback.format_exc()}
+        with os.fdopen(write_end, 'w') as stream:
+            json.dump(result, stream)
+        os._exit(0)
+
+    os.close(write_end)
+    with os.fdopen(read_end) as stream:
+        result = json.loads(stream.read() or '{"error": "no result"}')
+    os.waitpid(pid, 0)
+    if 'error' in result:
+        raise RuntimeError('{} failed:\n{}'.format(name, result['error']))
+    return result
+
+
+def measure_best(name, parameters, datapackage, rows, repeat=REPEAT):
+    """Return the fastest of several measures of a step."""
+
+    results = [measure(name, parameters, datapackage, rows)
+               for _ in range(repeat)]
+    return max(results, key=lambda result: result['rows_per_second'] or 0)
+
+
+def run_benchmarks(nb_rows, folder, names=None, repeat=REPEAT):
+    """Return the measures of each step (keyed by name).
+
+    Ingestion is measured for each file format, as `ingest_local_file
+    [.csv]` for example, and the CSV file feeds the next steps.
+
+    :param folder: the working folder for the files of the benchmarks
+    :param names: the steps to measure (all by default)
+    :param repeat: the number of measures per step (the best is kept)
+
+    """
+
+    results = {}
+    paths = {}
+    for extension in INGESTION_FORMATS:
+        paths[extension] = join(folder, 'synthetic' + extension)
+        write_source(nb_rows, paths[extension])
+
+    if not names or 'ingest_local_file' in names:
+        for extension, path in paths.items():
+            key = 'ingest_local_file[{}]'.format(extension)
+            results[key] = measure_best('ingest_local_file', {},
+                                        get_datapackage(path), None, repeat)
+
+    datapackage, rows = get_datapackage(paths['.csv']), None
+    remaining = {name for name, _, _ in STEPS
+                 if not names or name in names} - {'ingest_local_file'}
+
+    for name, parameters, prepare in STEPS:
+        if not remaining:
+            break
+        if prepare:
+            datapackage = prepare(datapackage)
+
+        if name in remaining:
+            # Load the lazy caches (schemas, rates...) outside the timing
+            run_step(name, parameters, datapackage,
+                     deepcopy(rows[:WARMUP_ROWS]))
+            results[name] = measure_best(name, parameters, datapackage, rows,
+                                         repeat)
+            remaining.remove(name)
+
+        datapackage, rows = run_step(name, parameters, datapackage, rows)
+
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Return the regressions of the results against the baseline."""
+
+    regressions = []
+    for name, result in sorted(results.items()):
+        reference = baseline.get(name)
+        if not reference:
+            continue
+
+        speed, reference_speed = (result['rows_per_second'],
+                                  reference['rows_per_second'])
+        if speed and reference_speed:
+            if speed < reference_speed * (1 - tolerance):
+                regressions.append(
+                    '{}: {} rows/s (baseline {} rows/s)'.format(
+                        name, speed, reference_speed)
+                )
+
+        rss, reference_rss = result['peak_rss_mb'], reference['peak_rss_mb']
+        if rss > reference_rss * (1 + tolerance) + RSS_SLACK_MB:
+            regressions.append(
+                '{}: {} MB peak RSS (baseline {} MB)'.format(
+                    name, rss, reference_rss)
+            )
+
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    with open(path) as stream:
+        return json.load(stream)
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    with open(path, 'w') as stream:
+        json.dump(results, stream, indent=4, sort_keys=True)
+        stream.write('\n')
+
+
+@command()
+@option('--rows', default=DEFAULT_NB_ROWS, help='The size of the source.')
+@option('--only', multiple=True, help='Only measure these steps.')
+@option('--baseline', default=BASELINE_FILE, help='The baseline JSON file.')
+@option('--save', is_flag=True, help='Save the results as the baseline.')
+@option('--repeat', default=REPEAT, help='The number of runs per step.')
+@option('--tolerance', default=TOLERANCE, help='The allowed slowdown.')
+@option('--verbose', is_flag=True, help='Show the logs of the processors.')
+def main(rows, only, baseline, save, repeat, tolerance, verbose):
+    """Benchmark the processors and compare them with the baseline."""
+
+    if not verbose:
+        logging.disable(logging.WARNING)
+
+    current_directory = os.getcwd()
+    with TemporaryDirectory() as folder:
+        try:
+            os.chdir(folder)
+            results = run_benchmarks(rows, folder, only, repeat)
+        finally:
+            os.chdir(current_directory)
+
+    for name, result in results.items():
+        echo('{:<30} {:>10} rows/s {:>8} MB'.format(
+            name, result['rows_per_second'], result['peak_rss_mb']))
+
+    if save:
+        save_baseline(results, baseline)
+        secho('Saved the baseline to {}'.format(baseline), fg='blue')
+        return
+
+    try:
+        regressions = compare(results, load_baseline(baseline), tolerance)
+    except IOError:
+        secho('No baseline found at {}'.format(baseline), fg='yellow')
+        return
+
+    for regression in regressions:
+        secho(regression, fg='red', bold=True)
+    if regressions:
+        sys.exit(1)
+    secho('No regression', fg='blue')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Generate synthetic source files that look like real beneficiary lists.
+
+Context
+-------
+
+The unit-tests feed the processors a handful of hand-written rows, which
+says nothing about throughput. The benchmarks need source files of any size
+with the quirks that make real ones slow or fragile to process:
+
+    * windows-1250 encoding and `;` delimiters (CSV files)
+    * numbers with a dot as thousands separator and a decimal comma
+    * several date formats within the same column
+    * beneficiary names repeated many times (with a long tail of one-offs)
+
+Rows are generated from a seed, so the same size always gives the same data.
+
+"""
+
+import csv
+import json
+import random
+
+from datetime import date, timedelta
+
+# The headers of the synthetic source and the fiscal fields they map to
+FIELD_MAPPING = [
+    ('Beneficjent', 'beneficiary_name'),
+    ('Tytuł projektu', 'project_name'),
+    ('Kod pocztowy', 'beneficiary_postal_code'),
+    ('Miejscowość', 'beneficiary_city'),
+    ('Fundusz', 'fund_acronym'),
+    ('Okres programowania', 'funding_period'),
+    ('Wartość ogółem', 'total_amount'),
+    ('Dofinansowanie UE', 'eu_cofinancing_amount'),
+    ('Data rozpoczęcia', 'starting_date'),
+    ('Data zakończenia', 'completion_date'),
+]
+HEADERS = [header for header, _ in FIELD_MAPPING]
+
+FUND_ALIASES = {'ERDF': ['EFRR'], 'ESF': ['EFS'], 'CF': ['FS']}
+NUMBER_FIELDS = ['total_amount', 'eu_cofinancing_amount']
+DATE_FIELDS = ['starting_date', 'completion_date']
+DATE_FORMATS = ['%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y']
+ENCODING = 'windows-1250'
+DELIMITER = ';'
+
+# One name out of this many is drawn from the long tail
+NB_FREQUENT_NAMES = 500
+TAIL_RATIO = 10
+
+_CITIES = ['Kraków', 'Łódź', 'Wrocław', 'Poznań', 'Gdańsk', 'Szczecin',
+           'Bydgoszcz', 'Lublin', 'Białystok', 'Katowice', 'Rzeszów']
+_PREFIXES = ['Gmina', 'Powiat', 'Uniwersytet', 'Przedsiębiorstwo',
+             'Fundacja', 'Stowarzyszenie', 'Zakład', 'Spółdzielnia']
+_SUFFIXES = ['Sp. z o.o.', 'S.A.', 'sp. j.', '', '', '']
+_WORDS = ['rozwój', 'budowa', 'modernizacja', 'infrastruktury', 'drogowej',
+          'szkolenia', 'innowacji', 'przedsiębiorstw', 'ochrony', 'środowiska',
+          'energii', 'odnawialnej', 'zatrudnienia', 'młodzieży', 'wsparcie']
+
+
+def format_number(value):
+    """Format a number like 1.234.567,89."""
+
+    integer, decimals = '{:.2f}'.format(value).split('.')
+    groups = []
+    while integer:
+        groups.insert(0, integer[-3:])
+        integer = integer[:-3]
+    return '.'.join(groups) + ',' + decimals
+
+
+def _make_name(random_):
+    name = '{} {} {}'.format(random_.choice(_PREFIXES),
+                             random_.choice(_CITIES),
+                             random_.randint(1, 10 ** 6))
+    suffix = random_.choice(_SUFFIXES)
+    return name + ' ' + suffix if suffix else name
+
+
+def generate_rows(nb_rows, seed=0):
+    """Return a generator of source rows (dicts of strings)."""
+
+    random_ = random.Random(seed)
+    frequent_names = [_make_name(random_) for _ in range(NB_FREQUENT_NAMES)]
+    start = date(2007, 1, 1)
+
+    for _ in range(nb_rows):
+        if random_.randrange(TAIL_RATIO):
+            # Zipf-like: the first names come up much more often
+            index = int(random_.paretovariate(1.2)) - 1
+            name = frequent_names[index % NB_FREQUENT_NAMES]
+        else:
+            name = _make_name(random_)
+
+        total = random_.lognormvariate(11, 2)
+        starting_date = start + timedelta(days=random_.randrange(4000))
+        completion_date = starting_date + timedelta(
+            days=random_.randrange(30, 1500))
+        date_format = random_.choice(DATE_FORMATS)
+        fund = random_.choice(list(FUND_ALIASES))
+
+        yield {
+            'Beneficjent': name,
+            'Tytuł projektu': ' '.join(random_.sample(_WORDS, 5)).capitalize(),
+            'Kod pocztowy': '{:02d}-{:03d}'.format(random_.randrange(100),
+                                                   random_.randrange(1000)),
+            'Miejscowość': random_.choice(_CITIES),
+            'Fundusz': random_.choice(FUND_ALIASES[fund]),
+            'Okres programowania': ('2007-2013'
+                                    if starting_date.year < 2014
+                                    else '2014-2020'),
+            'Wartość ogółem': format_number(total),
+            'Dofinansowanie UE': format_number(total * 0.85),
+            'Data rozpoczęcia': starting_date.strftime(date_format),
+            'Data zakończenia': completion_date.strftime(date_format),
+        }
+
+
+def write_csv(rows, path):
+    with open(path, 'w', encoding=ENCODING, newline='') as stream:
+        writer = csv.DictWriter(stream, HEADERS, delimiter=DELIMITER)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(rows, path):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(list(rows), stream, ensure_ascii=False)
+
+
+def write_xlsx(rows, path):
+    # Only needed to generate Excel files
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADERS)
+    for row in rows:
+        sheet.append([row[header] for header in HEADERS])
+    workbook.save(path)
+
+
+WRITERS = {
+    '.csv': write_csv,
+    '.json': write_json,
+    '.xlsx': write_xlsx,
+}
+
+
+def write_source(nb_rows, path, seed=0):
+    """Write a source file (the format follows the extension)."""
+
+    for extension, writer in WRITERS.items():
+        if path.endswith(extension):
+            return writer(generate_rows(nb_rows, seed), path)
+    raise ValueError('Unknown file format: {}'.format(path))
+
+
+def get_datapackage(path):
+    """Return the datapackage of a source file, like `read_description`."""
+
+    resource = {
+        'name': 'synthetic',
+        'path': path,
+        'currency_code': 'PLN',
+        'schema': {'fields': [{'name': header} for header in HEADERS]},
+    }
+    if path.endswith('.csv'):
+        resource['parser_options'] = {'delimiter': DELIMITER}
+    return {'name': 'synthetic', 'resources': [resource]}
@@ -26,13 +26,15 @@
 
 import re
 import os
+import json
 import yaml
 
 # noinspection PyPackageRequirements
 from click import BadParameter
-from pandas import DataFrame
 from collections import Counter
 from copy import deepcopy
+from functools import lru_cache
+from multiprocessing import Pool
 from shutil import copyfile
 from jsonschema import FormatChecker
 from petl import fromdicts, look, sort, cut
@@ -46,8 +48,10 @@ from datetime import datetime
 from click import (command, secho, echo, option,
                    pass_context, group, Choice, argument)
 
-from common.metrics import Snapshot
-from common.utilities import get_fiscal_field_names, processor_names, GEOCODES
+from common.metrics import Snapshot, get_db_engine
+from common.descriptions import load_yaml, get_validation_errors
+from common.geocodes import get_registry
+from common.utilities import get_fiscal_field_names, get_available_processors
 from common.config import (
     PIPELINE_FILE,
     SOURCE_FILE,
@@ -60,11 +64,11 @@ from common.config import (
     PROCESSORS_DIR,
     SCRAPER_FILE,
     DESCRIPTION_SCHEMA_FILE,
-    DB_ENGINE,
     DATAPACKAGE_MUTATOR,
     DROPBOX_DIR,
     SOURCE_ZIP,
-    ROOT_DIR, SOURCE_DB, FISCAL_ZIP_FILE
+    ROOT_DIR, SOURCE_DB, FISCAL_ZIP_FILE, FISCAL_PARQUET_DIR,
+    BOOTSTRAP_WORKERS
 )
 
 
@@ -73,6 +77,20 @@ WARN = dict(fg='yellow')
 SUCCESS = dict(fg='blue')
 COUNTRY = re.compile(r'/data/([A-Z]{2})\.')
 NUTS = re.compile(r'([A-Z\d]{2,}\.[a-z]+)')
+PROCESSOR_NAMES = get_available_processors()
+
+
+@lru_cache(maxsize=1)
+def get_description_validator():
+    """Return the description validator (compiled once per process)."""
+
+    with open(DESCRIPTION_SCHEMA_FILE) as stream:
+        description_schema = json.load(stream)
+
+    return Draft4Validator(
+        description_schema,
+        format_checker=FormatChecker()
+    )
 
 
 class Source(object):
@@ -223,6 +241,14 @@ class Source(object):
         if exists(filepath):
             return filepath
 
+    @property
+    def fiscal_parquet_dir(self):
+        """Return the partitioned Parquet copy of the fiscal data."""
+
+        path = join(self.folder, FISCAL_PARQUET_DIR)
+        if exists(path):
+            return path
+
     @property
     def scraper_required(self):
         """Whether a pdf or web scraper is needed."""
@@ -361,8 +387,7 @@ class Source(object):
 
     def _read_description(self):
         try:
-            with open(join(self.folder, SOURCE_FILE)) as stream:
-                description = yaml.load(stream)
+            description = load_yaml(join(self.folder, SOURCE_FILE))
             self.validation_status = 'loaded'
             return description
 
@@ -372,30 +397,23 @@ class Source(object):
 
     def _read_pipeline_spec(self):
         try:
-            with open(join(self.folder, PIPELINE_FILE)) as stream:
-                pipeline = yaml.load(stream)
-                self.pipeline_status = 'up'
-                return pipeline
+            pipeline = load_yaml(join(self.folder, PIPELINE_FILE))
+            self.pipeline_status = 'up'
+            return pipeline
 
         except FileNotFoundError:
             return {}
 
     def _validate(self):
         if self.description:
-            with open(DESCRIPTION_SCHEMA_FILE) as stream:
-                description_schema = yaml.load(stream)
-
-            validator = Draft4Validator(
-                description_schema,
-                format_checker=FormatChecker()
+            self.validation_errors = get_validation_errors(
+                self.description,
+                get_description_validator(),
+                DESCRIPTION_SCHEMA_FILE
             )
-            if validator.is_valid(self.description):
+            if not self.validation_errors:
                 self.validation_status = 'valid'
 
-            errors = validator.iter_errors(self.description)
-            messages = [error.message for error in errors]
-            self.validation_errors = sorted(messages)
-
     def _get_extractor(self):
         if self.scraper_required:
             return self._scraper_module()
@@ -419,9 +437,7 @@ class Source(object):
 
     @staticmethod
     def _lookup_geocode(nuts_code):
-        for info in GEOCODES:
-            if info['NUTS-Code'] == nuts_code:
-                return info['Description']
+        return get_registry().describe(nuts_code)
 
     def __lt__(self, other):
         return self.id < other.id
@@ -438,6 +454,8 @@ class Source(object):
 def dump_database(ctx):
     """Dump a flat database of all the sources, one field per line.."""
 
+    from pandas import DataFrame
+
     mappings = DataFrame()
 
     for source in ctx.obj['sources']:
@@ -601,9 +619,9 @@ def validate_descriptions(ctx):
 
 @command(name='pipeline')
 @argument('action', type=Choice(('insert', 'remove')), required=True)
-@argument('processor', type=Choice(processor_names), required=True)
-@option('--before', type=Choice(processor_names))
-@option('--after', type=Choice(processor_names))
+@argument('processor', type=Choice(PROCESSOR_NAMES), required=True)
+@option('--before', type=Choice(PROCESSOR_NAMES))
+@option('--after', type=Choice(PROCESSOR_NAMES))
 @option('--parameter', type=(str, str), nargs=2, multiple=True)
 @pass_context
 def modify_pipeline(ctx, action, processor, before, after, parameter):
@@ -646,15 +664,37 @@ def modify_pipeline(ctx, action, processor, before, after, parameter):
         secho(message.format(source.id), **SUCCESS)
 
 
-def collect_sources(select=None, **kwargs):
-    """Return a sorted list of sources."""
+def _create_source(arguments):
+    pipeline_id, kwargs = arguments
+    return Source(pipeline_id, **kwargs)
+
+
+def collect_sources(select=None, workers=BOOTSTRAP_WORKERS, **kwargs):
+    """Return a sorted list of sources.
+
+    Sources are created in a pool of worker processes (because parsing
+    description files is slow) and get the database session afterwards.
 
-    sources = []
+    """
+
+    db_session = kwargs.pop('db_session', None)
+    pipeline_ids = []
     for folder, _, filenames in os.walk(DATA_DIR):
         if SOURCE_FILE in filenames:
-            subfolder = folder.replace(DATA_DIR + '/', '')
-            source = Source(subfolder, **kwargs)
-            sources.append(source)
+            pipeline_ids.append(folder.replace(DATA_DIR + '/', ''))
+
+    # Workers inherit the compiled validator
+    get_description_validator()
+    tasks = [(pipeline_id, kwargs) for pipeline_id in pipeline_ids]
+
+    if workers == 1 or len(tasks) < 2:
+        sources = list(map(_create_source, tasks))
+    else:
+        with Pool(workers) as pool:
+            sources = pool.map(_create_source, tasks)
+
+    for source in sources:
+        source.db_session = db_session
 
     if not select:
         return sorted(sources)
@@ -684,7 +724,7 @@ def main(ctx, select):
     ctx.obj['sources'] = collect_sources(
         select=select,
         timestamp=datetime.now(),
-        db_session=sessionmaker(bind=DB_ENGINE)()
+        db_session=sessionmaker(bind=get_db_engine())()
     )
 
 
@@ -0,0 +1,51 @@
+"""Pickle objects built from files, next to a hash of those files."""
+
+import os
+import pickle
+import logging
+
+from hashlib import sha1
+from os.path import dirname
+
+
+def hash_files(paths):
+    """Return a hash of the contents of the files (in the given order)."""
+
+    hash_ = sha1()
+    for path in paths:
+        with open(path, 'rb') as stream:
+            hash_.update(stream.read())
+    return hash_.hexdigest()
+
+
+def load_or_build(paths, cache_file, build):
+    """Return `build()` or its cached value if the files have not changed.
+
+    :param paths: the files that `build` reads
+    :param cache_file: where to pickle the value
+    :param build: a function without arguments
+
+    """
+
+    hash_ = hash_files(paths)
+
+    try:
+        with open(cache_file, 'rb') as stream:
+            cached_hash, value = pickle.load(stream)
+        if cached_hash == hash_:
+            return value
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+        pass
+
+    value = build()
+
+    try:
+        os.makedirs(dirname(cache_file), exist_ok=True)
+        temporary_file = '{}.{}'.format(cache_file, os.getpid())
+        with open(temporary_file, 'wb') as stream:
+            pickle.dump((hash_, value), stream, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file, cache_file)
+    except OSError as error:
+        logging.warning('Could not save %s: %s', cache_file, error)
+
+    return value
@@ -0,0 +1,335 @@
+"""Write and read the fiscal data as a partitioned Parquet dataset.
+
+Context
+-------
+
+Each source pipeline ends by zipping its fiscal data as CSV, and the EU
+pipelines used to parse all of those files again as text. The columnar
+copy is written next to the zip file, so that the EU concatenation (and
+any downstream analysis) can read only the columns it needs and skip
+whole partitions without parsing anything.
+
+Layout
+------
+
+The dataset is a folder of Parquet files, partitioned the hive way:
+
+    fiscal.parquet/beneficiary_country_code=AT/funding_period=2014-2020/
+        part-0.parquet
+
+Partition columns are not stored in the files. Missing values get their
+own partition (see `NULL_PARTITION`). Strings are dictionary-encoded,
+which suits the many repeated codes, names and labels of the fiscal data.
+Columns are typed after the fiscal datapackage: numbers become decimals
+(with `PARQUET_DECIMAL_SCALE` digits after the point, so amounts stay
+exact), dates become dates and empty values become nulls. A value that
+does not fit its type stops the writer with an error naming the column
+and the row, rather than being dropped.
+
+Dependencies
+------------
+
+The module needs `pyarrow`, which is an optional dependency. It is only
+imported when a dataset is written or read, so the processors keep their
+start-up time.
+
+"""
+
+import os
+import logging
+
+from collections import Counter
+from datetime import date, datetime
+from decimal import Context, Decimal
+from shutil import rmtree
+from urllib.parse import quote, unquote
+from os.path import join, exists
+
+from common.config import (
+    PARTITION_FIELDS,
+    PARQUET_ROW_GROUP_SIZE,
+    PARQUET_DECIMAL_PRECISION,
+    PARQUET_DECIMAL_SCALE
+)
+
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+_DECIMAL_CONTEXT = Context(prec=PARQUET_DECIMAL_PRECISION)
+_DECIMAL_QUANTUM = Decimal(1).scaleb(-PARQUET_DECIMAL_SCALE)
+
+
+def has_pyarrow():
+    """Whether the optional pyarrow dependency is installed."""
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _to_decimal(value):
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if isinstance(value, float):
+        # The shortest repr is the number that was parsed
+        value = repr(value)
+    number = Decimal(value)
+    if not number.is_finite():
+        raise ValueError('{} is not a finite number'.format(value))
+    exact = number.quantize(_DECIMAL_QUANTUM, context=_DECIMAL_CONTEXT)
+    if exact != number:
+        raise ValueError('{} has more than {} decimals'
+                         .format(value, PARQUET_DECIMAL_SCALE))
+    return exact
+
+
+def _to_int(value):
+    return int(value)
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    raise TypeError(value)
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    raise TypeError(value)
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    raise TypeError(value)
+
+
+def _to_str(value):
+    return str(value)
+
+
+def _get_arrow_type(type_):
+    """Return the arrow type and the converter of a datapackage type."""
+
+    import pyarrow as pa
+
+    types = {
+        'number': (pa.decimal128(PARQUET_DECIMAL_PRECISION,
+                                 PARQUET_DECIMAL_SCALE), _to_decimal),
+        'integer': (pa.int64(), _to_int),
+        'date': (pa.date32(), _to_date),
+        'datetime': (pa.timestamp('us'), _to_datetime),
+        'boolean': (pa.bool_(), _to_bool),
+    }
+    return types.get(type_, (pa.string(), _to_str))
+
+
+def _get_partition(value):
+    if value is None or value == '':
+        return NULL_PARTITION
+    return quote(str(value), safe='')
+
+
+class ParquetDatasetWriter(object):
+    """Write rows into a partitioned Parquet dataset.
+
+    Rows are buffered per partition and written in row groups. The dataset
+    is written to a temporary folder, which replaces `path` on `close`, so
+    an interrupted run never leaves a partial dataset behind.
+
+    :param path: the path to the dataset folder
+    :param fields: the datapackage fields of the rows
+    :param partition_by: the names of the partition columns
+    :param row_group_size: the number of rows per row group
+
+    """
+
+    def __init__(self, path, fields,
+                 partition_by=PARTITION_FIELDS,
+                 row_group_size=PARQUET_ROW_GROUP_SIZE):
+        import pyarrow as pa
+
+        self.path = path
+        self.partition_by = [name for name in partition_by
+                             if name in {field['name'] for field in fields}]
+        self.row_group_size = row_group_size
+        self.nb_rows = 0
+        self._nb_part_rows = Counter()
+
+        columns = [field for field in fields
+                   if field['name'] not in self.partition_by]
+        self._names = [field['name'] for field in columns]
+        arrow_types = [_get_arrow_type(field.get('type')) for field in columns]
+        self._converters = [converter for _, converter in arrow_types]
+        self._schema = pa.schema([(name, arrow_type)
+                                  for name, (arrow_type, _)
+                                  in zip(self._names, arrow_types)])
+
+        self._temporary_path = path + '.tmp'
+        if exists(self._temporary_path):
+            rmtree(self._temporary_path)
+        self._buffers = {}
+        self._writers = {}
+
+    def write(self, row, part=0):
+        """Add a row (a dict) to the dataset.
+
+        :param part: the number of the file in the partition (one per
+            resource)
+
+        :raises: `ValueError` if a value does not fit the type of its column
+
+        """
+
+        self._nb_part_rows[part] += 1
+        values = [self._convert(row.get(name), name, converter, part)
+                  for name, converter in zip(self._names, self._converters)]
+
+        key = tuple(_get_partition(row.get(name))
+                    for name in self.partition_by), part
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = [[] for _ in self._names]
+
+        for column, value in zip(buffer, values):
+            column.append(value)
+
+        self.nb_rows += 1
+        if len(buffer[0]) >= self.row_group_size:
+            self._flush(key)
+
+    def _convert(self, value, name, converter, part):
+        if value is None or value == '':
+            return None
+        try:
+            return converter(value)
+        except (TypeError, ValueError, ArithmeticError) as error:
+            message = ('Cannot write {!r} in the {} column '
+                       '(row {} of resource {}): {}')
+            raise ValueError(message.format(value, name,
+                                            self._nb_part_rows[part],
+                                            part, error)) from error
+
+    def _flush(self, key):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        buffer = self._buffers.pop(key)
+        if not buffer[0]:
+            return
+
+        arrays = [pa.array(values, type=field.type)
+                  for values, field in zip(buffer, self._schema)]
+        table = pa.Table.from_arrays(arrays, schema=self._schema)
+
+        if key not in self._writers:
+            partitions, part = key
+            folder = join(self._temporary_path, *[
+                '{}={}'.format(name, value)
+                for name, value in zip(self.partition_by, partitions)
+            ])
+            os.makedirs(folder, exist_ok=True)
+            filepath = join(folder, 'part-{}.parquet'.format(part))
+            self._writers[key] = pq.ParquetWriter(filepath, self._schema,
+                                                  use_dictionary=True)
+        self._writers[key].write_table(table)
+
+    def close(self):
+        """Write the remaining rows and move the dataset into place."""
+
+        for key in list(self._buffers):
+            self._flush(key)
+        for writer in self._writers.values():
+            writer.close()
+
+        os.makedirs(self._temporary_path, exist_ok=True)
+        if exists(self.path):
+            rmtree(self.path)
+        os.rename(self._temporary_path, self.path)
+
+        logging.info('Wrote %s rows in %s partitions to %s',
+                     self.nb_rows, len(self._writers), self.path)
+
+    def abort(self):
+        """Drop the dataset being written."""
+
+        for writer in self._writers.values():
+            writer.close()
+        if exists(self._temporary_path):
+            rmtree(self._temporary_path)
+
+
+def _get_filter(filters):
+    """Return a dataset expression from a list of (column, op, value)."""
+
+    import pyarrow.dataset as ds
+
+    operators = {
+        '=': lambda field, value: field == value,
+        '==': lambda field, value: field == value,
+        '!=': lambda field, value: field != value,
+        '<': lambda field, value: field < value,
+        '<=': lambda field, value: field <= value,
+        '>': lambda field, value: field > value,
+        '>=': lambda field, value: field >= value,
+        'in': lambda field, value: field.isin(list(value)),
+    }
+
+    expression = None
+    for column, operator, value in filters:
+        if operator not in operators:
+            raise ValueError('Unknown filter operator: {}'.format(operator))
+        condition = operators[operator](ds.field(column), value)
+        if expression is None:
+            expression = condition
+        else:
+            expression = expression & condition
+    return expression
+
+
+def open_dataset(path, partition_by=PARTITION_FIELDS):
+    """Return the pyarrow dataset of a folder written by the writer."""
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(
+        pa.schema([(name, pa.string()) for name in partition_by]),
+        flavor='hive'
+    )
+    return ds.dataset(path, format='parquet', partitioning=partitioning)
+
+
+def read_dataset(path, columns=None, filters=None,
+                 partition_by=PARTITION_FIELDS):
+    """Return the rows (dicts) of a partitioned Parquet dataset.
+
+    Only the given columns are read, and partitions (or row groups) that
+    cannot match the filters are skipped.
+
+    :param columns: the names of the columns to read (all by default)
+    :param filters: a list of (column, operator, value) conditions, all of
+        which must hold, with operators =, !=, <, <=, >, >= or in
+
+    """
+
+    dataset = open_dataset(path, partition_by)
+    if columns is not None:
+        names = set(dataset.schema.names)
+        columns = [column for column in columns if column in names]
+    expression = _get_filter(filters) if filters else None
+
+    partition_columns = set(partition_by)
+    for batch in dataset.to_batches(columns=columns, filter=expression):
+        data = batch.to_pydict()
+        for name in partition_columns & set(data):
+            data[name] = [None if value in (None, NULL_PARTITION)
+                          else unquote(value)
+                          for value in data[name]]
+        names = list(data)
+        for values in zip(*data.values()):
+            yield dict(zip(names, values))
@@ -1,7 +1,6 @@
 """Pipeline configuration parameters."""
 
 from os.path import dirname, abspath, join
-from sqlalchemy import create_engine
 
 OS_TYPES_URL = ('https://raw.githubusercontent.com/'
                 'openspending/os-types/master/src/os-types.json')
@@ -13,8 +12,21 @@ STATUS_FILE = 'pipeline-status.json'
 SCRAPER_FILE = 'scraper.py'
 SOURCE_ZIP = 'source.datapackage.zip'
 FISCAL_ZIP_FILE = 'fiscal.datapackage.zip'
+FISCAL_PARQUET_DIR = 'fiscal.parquet'
+PROFILE_FILE = 'fiscal.profile.json'
 SOURCE_DB = 'source.db.xlsx'
 DATAPACKAGE_FILE = 'datapackage.json'
+STAGE_CACHE_DIR = '.stages'
+# Subprocess steps that only transform their input (so they can be cached)
+CACHED_SUBPROCESS_STEPS = ['fiscal.model']
+# Fused steps that write files (so they run every time), unless their
+# parameters turn the files off (see `common.runner.writes_files`)
+OUTPUT_STEPS = [
+    'dump_to_parquet',
+    'currency_convert',
+    'validate_values',
+    'fingerprint_beneficiaries',
+]
 
 ROOT_DIR = abspath(join(dirname(__file__), '..'))
 DATA_DIR = join(ROOT_DIR, 'data')
@@ -22,6 +34,7 @@ SPECIFICATIONS_DIR = join(ROOT_DIR, 'specifications')
 PROCESSORS_DIR = join(ROOT_DIR, 'common', 'processors')
 CODELISTS_DIR = join(ROOT_DIR, 'codelists')
 DROPBOX_DIR = join(ROOT_DIR, 'dropbox')
+CACHE_DIR = join(ROOT_DIR, '.cache')
 
 GEOCODES_FILE = join(ROOT_DIR, 'geography', 'geocodes.nuts.csv')
 FISCAL_SCHEMA_FILE = join(SPECIFICATIONS_DIR, 'fiscal.schema.yaml')
@@ -30,6 +43,14 @@ FISCAL_METADATA_FILE = join(SPECIFICATIONS_DIR, 'fiscal.metadata.yaml')
 DEFAULT_PIPELINE_FILE = join(SPECIFICATIONS_DIR, 'default-pipeline-spec.yaml')
 TEMPLATE_SCRAPER_FILE = join(PROCESSORS_DIR, 'scraper_template.py')
 DESCRIPTION_SCHEMA_FILE = join(SPECIFICATIONS_DIR, 'source.schema.json')
+ENCODING_CACHE_FILE = join(CACHE_DIR, 'encodings.json')
+DESCRIPTION_CACHE_FILE = join(CACHE_DIR, 'descriptions.sqlite')
+GEOCODES_CACHE_FILE = join(CACHE_DIR, 'geocodes.pickle')
+FISCAL_SCHEMA_CACHE_FILE = join(CACHE_DIR, 'fiscal.schema.pickle')
+FINGERPRINT_STORE_FILE = join(CACHE_DIR, 'fingerprints.sqlite')
+RATES_STORE_FILE = join(CACHE_DIR, 'rates.sqlite')
+CONCATENATION_CACHE_DIR = join(CACHE_DIR, 'concatenation')
+CURRENCIES_FILE = join(PROCESSORS_DIR, 'currencies.json')
 TEMPLATE_SOURCE_FILE = join(SPECIFICATIONS_DIR, SOURCE_FILE)
 
 LOCAL_PATH_EXTRACTOR = 'ingest_local_file'
@@ -37,13 +58,26 @@ REMOTE_CSV_EXTRACTOR = 'simple_remote_source'
 REMOTE_EXCEL_EXTRACTOR = 'stream_remote_excel'
 DATAPACKAGE_MUTATOR = 'mutate_datapackage'
 
-DB_URI = 'sqlite:///{}/metrics.sqlite'
-DB_ENGINE = create_engine(DB_URI.format(ROOT_DIR))
+DB_URI = 'sqlite:///{}/metrics.sqlite'.format(ROOT_DIR)
 
 VERBOSE = False
 LOG_SAMPLE_SIZE = 15
+BLOCK_SIZE = 1000
+PARALLEL_QUEUE_SIZE = 64
+INGESTION_WORKERS = None  # one per CPU
+BOOTSTRAP_WORKERS = None  # one per CPU
+CONCATENATION_WORKERS = None  # one per CPU
+FINGERPRINT_CACHE_SIZE = 2 ** 16
+PROFILE_TOP_K = 10
+PARQUET_ROW_GROUP_SIZE = 2 ** 16
+PARQUET_DECIMAL_PRECISION = 38
+PARQUET_DECIMAL_SCALE = 6
+PARTITION_FIELDS = ['beneficiary_country_code', 'funding_period']
 JSON_FORMAT = dict(indent=4, ensure_ascii=False, default=repr)
 SNIFFER_SAMPLE_SIZE = 5000
+ENCODING_PREFIX_SIZE = 2 ** 16
+ENCODING_CHUNK_SIZE = 2 ** 13
+ENCODING_NB_CHUNKS = 16
 SNIFFER_MAX_FAILURE_RATIO = 0.01
 IGNORED_FIELD_TAG = '_ignored'
 UNKNOWN_FIELD_TAG = '_unknown'
@@ -0,0 +1,152 @@
+"""Load source descriptions and pipeline specs through a persistent cache.
+
+Context
+-------
+
+Every bootstrap command parses all the description and pipeline files of
+the data directory. YAML parsing is slow (especially with the pure python
+loader), so the parsed files are cached in a SQLite database.
+
+Caching
+-------
+
+Files are keyed by path. When the modification time and the size of a file
+have not changed, the cached version is returned without reading the file.
+Otherwise the file is read and hashed, and only parsed again if the hash
+changed. Validation results are keyed by a hash of the description schema
+and of the description itself.
+
+Parsed documents are pickled in the cache, so each call returns a fresh
+copy that callers are free to modify.
+
+"""
+
+import os
+import json
+import yaml
+import pickle
+import logging
+import sqlite3
+
+from hashlib import sha1
+from functools import lru_cache
+from os.path import dirname
+
+from common.config import DESCRIPTION_CACHE_FILE
+
+try:
+    from yaml import CSafeLoader as Loader
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+_TABLES = (
+    'CREATE TABLE IF NOT EXISTS files '
+    '(path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, '
+    'hash TEXT, content BLOB)',
+    'CREATE TABLE IF NOT EXISTS validations '
+    '(hash TEXT PRIMARY KEY, errors TEXT)',
+)
+_connections = {}
+
+
+def _connect(cache_file):
+    """Return a connection to the cache (one per process)."""
+
+    key = cache_file, os.getpid()
+    if key not in _connections:
+        os.makedirs(dirname(cache_file), exist_ok=True)
+        connection = sqlite3.connect(cache_file, timeout=30)
+        with connection:
+            for table in _TABLES:
+                connection.execute(table)
+        _connections[key] = connection
+    return _connections[key]
+
+
+def load_yaml(path, cache_file=DESCRIPTION_CACHE_FILE):
+    """Return the parsed content of a YAML file (from the cache if valid).
+
+    Parsing errors are raised (and not cached).
+
+    """
+
+    stat = os.stat(path)
+
+    try:
+        connection = _connect(cache_file)
+        cached = connection.execute(
+            'SELECT mtime, size, hash, content FROM files WHERE path = ?',
+            (path,)
+        ).fetchone()
+    except sqlite3.Error as error:
+        logging.warning('Could not read the description cache: %s', error)
+        connection, cached = None, None
+
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return pickle.loads(cached[3])
+
+    with open(path, 'rb') as stream:
+        text = stream.read()
+    hash_ = sha1(text).hexdigest()
+
+    if cached and cached[2] == hash_:
+        content = cached[3]
+    else:
+        logging.debug('Parsing %s', path)
+        content = pickle.dumps(yaml.load(text, Loader=Loader),
+                               pickle.HIGHEST_PROTOCOL)
+
+    if connection:
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                    (path, stat.st_mtime_ns, stat.st_size, hash_, content)
+                )
+        except sqlite3.Error as error:
+            logging.warning('Could not update the description cache: %s',
+                            error)
+
+    return pickle.loads(content)
+
+
+@lru_cache(maxsize=None)
+def _hash_schema(schema_file):
+    with open(schema_file, 'rb') as stream:
+        return sha1(stream.read()).hexdigest()
+
+
+def get_validation_errors(description, validator, schema_file,
+                          cache_file=DESCRIPTION_CACHE_FILE):
+    """Return the sorted validation messages for a description."""
+
+    dump = json.dumps(description, sort_keys=True, default=repr)
+    hash_ = sha1((_hash_schema(schema_file) + dump).encode()).hexdigest()
+
+    try:
+        connection = _connect(cache_file)
+        cached = connection.execute(
+            'SELECT errors FROM validations WHERE hash = ?', (hash_,)
+        ).fetchone()
+    except sqlite3.Error as error:
+        logging.warning('Could not read the description cache: %s', error)
+        connection, cached = None, None
+
+    if cached:
+        return json.loads(cached[0])
+
+    errors = validator.iter_errors(description)
+    messages = sorted(error.message for error in errors)
+
+    if connection:
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO validations VALUES (?, ?)',
+                    (hash_, json.dumps(messages))
+                )
+        except sqlite3.Error as error:
+            logging.warning('Could not update the description cache: %s',
+                            error)
+
+    return messages
@@ -0,0 +1,120 @@
+"""Detect the encoding of source files without reading them entirely.
+
+Sampling
+--------
+
+The detector is fed with the first `ENCODING_PREFIX_SIZE` bytes of the file,
+followed by `ENCODING_NB_CHUNKS` chunks spread evenly over the rest of it.
+Chunks start at a line break so that multi-byte characters are not cut in
+half. Small files are read in full. Detection stops as soon as `cchardet`
+is confident.
+
+Caching
+-------
+
+Results are cached on disk, keyed by a hash of the file size and the
+sampled bytes, i.e. exactly what the detector looks at. A cache hit is
+therefore always the answer that detection would give.
+
+"""
+
+import json
+import logging
+import os
+
+from hashlib import sha1
+from os.path import getsize
+from cchardet import UniversalDetector
+
+from common.config import (
+    CACHE_DIR,
+    ENCODING_CACHE_FILE,
+    ENCODING_PREFIX_SIZE,
+    ENCODING_CHUNK_SIZE,
+    ENCODING_NB_CHUNKS
+)
+
+
+def sample_file(path,
+                prefix_size=ENCODING_PREFIX_SIZE,
+                chunk_size=ENCODING_CHUNK_SIZE,
+                nb_chunks=ENCODING_NB_CHUNKS):
+    """Return a list of byte strings sampled from the file."""
+
+    size = getsize(path)
+
+    with open(path, 'rb') as stream:
+        if size <= prefix_size + chunk_size * nb_chunks:
+            return [stream.read()]
+
+        samples = [stream.read(prefix_size)]
+        stride = (size - prefix_size) // nb_chunks
+
+        for i in range(nb_chunks):
+            stream.seek(prefix_size + i * stride)
+            chunk = stream.read(chunk_size)
+            line_break = chunk.find(b'\n')
+            if line_break >= 0:
+                chunk = chunk[line_break + 1:]
+            samples.append(chunk)
+
+    return samples
+
+
+def _get_cache_key(path, samples):
+    hash_ = sha1(str(getsize(path)).encode())
+    for sample in samples:
+        hash_.update(sample)
+    return hash_.hexdigest()
+
+
+def _load_cache():
+    try:
+        with open(ENCODING_CACHE_FILE) as stream:
+            return json.load(stream)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    """Write the cache atomically (other processes may be writing too)."""
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temporary_file = '{}.{}'.format(ENCODING_CACHE_FILE, os.getpid())
+        with open(temporary_file, 'w') as stream:
+            json.dump(cache, stream, indent=4, sort_keys=True)
+        os.replace(temporary_file, ENCODING_CACHE_FILE)
+    except OSError as error:
+        logging.warning('Could not save the encoding cache: %s', error)
+
+
+def detect_encoding(path, use_cache=True):
+    """Return the best guess for the encoding of a file."""
+
+    samples = sample_file(path)
+    cache_key = _get_cache_key(path, samples)
+    cache = _load_cache() if use_cache else {}
+
+    if cache_key in cache:
+        encoding = cache[cache_key]
+        logging.info('Found %s encoding in the cache for %s', encoding, path)
+        return encoding
+
+    detector = UniversalDetector()
+    for sample in samples:
+        detector.feed(sample)
+        if detector.done:
+            break
+    detector.close()
+
+    encoding = detector.result['encoding']
+    confidence = detector.result['confidence']
+    logging.info('Detected %s encoding with cchardet (confidence = %s)',
+                 encoding, confidence)
+
+    if use_cache:
+        cache[cache_key] = encoding
+        _save_cache(cache)
+
+    return encoding
@@ -1,6 +1,5 @@
 import os
 import sys
-import csv
 
 import json
 
@@ -8,7 +7,10 @@ import logging
 import yaml
 import slugify
 
-from .config import SOURCE_FILE, PIPELINE_FILE, DATA_DIR, FISCAL_SCHEMA_FILE, GEOCODES_FILE
+from .config import SOURCE_FILE, PIPELINE_FILE, DATA_DIR
+from .geocodes import get_registry
+from .renaming import get_field_aliases
+from .schema import get_fiscal_schema
 
 PREPROCESSING = {
     'parse_currency_fields',
@@ -49,14 +51,11 @@ COUNTRY_CODES = [
     "RO"
 ]
 
-fiscal_schema = yaml.load(open(FISCAL_SCHEMA_FILE))
-GEOCODES = list(csv.DictReader(open(GEOCODES_FILE)))
+fiscal_schema = get_fiscal_schema()
 
 
 def _lookup_geocode(nuts_code):
-    for info in GEOCODES:
-        if info['NUTS-Code'] == nuts_code:
-            return info['Description']
+    return get_registry().describe(nuts_code)
 
 
 if __name__ == "__main__":
@@ -115,20 +114,12 @@ if __name__ == "__main__":
 
                 fiscal_model_parameters = {
                     'options': dict(
-                        (field['name'], {'currency': source['resources'][0].get('currency_code', 'EUR')})
-                        for field in fiscal_schema['fields']
-                        if field.get('osType') == 'value'
+                        (name, {'currency': source['resources'][0].get('currency_code', 'EUR')})
+                        for name, os_type in fiscal_schema.os_types.items()
+                        if os_type == 'value'
                     ),
-                    'os-types': dict(
-                        (field['name'], field['osType'])
-                        for field in fiscal_schema['fields']
-                        if 'osType' in field
-                    ),
-                    'titles': dict(
-                        (field['name'], field['title'])
-                        for field in fiscal_schema['fields']
-                        if 'title' in field
-                    )
+                    'os-types': dict(fiscal_schema.os_types),
+                    'titles': dict(fiscal_schema.titles)
                 }
 
                 for resource in source['resources']:
@@ -139,8 +130,9 @@ if __name__ == "__main__":
                             clean_field = ' '.join(tokens)
                             field['name'] = clean_field
 
-                concat_parameters = dict(
-                    (field['name'], []) for field in fiscal_schema['fields']
+                concat_parameters = get_field_aliases(
+                    source['resources'],
+                    list(fiscal_schema.field_names)
                 )
                 for resource in source['resources']:
                     schema = resource.get('schema')
@@ -148,9 +140,6 @@ if __name__ == "__main__":
                         for field in schema.get('fields', []):
                             maps_to = field.get('maps_to')
                             if maps_to is not None and not maps_to.startswith('_'):
-                                aliases = concat_parameters[maps_to]
-                                if field['name'] not in aliases and field['name'] != maps_to:
-                                    aliases.append(field['name'])
                                 del field['maps_to']
                                 if 'translates_to' in field:
                                     del field['translates_to']
@@ -220,6 +209,7 @@ if __name__ == "__main__":
                             'funding_period': ['2000-2006', '2007-2013', '2014-2020']
                         }
                     }),
+                    ('dump_to_parquet', {}),
                     ('dump.to_zip', {'out-file': 'fiscal.datapackage.zip'}),
                     ('fiscal.upload', {'in-file': 'fiscal.datapackage.zip', 'publish': True}),
                 ]
@@ -0,0 +1,107 @@
+"""An indexed registry of NUTS geocodes.
+
+Context
+-------
+
+The geocodes file lists the NUTS regions (one line per region) with their
+code and description. It actually contains three trees (one per NUTS level)
+so country codes appear more than once: like the linear scans that this
+module replaces, lookups return the first line for a code.
+
+Loading
+-------
+
+The file is parsed once per process. The parsed rows are pickled in the
+cache folder next to a hash of the file, so the CSV is only parsed again
+when it changes.
+
+"""
+
+import csv
+import logging
+
+from bisect import bisect_left
+from functools import lru_cache
+
+from common.cache import load_or_build
+from common.config import GEOCODES_FILE, GEOCODES_CACHE_FILE
+
+NUTS_CODE = 'NUTS-Code'
+DESCRIPTION = 'Description'
+
+
+class GeocodeRegistry(object):
+    """NUTS geocodes indexed by code."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._by_nuts_code = {}
+
+        for row in rows:
+            self._by_nuts_code.setdefault(row[NUTS_CODE], row)
+
+        self._sorted_codes = sorted(self._by_nuts_code)
+
+    def __contains__(self, nuts_code):
+        return nuts_code in self._by_nuts_code
+
+    def __len__(self):
+        return len(self._by_nuts_code)
+
+    def get(self, nuts_code):
+        """Return the line of the geocodes file for a code (or None)."""
+        return self._by_nuts_code.get(nuts_code)
+
+    def describe(self, nuts_code):
+        """Return the description of a code (or None)."""
+        row = self._by_nuts_code.get(nuts_code)
+        if row:
+            return row[DESCRIPTION]
+
+    def search(self, prefix, level=None):
+        """Return the sorted codes starting with a prefix.
+
+        :param prefix: a NUTS code (for example `AT2` or `AT`)
+        :param level: the NUTS level of the codes (0 for countries, 1 to 3
+            for regions) or None for all levels
+
+        """
+
+        codes = []
+        start = bisect_left(self._sorted_codes, prefix)
+        for code in self._sorted_codes[start:]:
+            if not code.startswith(prefix):
+                break
+            if level is None or len(code) == level + 2:
+                codes.append(code)
+        return codes
+
+    def parents(self, nuts_code):
+        """Return the codes of the parent regions, from the closest.
+
+        NUTS codes are hierarchical (AT221 is in AT22, which is in AT2, in
+        AT). The parent column of the file is not used because each tree
+        only holds one level of regions under the countries.
+
+        """
+
+        return [nuts_code[:length]
+                for length in range(len(nuts_code) - 1, 1, -1)
+                if nuts_code[:length] in self._by_nuts_code]
+
+
+def read_geocodes(path=GEOCODES_FILE):
+    """Return the lines of the geocodes file as a list of dictionaries."""
+
+    with open(path, encoding='utf-8', newline='') as stream:
+        return [dict(row) for row in csv.DictReader(stream)]
+
+
+@lru_cache(maxsize=None)
+def get_registry(path=GEOCODES_FILE, cache_file=GEOCODES_CACHE_FILE):
+    """Return the geocode registry (loaded once per process)."""
+
+    rows = load_or_build([path], cache_file, lambda: read_geocodes(path))
+    registry = GeocodeRegistry(rows)
+    logging.debug('Loaded %d NUTS geocodes', len(registry))
+    return registry
@@ -0,0 +1,184 @@
+"""Reuse the unchanged parts of the EU-wide concatenation.
+
+Context
+-------
+
+The EU concatenation reads the fiscal data of every source, although a
+daily refresh usually changes a handful of them. The rows that each input
+contributes to the combined output are saved as a segment in the cache
+folder, and a manifest records, for each input and in order, its hash and
+the range of rows it fills in the output. The next run only decodes the
+inputs whose hash changed and reads the other segments back as they are.
+
+Manifest
+--------
+
+There is one manifest per set of options (the pipelines, fields, format
+and filters of the concatenation), stored as JSON. Each entry holds the
+path of an input, its size, modification time and hash, the name of its
+segment and its `first_row` and `nb_rows` in the combined output. Hashes
+are only computed again when the size or the modification time changed.
+
+Segments are named after the options that shape the rows and the hash of
+the input, so manifests can share them. Segments that no manifest refers
+to are deleted after each run.
+
+"""
+
+import os
+import json
+import logging
+
+from glob import glob
+from hashlib import sha1
+from os.path import join, isdir, isfile, exists, relpath, getsize, getmtime
+
+from common.stages import read_rows, write_rows
+
+MANIFEST_SUFFIX = '.manifest.json'
+SEGMENT_SUFFIX = '.segment'
+HASH_CHUNK_SIZE = 2 ** 20
+
+
+def get_key(options):
+    """Return a short hash of a JSON-serializable value."""
+
+    text = json.dumps(options, sort_keys=True, default=repr)
+    return sha1(text.encode()).hexdigest()
+
+
+def _list_files(path):
+    if isdir(path):
+        return sorted(filepath
+                      for filepath in glob(join(path, '**'), recursive=True)
+                      if isfile(filepath))
+    return [path]
+
+
+def stat_input(path):
+    """Return the total size and the latest modification time of an input.
+
+    An input is a file or a folder (of Parquet files for example).
+
+    """
+
+    filepaths = _list_files(path)
+    size = sum(getsize(filepath) for filepath in filepaths)
+    mtime = max((getmtime(filepath) for filepath in filepaths), default=0)
+    return size, mtime
+
+
+def hash_input(path):
+    """Return a hash of the relative paths and contents of an input."""
+
+    hash_ = sha1()
+    for filepath in _list_files(path):
+        hash_.update(relpath(filepath, path).encode())
+        with open(filepath, 'rb') as stream:
+            for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+                hash_.update(chunk)
+    return hash_.hexdigest()
+
+
+class Manifest(object):
+    """The inputs of a concatenation and their rows in the output.
+
+    :param cache_dir: the folder of the manifests and segments
+    :param options: the options of the concatenation
+    :param row_options: the options that shape the rows of each input
+
+    """
+
+    def __init__(self, cache_dir, options, row_options):
+        self.cache_dir = cache_dir
+        self.path = join(cache_dir, get_key(options) + MANIFEST_SUFFIX)
+        self.row_key = get_key(row_options)
+        self.previous = {}
+        self.entries = []
+
+        try:
+            with open(self.path) as stream:
+                for entry in json.load(stream)['inputs']:
+                    self.previous[entry['path']] = entry
+        except (IOError, ValueError, KeyError) as error:
+            if exists(self.path):
+                logging.warning('Ignoring %s: %s', self.path, error)
+
+    def add_input(self, path):
+        """Register the next input and return its manifest entry."""
+
+        size, mtime = stat_input(path)
+        previous = self.previous.get(path)
+        if previous and (previous['size'], previous['mtime']) == (size, mtime):
+            hash_ = previous['hash']
+        else:
+            hash_ = hash_input(path)
+
+        segment = get_key([self.row_key, hash_]) + SEGMENT_SUFFIX
+        entry = {
+            'path': path,
+            'size': size,
+            'mtime': mtime,
+            'hash': hash_,
+            'segment': segment,
+            'reused': isfile(join(self.cache_dir, segment)),
+            'first_row': None,
+            'nb_rows': None,
+        }
+        self.entries.append(entry)
+        return entry
+
+    def set_rows(self, entry, nb_rows):
+        """Record the number of rows of an input (once it is consumed)."""
+
+        index = self.entries.index(entry)
+        if index == 0:
+            entry['first_row'] = 0
+        else:
+            previous = self.entries[index - 1]
+            entry['first_row'] = previous['first_row'] + previous['nb_rows']
+        entry['nb_rows'] = nb_rows
+
+    def save(self):
+        """Write the manifest and delete the segments nobody refers to."""
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_file = '{}.{}'.format(self.path, os.getpid())
+        with open(temporary_file, 'w') as stream:
+            json.dump({'inputs': self.entries}, stream, indent=4)
+        os.replace(temporary_file, self.path)
+
+        segments = set()
+        for filepath in glob(join(self.cache_dir, '*' + MANIFEST_SUFFIX)):
+            try:
+                with open(filepath) as stream:
+                    segments.update(entry['segment']
+                                    for entry in json.load(stream)['inputs'])
+            except (IOError, ValueError, KeyError):
+                continue
+        for filepath in glob(join(self.cache_dir, '*' + SEGMENT_SUFFIX)):
+            if os.path.basename(filepath) not in segments:
+                os.remove(filepath)
+
+
+def read_segment(entry, read, cache_dir):
+    """Return the rows of an input, from its segment if there is one.
+
+    Otherwise, the rows come from `read(path)` and are saved as a segment
+    on the way. The segment is only kept if all the rows were read.
+
+    """
+
+    filepath = join(cache_dir, entry['segment'])
+    if isfile(filepath):
+        yield from read_rows(filepath)
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_file = '{}.{}'.format(filepath, os.getpid())
+    try:
+        yield from write_rows(read(entry['path']), temporary_file)
+        os.replace(temporary_file, filepath)
+    finally:
+        if exists(temporary_file):
+            os.remove(temporary_file)
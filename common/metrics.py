@@ -1,7 +1,8 @@
 """A module to to gather metrics about the bootstrap process."""
 
 from collections import OrderedDict
-from sqlalchemy import and_
+from functools import lru_cache
+from sqlalchemy import and_, create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import Boolean
 from sqlalchemy import Column
@@ -10,7 +11,7 @@ from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy.ext.declarative import declarative_base
 
-from common.config import DB_ENGINE
+from common.config import DB_URI
 
 Base = declarative_base()
 
@@ -32,13 +33,19 @@ class Snapshot(Base):
     nuts_code = Column(String)
 
 
-Base.metadata.create_all(DB_ENGINE)
+@lru_cache(maxsize=1)
+def get_db_engine():
+    """Return the metrics database engine (created on first use)."""
+
+    engine = create_engine(DB_URI)
+    Base.metadata.create_all(engine)
+    return engine
 
 
 def get_latest_stats():
     """Get simple stats about the latest update."""
 
-    session = sessionmaker(bind=DB_ENGINE)()
+    session = sessionmaker(bind=get_db_engine())()
 
     timestamp = (
         session.query(Snapshot, Snapshot.timestamp)
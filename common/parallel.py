@@ -0,0 +1,120 @@
+"""Stream rows out of worker processes, in order.
+
+Context
+-------
+
+Some steps of the pipeline (parsing source files in particular) are CPU
+bound and independent from one resource to the next. This module runs one
+row generator per worker process and streams the rows back to the parent.
+
+Ordering
+--------
+
+Each task gets its own bounded queue, so rows of one task arrive in the
+order they were produced and tasks are consumed in the order they were
+given. The output is the same as running the tasks one after the other.
+Workers are started lazily, `workers` tasks ahead of the consumer, and the
+bounded queues keep memory in check when the consumer is slower.
+
+"""
+
+import logging
+import pickle
+import traceback
+
+from multiprocessing import Process, Queue
+from queue import Empty
+
+from common.config import BLOCK_SIZE, PARALLEL_QUEUE_SIZE
+
+_DONE = 'done'
+_ERROR = 'error'
+_ROWS = 'rows'
+
+
+def _produce(function, item, queue, chunk_size):
+    """Put the rows of `function(item)` into the queue (in a worker)."""
+
+    try:
+        chunk = []
+        for row in function(item):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                queue.put((_ROWS, chunk))
+                chunk = []
+        if chunk:
+            queue.put((_ROWS, chunk))
+        queue.put((_DONE, None))
+
+    except Exception as error:
+        logging.error(traceback.format_exc())
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(repr(error))
+        queue.put((_ERROR, error))
+
+
+class WorkerStream(object):
+    """The rows of one task, produced in a separate process."""
+
+    def __init__(self, function, item,
+                 queue_size=PARALLEL_QUEUE_SIZE,
+                 chunk_size=BLOCK_SIZE):
+        self.queue = Queue(queue_size)
+        self.process = Process(target=_produce,
+                               args=(function, item, self.queue, chunk_size))
+        self.process.daemon = True
+
+    def start(self):
+        if self.process.pid is None:
+            self.process.start()
+
+    def _get(self):
+        """Wait for the next message, unless the worker died silently."""
+
+        while True:
+            try:
+                return self.queue.get(timeout=1)
+            except Empty:
+                if not self.process.is_alive() and self.queue.empty():
+                    message = 'Worker exited with code %s'
+                    raise RuntimeError(message % self.process.exitcode)
+
+    def __iter__(self):
+        self.start()
+        try:
+            while True:
+                status, payload = self._get()
+                if status == _DONE:
+                    break
+                elif status == _ERROR:
+                    raise payload
+                yield from payload
+            self.process.join()
+        finally:
+            if self.process.is_alive():
+                self.process.terminate()
+
+
+def parallel_streams(function, items, workers,
+                     queue_size=PARALLEL_QUEUE_SIZE):
+    """Return one generator of rows per item, each produced by a worker.
+
+    :param function: returns an iterable of rows for one item
+    :param items: a list of items (for example resource descriptors)
+    :param workers: the maximum number of tasks running at the same time
+    :param queue_size: the maximum number of chunks waiting per task
+
+    :returns: a list of generators (one per item, in order)
+
+    """
+
+    streams = [WorkerStream(function, item, queue_size) for item in items]
+
+    def stream_rows(index):
+        for stream in streams[index:index + workers]:
+            stream.start()
+        yield from streams[index]
+
+    return [stream_rows(index) for index in range(len(streams))]
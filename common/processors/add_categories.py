@@ -1,6 +1,6 @@
 """A processor to inject categories values into the data."""
 from datapackage_pipelines.wrapper import ingest, spew
-from common.row_processor import process
+from common.row_processor import process_blocks
 
 
 def inject_categories(row, **category_tables):
@@ -32,12 +32,38 @@ def inject_categories(row, **category_tables):
     return row, report
 
 
+def inject_categories_block(block, **category_tables):
+    """Inject categories values into a block of data.
+
+    This is the block version of `inject_categories`. Values which are not
+    found in the lookup table are left untouched and reported.
+
+    :param block: a block of data as a `dict` of columns
+    :param category_tables: a `dict` of lookup tables
+
+    :returns block: the new block
+
+    """
+
+    report = {}
+
+    for category, table in category_tables.items():
+        column = block[category]
+        for i, value in enumerate(column):
+            try:
+                column[i] = table[value]
+            except KeyError:
+                report[i] = value
+
+    return block, report or '_pass'
+
+
 if __name__ == '__main__':
     """Ingest, process and spew out."""
 
     parameters_, datapackage_, resources_ = ingest()
-    new_resources_, _ = process(resources_,
-                                inject_categories,
-                                datapackage=datapackage_,
-                                parameters=parameters_)
+    new_resources_, _ = process_blocks(resources_,
+                                       inject_categories_block,
+                                       datapackage=datapackage_,
+                                       parameters=parameters_)
     spew(datapackage_, new_resources_)
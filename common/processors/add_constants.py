@@ -1,7 +1,7 @@
 """A processor to inject constant values into the data."""
 
 from datapackage_pipelines.wrapper import ingest, spew
-from common.row_processor import process
+from common.row_processor import process_blocks, block_length
 
 
 def inject_constants(row, **constants):
@@ -31,12 +31,32 @@ def inject_constants(row, **constants):
     return row, stats
 
 
+def inject_constants_block(block, **constants):
+    """Inject constant values into a block of data (see `inject_constants`).
+
+    :param block: a block of data as a `dict` of columns
+    :param constants: a `dict` of constants
+
+    :returns block: the new block
+
+    """
+
+    stats = '_pass'
+    nb_rows = block_length(block)
+
+    for key, value in constants.items():
+        if value is not None:
+            block[key] = [value] * nb_rows
+
+    return block, stats
+
+
 if __name__ == '__main__':
     """Ingest, process and spew out."""
 
     parameters_, datapackage_, resources_ = ingest()
-    new_resources_, _ = process(resources_,
-                                inject_constants,
-                                datapackage=datapackage_,
-                                parameters=parameters_)
+    new_resources_, _ = process_blocks(resources_,
+                                       inject_constants_block,
+                                       datapackage=datapackage_,
+                                       parameters=parameters_)
     spew(datapackage_, new_resources_)
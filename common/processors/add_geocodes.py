@@ -24,7 +24,7 @@ None.
 
 from datapackage_pipelines.wrapper import ingest, spew
 
-from common.utilities import process
+from common.row_processor import process_blocks, block_length
 
 
 def add_geocodes(row, **kw):
@@ -38,9 +38,23 @@ def add_geocodes(row, **kw):
     return row
 
 
+def add_geocodes_block(block, **kw):
+    """Fill up the country and region columns of a block of data."""
+
+    nb_rows = block_length(block)
+
+    block['beneficiary_country_code'] = [kw['country_code']] * nb_rows
+    block['beneficiary_country'] = [kw['country']] * nb_rows
+    block['beneficiary_nuts_code'] = [kw['nuts_code']] * nb_rows
+    block['beneficiary_nuts_region'] = [kw['region']] * nb_rows
+
+    return block, '_pass'
+
+
 if __name__ == '__main__':
     parameters_, datapackage, resources = ingest()
 
-    new_resources = process(resources, add_geocodes,
-                            **parameters_)
+    new_resources, _ = process_blocks(resources, add_geocodes_block,
+                                      parameters=parameters_,
+                                      verbose=False)
     spew(datapackage, new_resources)
@@ -1,21 +1,21 @@
 """A processor to inject constant values into the data."""
 
-from datapackage_pipelines.wrapper import ingest, spew
+from itertools import count
 
-row_count = 0
+from datapackage_pipelines.wrapper import ingest, spew
 
 
-def process_rows(prefix, rows):
-    global row_count
+def process_rows(prefix, rows, row_count):
     for row in rows:
-        row['internal_id'] = '{}-{}'.format(prefix, row_count)
+        row['internal_id'] = '{}-{}'.format(prefix, next(row_count))
         yield row
-        row_count += 1
 
 
 def process(prefix, resources):
+    # The row count runs across resources
+    row_count = count()
     for resource in resources:
-        yield process_rows(prefix, resource)
+        yield process_rows(prefix, resource, row_count)
 
 
 if __name__ == '__main__':
@@ -2,21 +2,19 @@
 
 import logging
 import arrow
-import yaml
 import json
 
+from functools import lru_cache
+
 from datapackage_pipelines.wrapper import ingest
 from datapackage_pipelines.wrapper import spew
-from common.config import FISCAL_SCHEMA_FILE
+from common.schema import get_fiscal_schema
 from common.utilities import process
 
 
 def get_fiscal_types():
     """Return the fiscal datapackage fields."""
 
-    with open(FISCAL_SCHEMA_FILE) as stream:
-        schema = yaml.load(stream.read())
-
     # I wrap arrow over the standard datetime library because it tries
     # to convert strings to datetime without explicitly requiring a format.
     # Also, and most importantly, it doesn't trip over values that have
@@ -29,18 +27,24 @@ def get_fiscal_types():
         'number': float
     }
 
-    for field_ in schema['fields']:
+    for field_ in get_fiscal_schema().schema['fields']:
         yield field_['name'], converters[field_['type']]
 
 
-converter = dict(get_fiscal_types())
-dump = {k: v.__name__ for k, v in converter.items()}
-logging.debug('Fiscal type casting: \n%s', json.dumps(dump, indent=4))
+@lru_cache(maxsize=1)
+def get_converters():
+    """Return the fiscal type converters (built once, on first use)."""
+
+    converter = dict(get_fiscal_types())
+    dump = {k: v.__name__ for k, v in converter.items()}
+    logging.debug('Fiscal type casting: \n%s', json.dumps(dump, indent=4))
+    return converter
 
 
 def cast_values(row):
     """Cast values to fiscal types."""
 
+    converter = get_converters()
     for key, value in row.items():
         if value:
             try:
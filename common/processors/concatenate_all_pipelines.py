@@ -1,106 +1,190 @@
-"""This processor concatenates all datasets into one."""
+"""This processor concatenates all datasets into one.
 
-import yaml
+The CSV files inside each `fiscal.datapackage.zip` are streamed (and
+decoded incrementally) rather than read into memory. Each archive is read
+by a worker process and the rows are merged back in the order of the
+sources. Workers only keep one chunk of rows waiting each, so memory does
+not grow with the size of the largest dataset.
 
+With `source-format: parquet`, the partitioned Parquet copies written by
+`dump_to_parquet` are read instead (see `common.columnar`): only the
+selected fields are read, and the optional `filters` (a list of
+[column, operator, value]) skip whole partitions. Values keep the types
+of the Parquet columns rather than being strings.
+
+The rows of each input are saved in the `cache-dir` folder, along with a
+manifest of the inputs (see `common.manifest`), so that the next run only
+reads the inputs that changed. Set `cache-dir` to false to read them all.
+
+"""
+
+import csv
+import os
+
+from functools import partial
+from io import TextIOWrapper
 from logging import warning, info
 from datapackage_pipelines.wrapper import ingest
-from petl import fromdicts, look
-from tabulator import Stream
 from zipfile import BadZipFile, ZipFile
 from datapackage_pipelines.wrapper import spew
 
-from common.utilities import format_to_json, get_fiscal_field_names
-from common.bootstrap import collect_sources
+from common.columnar import read_dataset
+from common.manifest import Manifest, read_segment
+from common.parallel import parallel_streams
+from common.renaming import compile_renamer
+from common.schema import get_fiscal_schema
+from common.utilities import format_to_json
 from common.config import (
-    FISCAL_METADATA_FILE,
-    FISCAL_SCHEMA_FILE,
-    FISCAL_MODEL_FILE,
+    CONCATENATION_CACHE_DIR,
+    CONCATENATION_WORKERS,
     DATAPACKAGE_FILE,
     LOG_SAMPLE_SIZE,
     DATA_DIR
 )
 
 
-STREAM_OPTIONS = {
-    'scheme': 'text',
-    'format': 'csv',
-    'encoding': 'utf-8',
-    'headers': 1,
-    'sample_size': LOG_SAMPLE_SIZE
-}
-
+def format_data_sample(rows):
+    """Return a table representation of a sample of the data."""
 
-def format_data_sample(stream):
-    """Return a table representation of a sample of the streamed data."""
+    from petl import fromdicts, look
 
-    keyed_rows = []
-    for row in stream.sample:
-        keyed_rows.append(dict(zip(stream.headers, row)))
-
-    petl_table = fromdicts(keyed_rows)
+    petl_table = fromdicts(rows)
     return repr(look(petl_table, limit=None))
 
 
 def collect_local_datasets(**params):
-    """Collect all local fiscal datasets."""
+    """Return the paths of all local fiscal datasets."""
+
+    # The bootstrap module pulls in sqlalchemy, so it is only imported
+    # once the processor actually runs
+    from common.bootstrap import collect_sources
 
+    paths = []
     for source in collect_sources(select=params.get('pipelines')):
-        if source.fiscal_zip_file:
-            info('Found %s', source.fiscal_zip_file.lstrip(DATA_DIR))
+        if params.get('source-format') == 'parquet':
+            path = source.fiscal_parquet_dir
+        else:
+            path = source.fiscal_zip_file
+        if path:
+            info('Found %s', os.path.relpath(path, DATA_DIR))
+            paths.append(path)
+    return paths
 
-            try:
-                with ZipFile(source.fiscal_zip_file) as zipped_files:
-                    filenames = zipped_files.namelist()
-                    filenames.remove(DATAPACKAGE_FILE)
 
-                    for i, filename in enumerate(filenames):
-                        csv_bytes = zipped_files.read(filename)
-                        csv_text = csv_bytes.decode()
+def read_csv(stream, fields_subset):
+    """Return the rows of a binary CSV stream with a subset of the fields.
 
-                        yield filename, csv_text
+    The columns are picked by position, with a plan compiled from the
+    headers (see `common.renaming`).
 
-                        message = 'Collected resource %s of %s: %s'
-                        info(message, i, source.id, filename)
+    """
 
-            except BadZipFile:
-                warning('%s has a bad zip file', source.id)
+    reader = csv.reader(TextIOWrapper(stream, encoding='utf-8', newline=''))
+    headers = next(reader, [])
+    mapping = {index: header
+               for index, header in enumerate(headers)
+               if header in fields_subset}
+    rename = compile_renamer(range(len(headers)), mapping, keep_others=False)
 
+    for line in reader:
+        if not line:
+            continue
+        try:
+            yield rename(line)
+        except IndexError:
+            yield rename(line + [''] * (len(headers) - len(line)))
 
-def concatenate(csv_files, **params):
-    """Return a single resource generator for all datasets."""
 
-    fiscal_fields = get_fiscal_field_names()
-    fields_subset = params.get('fields') or fiscal_fields
-    if not (set(fields_subset) <= set(fiscal_fields)):
-        raise ValueError('Invalid subset of fields')
+def read_fiscal_zip(zip_file, fields_subset):
+    """Return the rows of all the resources of a fiscal datapackage zip."""
 
-    nb_files = 0
-    for filename, csv_text in csv_files:
-        nb_files += 1
+    try:
+        with ZipFile(zip_file) as zipped_files:
+            filenames = zipped_files.namelist()
+            filenames.remove(DATAPACKAGE_FILE)
 
-        with Stream(csv_text, **STREAM_OPTIONS) as stream:
-            for row in stream.iter(keyed=True):
-                yield {key: value
-                       for key, value in row.items()
-                       if key in fields_subset}
+            for i, filename in enumerate(filenames):
+                sample_rows = []
+                with zipped_files.open(filename) as stream:
+                    for row in read_csv(stream, fields_subset):
+                        if len(sample_rows) < LOG_SAMPLE_SIZE:
+                            sample_rows.append(row)
+                        yield row
 
-            args = filename, format_data_sample(stream)
-            info('Concatenated %s:\n%s', *args)
+                message = 'Concatenated resource %s of %s (%s):\n%s'
+                info(message, i, os.path.relpath(zip_file, DATA_DIR), filename,
+                     format_data_sample(sample_rows))
 
-    info('Done concatenating %s files', nb_files)
+    except BadZipFile:
+        warning('%s is a bad zip file', zip_file)
 
 
-def assemble_fiscal_datapackage():
-    """Assemble the fiscal datapackage for the concatenated dataset."""
+def read_fiscal_parquet(path, columns, filters=None):
+    """Return the rows of a Parquet dataset with a subset of the fields."""
+
+    yield from read_dataset(path, columns, filters)
+    info('Concatenated %s', os.path.relpath(path, DATA_DIR))
+
+
+def concatenate(paths, **params):
+    """Return a single resource generator for all datasets."""
+
+    fiscal_schema = get_fiscal_schema()
+    fiscal_fields = fiscal_schema.field_set
+    fields_subset = frozenset(params.get('fields') or fiscal_fields)
+    if not fields_subset <= fiscal_fields:
+        raise ValueError('Invalid subset of fields')
+
+    workers = (params.get('workers') or CONCATENATION_WORKERS
+               or os.cpu_count())
+    if params.get('source-format') == 'parquet':
+        columns = [name for name in fiscal_schema.field_names
+                   if name in fields_subset]
+        read = partial(read_fiscal_parquet, columns=columns,
+                       filters=params.get('filters'))
+    else:
+        read = partial(read_fiscal_zip, fields_subset=fields_subset)
+
+    cache_dir = params.get('cache-dir', CONCATENATION_CACHE_DIR)
+    if not cache_dir:
+        streams = parallel_streams(read, paths, workers, queue_size=1)
+        for stream in streams:
+            yield from stream
+        info('Done concatenating %s files', len(paths))
+        return
+
+    row_options = {
+        'fields': sorted(fields_subset),
+        'source-format': params.get('source-format'),
+        'filters': params.get('filters'),
+    }
+    options = dict(row_options, pipelines=params.get('pipelines'))
+    manifest = Manifest(cache_dir, options, row_options)
+    entries = [manifest.add_input(path) for path in paths]
+
+    streams = parallel_streams(partial(read_segment, read=read,
+                                       cache_dir=cache_dir),
+                               entries, workers, queue_size=1)
+    for entry, stream in zip(entries, streams):
+        nb_rows = 0
+        for row in stream:
+            nb_rows += 1
+            yield row
+        manifest.set_rows(entry, nb_rows)
+
+    manifest.save()
+    nb_reused = sum(entry['reused'] for entry in entries)
+    info('Done concatenating %s files (%s reused from %s)',
+         len(paths), nb_reused, manifest.path)
 
-    with open(FISCAL_METADATA_FILE) as stream:
-        fdp = yaml.load(stream.read())
 
-    with open(FISCAL_MODEL_FILE) as stream:
-        fdp['model'] = yaml.load(stream.read())
+def assemble_fiscal_datapackage():
+    """Assemble the fiscal datapackage for the concatenated dataset."""
 
-    with open(FISCAL_SCHEMA_FILE) as stream:
-        fdp['resources'][0]['schema'] = yaml.load(stream.read())
+    fiscal_schema = get_fiscal_schema()
+    fdp = fiscal_schema.metadata
+    fdp['model'] = fiscal_schema.model
+    fdp['resources'][0]['schema'] = fiscal_schema.schema
 
     message = 'Fiscal datapackage: \n%s'
     info(message, format_to_json(fdp))
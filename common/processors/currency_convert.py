@@ -1,63 +1,185 @@
-import os
-import json
+"""Convert amounts to euros with monthly exchange rates.
+
+Rates
+-----
+
+Rates are read from the rate store (see `common.rates`) and keyed like
+`PLN-2014-06`. They give the value of one unit of the currency in euros.
+They are loaded once into a `RateIndex`: one array of `Decimal` rates per
+currency, indexed by year and month. With the `interpolate` parameter,
+the gaps between known months are filled. Undated rows
+use the average of the June rates over their funding period, which is
+computed once per period.
+
+Missing rates
+-------------
+
+The keys of the rates that are missing from the store are collected and
+appended to `missing-keys.txt` in one go at the end of each resource, as a
+report of the months to look for. Nothing reads that file: to fill the
+gaps, import a more recent history file from the ECB into the store with
+`python3 -m common.rates import <file>` and run the pipeline again.
+
+"""
+
 from decimal import Decimal
+from functools import lru_cache
 
 from datapackage_pipelines.wrapper import ingest, spew
+from common.rates import get_key, open_rate_store
+
+MISSING_KEYS_FILE = 'missing-keys.txt'
+
+# Undated rows use the rates of this month for each year of their period
+PERIOD_MONTH = 6
+
+
+class RateIndex(object):
+    """Exchange rates indexed by currency, year and month.
+
+    :param currencies: a dict of rates keyed by `<currency>-<year>-<month>`
+
+    """
+
+    def __init__(self, currencies):
+        self._tables = {}
+        self._period_rates = {}
+
+        rates = {}
+        for key, rate in currencies.items():
+            currency, year, month = key.split('-')
+            rates.setdefault(currency, {})[int(year), int(month)] = rate
+
+        for currency, rates_ in rates.items():
+            first_year = min(year for year, _ in rates_)
+            last_year = max(year for year, _ in rates_)
+            floats = [None] * (last_year - first_year + 1) * 12
+            for (year, month), rate in rates_.items():
+                floats[(year - first_year) * 12 + month - 1] = rate
+            decimals = [None if rate is None else Decimal(rate)
+                        for rate in floats]
+            self._tables[currency] = first_year, floats, decimals
+
+    def _get_position(self, currency, year, month):
+        first_year, floats, _ = self._tables.get(currency, (0, (), ()))
+        position = (year - first_year) * 12 + month - 1
+        if 0 <= position < len(floats):
+            return position
+
+    def get_float(self, currency, year, month):
+        """Return the rate as a float (or None)."""
+
+        position = self._get_position(currency, year, month)
+        if position is not None:
+            return self._tables[currency][1][position]
 
-parameters_, datapackage_, resources_ = ingest()
+    def get_rate(self, currency, year, month):
+        """Return the rate as a `Decimal` (or None)."""
 
-column = parameters_['column']
-currency = parameters_['currency']
-currency_column = parameters_['currency-column']
-date_columns = parameters_['date-columns']
+        position = self._get_position(currency, year, month)
+        if position is not None:
+            return self._tables[currency][2][position]
 
-missing = open('missing-keys.txt', 'a')
-written = set()
-currencies = json.load(open(os.path.join(os.path.dirname(__file__), 'currencies.json')))
+    def get_period_rate(self, currency, funding_period):
+        """Return the average rate over a funding period and missing keys.
 
+        :param funding_period: a string like `2007-2013` (the last year is
+            excluded)
+
+        """
+
+        key = currency, funding_period
+        if key not in self._period_rates:
+            first_year, last_year = map(int, funding_period.split('-'))
+            years = range(first_year, last_year)
+            assert len(years) > 0
+
+            rates = []
+            missing_keys = []
+            for year in years:
+                rate = self.get_float(currency, year, PERIOD_MONTH)
+                if rate is None:
+                    missing_keys.append(get_key(currency, year, PERIOD_MONTH))
+                else:
+                    rates.append(rate)
+
+            average = Decimal(sum(rates) / len(rates)) if rates else None
+            self._period_rates[key] = average, tuple(missing_keys)
+
+        return self._period_rates[key]
+
+
+@lru_cache(maxsize=2)
+def load_rate_index(interpolate=False):
+    """Return the index of the rate store (loaded once per process)."""
+
+    store = open_rate_store()
+    try:
+        return RateIndex(store.get_rates(interpolate))
+    finally:
+        store.close()
+
+
+def save_missing_keys(missing_keys, path=MISSING_KEYS_FILE):
+    """Append the keys of missing rates to the missing keys file."""
+
+    if missing_keys:
+        with open(path, 'a') as stream:
+            stream.writelines(key + '\n' for key in sorted(missing_keys))
+
+
+def update_datapackage(datapackage, currency_column):
+    for resource in datapackage['resources']:
+        resource['schema']['fields'].append({
+            'name': currency_column,
+            'type': 'string'
+        })
+    return datapackage
+
+
+def process(resources, column, currency, currency_column, date_columns,
+            rates, missing_keys_file=MISSING_KEYS_FILE):
+    missing_keys = set()
 
-def process(resources):
     def process_single(resource):
         for row in resource:
             row[currency_column] = currency
             ncv = row[column]
             row[column] = None
             if ncv is not None:
-                the_date = None
                 for date_column in date_columns:
                     the_date = row.get(date_column)
                     if the_date is not None:
+                        year, month = the_date.year, the_date.month
+                        rate = rates.get_rate(currency, year, month)
+                        if rate is None:
+                            missing_keys.add(get_key(currency, year, month))
                         break
-                if the_date is not None:
-                    keys = ["%s-%s" % (currency, the_date.strftime('%Y-%m'))]
                 else:
-                    funding_period = list(map(int, row['funding_period'].split('-')))
-                    keys = ['%s-%d-06' % (currency, year) for year in range(funding_period[0], funding_period[1])]
-                assert len(keys) > 0
-                all_rates = [(key, currencies.get(key)) for key in keys]
-                none_keys = map((lambda x: x[0]),
-                                filter((lambda x: x[1] is None), all_rates))
-                rates = list(map((lambda x: x[1]),
-                                 filter((lambda x: x[1] is not None), all_rates)))
-                if len(rates) > 0:
-                    rate = sum(rates) / len(rates)
-                    amount = ncv * Decimal(rate)
-                    row[column] = amount
-                for key in none_keys:
-                    if key not in written:
-                        missing.write(key+'\n')
-                        written.add(key)
+                    rate, period_missing_keys = rates.get_period_rate(
+                        currency, row['funding_period']
+                    )
+                    missing_keys.update(period_missing_keys)
+                if rate is not None:
+                    row[column] = ncv * rate
             yield row
 
+        save_missing_keys(missing_keys, missing_keys_file)
+        missing_keys.clear()
+
     for resource_ in resources:
         yield process_single(resource_)
 
 
-for resource in datapackage_['resources']:
-    resource['schema']['fields'].append({
-        'name': currency_column,
-        'type': 'string'
-    })
-
-spew(datapackage_, process(resources_))
-missing.close()
+if __name__ == '__main__':
+    parameters_, datapackage_, resources_ = ingest()
+    currency_column_ = parameters_['currency-column']
+    datapackage_ = update_datapackage(datapackage_, currency_column_)
+    new_resources_ = process(resources_,
+                             parameters_['column'],
+                             parameters_['currency'],
+                             currency_column_,
+                             parameters_['date-columns'],
+                             load_rate_index(parameters_.get('interpolate',
+                                                             False)))
+    spew(datapackage_, new_resources_)
@@ -0,0 +1,68 @@
+"""Write the fiscal data as a partitioned Parquet dataset on the way.
+
+The rows pass through unchanged, so the step goes right before
+`dump.to_zip`. The dataset is written to the `out-path` folder (next to
+the fiscal zip file by default) and partitioned by the `partition-by`
+columns (see `common.columnar`). Each resource gets its own file in each
+partition. The dataset is moved into place once the last row is read, and
+dropped if the step fails. The step is skipped, with a warning, if pyarrow
+is missing.
+
+"""
+
+import logging
+
+from datapackage_pipelines.wrapper import ingest, spew
+from common.columnar import ParquetDatasetWriter, has_pyarrow
+from common.config import FISCAL_PARQUET_DIR, PARTITION_FIELDS
+from common.utilities import close_after
+
+
+def get_fields(datapackage):
+    """Return the fields of all the resources (without duplicates)."""
+
+    fields = []
+    names = set()
+    for resource in datapackage['resources']:
+        for field in resource.get('schema', {}).get('fields', []):
+            if field['name'] not in names:
+                names.add(field['name'])
+                fields.append(field)
+    return fields
+
+
+def process(datapackage, resources,
+            out_path=FISCAL_PARQUET_DIR, partition_by=PARTITION_FIELDS):
+    if not has_pyarrow():
+        logging.warning('pyarrow is not installed: skipping %s', out_path)
+        yield from resources
+        return
+
+    writer = ParquetDatasetWriter(out_path, get_fields(datapackage),
+                                  partition_by)
+
+    def process_single(resource, part):
+        try:
+            for row in resource:
+                writer.write(row, part)
+                yield row
+        except BaseException:
+            writer.abort()
+            raise
+
+    try:
+        resources = (process_single(resource_, part)
+                     for part, resource_ in enumerate(resources))
+        yield from close_after(resources, writer.close)
+    except BaseException:
+        writer.abort()
+        raise
+
+
+if __name__ == '__main__':
+    parameters_, datapackage_, resources_ = ingest()
+    new_resources_ = process(datapackage_,
+                             resources_,
+                             parameters_.get('out-path', FISCAL_PARQUET_DIR),
+                             parameters_.get('partition-by', PARTITION_FIELDS))
+    spew(datapackage_, new_resources_)
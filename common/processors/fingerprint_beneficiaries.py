@@ -1,13 +1,144 @@
+"""Add a `beneficiary_id` fingerprint of the beneficiary name to each row.
+
+Memoization
+-----------
+
+Beneficiary names repeat a lot (the same municipalities, universities and
+companies appear thousands of times) and normalizing them is slow, so
+fingerprints are memoized in a bounded LRU cache (the `cache-size`
+parameter). With the `store` parameter set to true, fingerprints are also
+saved in a SQLite store in the cache folder, shared by all the pipelines.
+The store keeps one table per version of the `fingerprints` library, so
+an upgrade never serves fingerprints made by the previous version. The hits
+and misses of both are logged at the end of the step.
+
+"""
+
+import os
+import re
+import sqlite3
+import logging
+
+from collections import Counter
+from functools import lru_cache
+from os.path import dirname
+
 import fingerprints
 
 from datapackage_pipelines.wrapper import ingest, spew
+from common.config import FINGERPRINT_CACHE_SIZE, FINGERPRINT_STORE_FILE
+from common.utilities import close_after
+
+# Number of new fingerprints written to the store in one transaction
+STORE_BATCH_SIZE = 1000
+
+
+def get_store_table():
+    """Return the store table for the installed `fingerprints` library."""
+
+    # Imported here to keep processor start-up fast
+    import pkg_resources
+
+    try:
+        version = pkg_resources.get_distribution('fingerprints').version
+    except pkg_resources.DistributionNotFound:
+        version = 'unknown'
+    return 'fingerprints_' + re.sub(r'\W', '_', version)
+
+
+class Fingerprinter(object):
+    """Memoize fingerprints in memory and (optionally) on disk.
+
+    :param cache_size: the maximum number of names kept in memory
+    :param store_file: the path to the SQLite store (or None)
+
+    """
+
+    def __init__(self, cache_size=FINGERPRINT_CACHE_SIZE, store_file=None):
+        self.stats = Counter()
+        self.generate = lru_cache(maxsize=cache_size)(self._generate)
+        self._new_fingerprints = []
+        self._store = None
+        self._table = None
+
+        if store_file:
+            self._table = get_store_table()
+            try:
+                os.makedirs(dirname(store_file), exist_ok=True)
+                self._store = sqlite3.connect(store_file, timeout=30)
+                with self._store:
+                    self._store.execute(
+                        'CREATE TABLE IF NOT EXISTS {} '
+                        '(name TEXT PRIMARY KEY, fingerprint TEXT)'
+                        .format(self._table)
+                    )
+            except sqlite3.Error as error:
+                logging.warning('Could not open %s: %s', store_file, error)
+                self._store = None
+
+    def _generate(self, name):
+        if self._store and isinstance(name, str):
+            cached = self._store.execute(
+                'SELECT fingerprint FROM {} WHERE name = ?'.format(self._table),
+                (name,)
+            ).fetchone()
+            if cached:
+                self.stats['store hits'] += 1
+                return cached[0]
+
+            self.stats['store misses'] += 1
+            fingerprint = fingerprints.generate(name)
+            self._new_fingerprints.append((name, fingerprint))
+            if len(self._new_fingerprints) >= STORE_BATCH_SIZE:
+                self.flush()
+            return fingerprint
+
+        return fingerprints.generate(name)
+
+    def flush(self):
+        """Save the new fingerprints in the store."""
+
+        if self._store and self._new_fingerprints:
+            try:
+                with self._store:
+                    self._store.executemany(
+                        'INSERT OR IGNORE INTO {} VALUES (?, ?)'
+                        .format(self._table),
+                        self._new_fingerprints
+                    )
+            except sqlite3.Error as error:
+                logging.warning('Could not save fingerprints: %s', error)
+        self._new_fingerprints = []
+
+    def close(self):
+        """Flush the store and log the statistics."""
+
+        self.flush()
+        if self._store:
+            self._store.close()
+            self._store = None
+
+        cache_info = self.generate.cache_info()
+        self.stats.update({'memo hits': cache_info.hits,
+                           'memo misses': cache_info.misses})
+        report = ', '.join('{} {}'.format(count, key)
+                           for key, count in sorted(self.stats.items()))
+        logging.info('Fingerprints: %s', report)
+
+
+def get_options(parameters):
+    """Return the keyword arguments of `process` from the step parameters."""
 
-parameters_, datapackage_, resources_ = ingest()
+    return {
+        'cache_size': parameters.get('cache-size', FINGERPRINT_CACHE_SIZE),
+        'store_file': (FINGERPRINT_STORE_FILE
+                       if parameters.get('store', False) else None),
+    }
 
 
-def process_single(resource):
+def process_single(resource, fingerprinter):
     for row in resource:
-        fp = fingerprints.generate(row['beneficiary_name'])
+        fp = fingerprinter.generate(row['beneficiary_name'])
         if fp is not None:
             row['beneficiary_id'] = fp.capitalize()
         else:
@@ -15,9 +146,13 @@ def process_single(resource):
         yield row
 
 
-def process(resources):
-    for resource_ in resources:
-        yield process_single(resource_)
+def process(resources, cache_size=FINGERPRINT_CACHE_SIZE, store_file=None):
+    fingerprinter = Fingerprinter(cache_size, store_file)
+    resources = (process_single(resource_, fingerprinter)
+                 for resource_ in resources)
+    yield from close_after(resources, fingerprinter.close)
 
 
-spew(datapackage_, process(resources_))
+if __name__ == '__main__':
+    parameters_, datapackage_, resources_ = ingest()
+    spew(datapackage_, process(resources_, **get_options(parameters_)))
@@ -1,47 +1,124 @@
-"""Map the raw columns names to fiscal fields where indicated."""
+"""Pick the amount of each row among several candidate columns.
+
+The target column gets the value of the first candidate column (in the
+given order) with a non-zero digit. If there is none, it gets the first
+candidate with a zero, and if there is none either, the row is left as
+it is. The kind column gets the name of the selected column.
+
+Each candidate value is classified once (empty, zero or non-zero), so the
+selection takes a single pass over the candidates. Rows are processed in
+blocks of columns (see `common.row_processor.process_blocks`). The number
+of rows taken from each column is logged for each resource, to see which
+amount kind dominates.
+
+"""
+
 import re
+import logging
+
+from collections import Counter
 
 from datapackage_pipelines.wrapper import ingest, spew
+from common.row_processor import block_length, process_blocks
 
-parameters_, datapackage_, resources_ = ingest()
+EMPTY, ZERO, NON_ZERO = range(3)
 
-column_order = parameters_['column-order']
-target_column = parameters_['target-column']
-kind_column = parameters_['kind-column']
+_non_zero_digit = re.compile('[1-9]')
 
-from_one = re.compile('[1-9]+')
-from_zero = re.compile('[0-9]+')
 
+def classify(value):
+    """Return whether a value is EMPTY, ZERO or NON_ZERO."""
 
-def is_empty(value, digits):
     if value is None:
-        return True
-    value = str(value).strip()
-    if value == '':
-        return True
-    if len(digits.findall(value)) == 0:
-        return True
-    return False
-
-
-def process(resources):
-    def process_single(resource):
-        for row in resource:
-            for digits in [from_one, from_zero]:
-                done = False
-                for column in column_order:
-                    if is_empty(row.get(column), digits):
-                        continue
-                    row[target_column] = row[column]
-                    row[kind_column] = column
-                    done = True
-                    break
-                if done:
-                    break
-            yield row
-
-    for resource_ in resources:
-        yield process_single(resource_)
+        return EMPTY
+    value = str(value)
+    if _non_zero_digit.search(value):
+        return NON_ZERO
+    if '0' in value:
+        return ZERO
+    return EMPTY
+
+
+def select_columns(block, column_order):
+    """Return the column of the amount for each row of a block."""
+
+    nb_rows = block_length(block)
+    selected = [None] * nb_rows
+    fallbacks = [None] * nb_rows
+    pending = range(nb_rows)
+
+    for column in column_order:
+        values = block.get(column)
+        if values is None:
+            continue
+        remaining = []
+        for i in pending:
+            kind = classify(values[i])
+            if kind == NON_ZERO:
+                selected[i] = column
+            else:
+                if kind == ZERO and fallbacks[i] is None:
+                    fallbacks[i] = column
+                remaining.append(i)
+        pending = remaining
+
+    for i in pending:
+        selected[i] = fallbacks[i]
+    return selected
+
+
+def log_statistics(stats, resource_index):
+    report = ', '.join('{} {}'.format(column or 'no amount', count)
+                       for column, count in stats.most_common())
+    logging.info('Amounts of resource %s: %s', resource_index, report)
+
+
+def process_block(block, column_order, target_column, kind_column,
+                  stats=None):
+    """Pick the amounts of a block of data.
+
+    Rows without an amount keep the values of the target and kind columns.
+    If the block has no such column, it is only added (with None for the
+    rows without an amount) when some row has an amount.
+
+    :param stats: an optional `Counter` of the selected columns
+    """
+
+    nb_rows = block_length(block)
+    targets = list(block.get(target_column) or [None] * nb_rows)
+    kinds = list(block.get(kind_column) or [None] * nb_rows)
+
+    selected = select_columns(block, column_order)
+    for i, column in enumerate(selected):
+        if column is not None:
+            targets[i] = block[column][i]
+            kinds[i] = column
+
+    if any(column is not None for column in selected):
+        block[target_column] = targets
+        block[kind_column] = kinds
+    if stats is not None:
+        stats.update(selected)
+    return block, '_pass'
+
+
+def process(resources, column_order, target_column, kind_column):
+    def process_single(resource, resource_index):
+        stats = Counter()
+        parameters = {
+            'column_order': column_order,
+            'target_column': target_column,
+            'kind_column': kind_column,
+            'stats': stats,
+        }
+        new_resources, _ = process_blocks([resource], process_block,
+                                          parameters=parameters,
+                                          verbose=False)
+        yield from next(new_resources)
+        log_statistics(stats, resource_index)
+
+    for resource_index_, resource_ in enumerate(resources):
+        yield process_single(resource_, resource_index_)
 
 
 # for resource in datapackage_['resources']:
@@ -56,4 +133,11 @@ def process(resources):
 #         'type': 'string'
 #     })
 
-spew(datapackage_, process(resources_))
+
+if __name__ == '__main__':
+    parameters_, datapackage_, resources_ = ingest()
+    new_resources_ = process(resources_,
+                             parameters_['column-order'],
+                             parameters_['target-column'],
+                             parameters_['kind-column'])
+    spew(datapackage_, new_resources_)
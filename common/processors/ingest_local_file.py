@@ -8,19 +8,18 @@
 # This new object oriented approach should improve readability and facilitate
 # the handling of special cases through subclassing.
 
-import json
-import cchardet
 
+import os
 import logging
 from datapackage_pipelines.wrapper import ingest
 from datapackage_pipelines.wrapper import spew
 from os.path import splitext
-from petl import fromdicts, look
-from pip.utils import cached_property
 from tabulator import Stream
 
-from common.config import LOG_SAMPLE_SIZE
-from common.utilities import format_to_json
+from common.config import LOG_SAMPLE_SIZE, INGESTION_WORKERS
+from common.encoding import detect_encoding
+from common.parallel import parallel_streams
+from common.utilities import cached_property, format_to_json, get_json_keys
 
 
 class BaseIngestor(object):
@@ -54,24 +53,34 @@ class BaseIngestor(object):
     def rows(self):
         """Return a generator of rows."""
 
-        self._log_parameters()
-        self._check_headers()
-
         logging.info('Running preprocessors: %r', self._pre_processors)
 
         for pre_processor in self._pre_processors:
             pre_processor()
 
         logging.info('Opening resource: %s', self.resource['path'])
-        with Stream(self.resource['path'], **self._body_options) as stream:
+        with self._stream as stream:
+            self._log_parameters()
+            self._check_headers()
+
+            stream.headers = self._headers
             logging.info('First %s rows =\n%s', LOG_SAMPLE_SIZE, self._show(stream))
             for row in stream.iter(keyed=True):
                 yield row
 
-    @property
+    @cached_property
+    def _stream(self):
+        """The source stream, opened once for both the headers and the body."""
+
+        options = dict(self._body_options, **self._header_options)
+        if isinstance(options['headers'], int):
+            options['sample_size'] = max(LOG_SAMPLE_SIZE, options['headers'])
+
+        return Stream(self.resource['path'], **options).open()
+
+    @cached_property
     def _body_options(self):
         return {
-            'headers': self._headers,
             'sample_size': LOG_SAMPLE_SIZE,
             'post_parse': self._post_processors,
         }
@@ -134,14 +143,13 @@ class BaseIngestor(object):
                 )
             yield index, headers, values_as_strings
 
-    @property
+    @cached_property
     def _raw_headers(self):
-        """Headers as found in the data file."""
+        """Headers as found in the data file (header rows are not data)."""
 
-        with Stream(self.resource['path'], **self._header_options) as stream:
-            return stream.headers
+        return self._stream.headers
 
-    @property
+    @cached_property
     def _headers(self):
         """Headers without redundant blanks and/or line breaks."""
 
@@ -155,7 +163,7 @@ class BaseIngestor(object):
 
         return clean_headers
 
-    @property
+    @cached_property
     def _fields(self):
         """Fields expected in the data from the source file."""
         return [field['name'] for field in self.resource['schema']['fields']]
@@ -177,6 +185,8 @@ class BaseIngestor(object):
     def _show(stream):
         """Return a table of sample data."""
 
+        from petl import fromdicts, look
+
         keyed_rows = []
         for row in stream.sample:
             keyed_rows.append(dict(zip(stream.headers, row)))
@@ -192,9 +202,9 @@ class BaseIngestor(object):
 class CSVIngestor(BaseIngestor):
     """An ingestor for csv files."""
 
-    @property
+    @cached_property
     def _body_options(self):
-        options = super(CSVIngestor, self)._body_options
+        options = dict(super(CSVIngestor, self)._body_options)
         options.update(encoding=self._encoding)
         if self._parser_options.get('delimiter'):
             options.update(delimiter=self._parser_options['delimiter'])
@@ -207,7 +217,7 @@ class CSVIngestor(BaseIngestor):
     @property
     def _post_processors(self):
         return [self._lowercase_empty_values,
-                self._skip_header, self._drop_bad_rows, self.force_strings]
+                self._drop_bad_rows, self.force_strings]
 
     @cached_property
     def _encoding(self):
@@ -219,20 +229,13 @@ class CSVIngestor(BaseIngestor):
             return self._detect_encoding()
 
     def _detect_encoding(self):
-        """Sniff the encoding using the entire file."""
+        """Sniff the encoding using a sample of the file."""
 
-        with open(self.resource['path'], 'rb') as stream:
-            text = stream.read()
-            encoding = cchardet.detect(text)['encoding']
-            logging.info('Detected %s encoding with cchardet', encoding)
-            return encoding
+        return detect_encoding(self.resource['path'])
 
     @property
     def _header_options(self):
-        options = dict(headers=1, encoding=self._encoding)
-        if self._parser_options.get('delimiter'):
-            options.update(delimiter=self._parser_options['delimiter'])
-        return options
+        return dict(headers=1)
 
     @staticmethod
     def _drop_bad_rows(rows):
@@ -248,25 +251,21 @@ class CSVIngestor(BaseIngestor):
                     .format(index, format_to_json(headers), format_to_json(row))
                 assert False, message
 
-    @staticmethod
-    def _skip_header(rows):
-        """Skip the header (post-processor)."""
-
-        # Headers are passed as an option and need to be explicitly ignored.
-        for index, headers, values in rows:
-            if index != 1:
-                yield index, headers, values
-
 
 class JSONIngestor(BaseIngestor):
     """An ingestor for json files."""
 
-    @property
+    @cached_property
     def _body_options(self):
-        options = super(JSONIngestor, self)._body_options
+        options = dict(super(JSONIngestor, self)._body_options)
         options.update(encoding=self._encoding)
         return options
 
+    @property
+    def _header_options(self):
+        # Keys are collected over the whole file (see `_raw_headers`)
+        return dict(headers=self._headers)
+
     @cached_property
     def _encoding(self):
         """Select or detect the file encoding and set the resource utf-8."""
@@ -276,45 +275,21 @@ class JSONIngestor(BaseIngestor):
         else:
             return 'utf-8'
 
-    @property
-    def _pre_processors(self):
-        return [self._fill_missing_fields]
-
     @property
     def _post_processors(self):
         return [self._lowercase_empty_values,
                 self.force_strings]
 
-    @property
-    def _fill_missing_fields(self):
-        """Pre-fill incomplete JSON rows (to avoid fields mixing up)."""
-
-        def fill_missing_fields():
-            with open(self.resource['path']) as stream:
-                rows = json.loads(stream.read())
-
-            for row in rows:
-                for header in self._raw_headers:
-                    if header not in row:
-                        row[header] = None
-
-            with open(self.resource['path'], 'w+') as stream:
-                stream.write(format_to_json(rows))
-
-        return fill_missing_fields
-
     @cached_property
     def _raw_headers(self):
-        """Return all field names encountered in the file."""
+        """Return all field names encountered in the file.
 
-        keys = set()
+        Rows are streamed as keyed rows, so tabulator fills in the keys
+        which are missing from a row (the source file is left untouched).
 
-        with open(self.resource['path']) as stream:
-            rows = json.loads(stream.read())
-            for row in rows:
-                keys.update(set(row))
+        """
 
-        return sorted(keys)
+        return sorted(get_json_keys(self.resource['path']))
 
 
 class XLSIngestor(BaseIngestor):
@@ -323,19 +298,9 @@ class XLSIngestor(BaseIngestor):
     @property
     def _post_processors(self):
         return [self._lowercase_empty_values,
-                self._skip_header,
                 self._fixed_points,
                 self.force_strings]
 
-    @staticmethod
-    def _skip_header(rows):
-        """Skip the header (post-processor)."""
-
-        # Headers are passed as an option and need to be explicitly ignored.
-        for index, headers, values in rows:
-            if index != 1:
-                yield index, headers, values
-
     @staticmethod
     def _fixed_points(rows):
         """Convert floats to 2-digit fixed precision strings"""
@@ -351,15 +316,36 @@ class XLSIngestor(BaseIngestor):
 XLSXIngestor = XLSIngestor
 
 
-def ingest_resources(datapackage):
-    """Ingest each resource one by one into the pipeline."""
+def ingest_resource(resource):
+    """Return the rows of one resource."""
+
+    return BaseIngestor.load(resource).rows
+
+
+def ingest_resources(datapackage, workers=INGESTION_WORKERS):
+    """Ingest each resource into the pipeline.
+
+    With more than one worker, resources are parsed in separate processes
+    (up to `workers` at a time, one per CPU by default) while the rows are
+    streamed into the pipeline in the original order.
+
+    """
+
+    resources = datapackage['resources']
+    workers = min(workers or os.cpu_count(), len(resources))
+
+    if workers > 1:
+        logging.info('Ingesting %s resources with %s workers',
+                     len(resources), workers)
+        yield from parallel_streams(ingest_resource, resources, workers)
 
-    for resource in datapackage['resources']:
-        ingestor = BaseIngestor.load(resource)
-        yield ingestor.rows
+    else:
+        for resource in resources:
+            yield ingest_resource(resource)
 
 
 if __name__ == '__main__':
-    _, datapackage_, _ = ingest()
-    resources = list(ingest_resources(datapackage_))
+    parameters_, datapackage_, _ = ingest()
+    workers_ = parameters_.get('workers', INGESTION_WORKERS)
+    resources = list(ingest_resources(datapackage_, workers=workers_))
     spew(datapackage_, resources)
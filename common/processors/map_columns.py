@@ -14,14 +14,15 @@ When building the lookup table, we check that:
 
 from logging import info
 from datapackage_pipelines.wrapper import ingest, spew
-from common.utilities import get_fiscal_field_names, process
+from common.renaming import compile_renamer, rename_rows
+from common.schema import get_fiscal_schema
 
 
 def build_lookup_table(datapackage_):
     """Return the mapping for the first resource."""
 
     fields = datapackage_['resources'][0]['schema']['fields']
-    fiscal_fields = get_fiscal_field_names()
+    fiscal_fields = get_fiscal_schema().field_set
 
     for field in fields:
         checks = ('maps_to' in field,
@@ -39,13 +40,13 @@ def apply_mapping(row, mapping=None):
     """Apply the mapping to one row."""
 
     if mapping:
-        for old, new in mapping:
-            row[new] = row.pop(old)
+        return compile_renamer(row, dict(mapping))(row)
     return row
 
 
 if __name__ == '__main__':
     _, datapackage, resources = ingest()
-    lookup_table = tuple(build_lookup_table(datapackage))
-    new_resources = process(resources, apply_mapping, mapping=lookup_table)
+    lookup_table = dict(build_lookup_table(datapackage))
+    new_resources = (rename_rows(resource, lookup_table)
+                     for resource in resources)
     spew(datapackage, new_resources)
@@ -20,13 +20,16 @@ Processing
 If `maps_to` is a valid fiscal field name, the processor renames the keys in
 the data and updates the datapackage accordingly. If `maps_to` is '_unknown`
 or `_ignored`, the field is dropped altogether from the data and the
-datapackage.
+datapackage. Each output row is built in one step by a rename plan compiled
+once per resource (see `common.renaming`).
 
 
 """
 
 from datapackage_pipelines.wrapper import ingest, spew
-from common.utilities import get_fiscal_field_names, process
+from common.config import IGNORED_FIELD_TAG, UNKNOWN_FIELD_TAG
+from common.renaming import compile_renamer, rename_rows
+from common.utilities import get_fiscal_field_names
 
 
 def build_mapping_tables(datapackage):
@@ -68,7 +71,7 @@ def update_datapackage(datapackage, mappings):
         for field in resource['schema']['fields']:
             fiscal_key = mappings[i][field['name']]
 
-            if fiscal_key not in ('_unknown', '_ignored'):
+            if fiscal_key not in (UNKNOWN_FIELD_TAG, IGNORED_FIELD_TAG):
                 field.update({'name': fiscal_key})
                 del field['maps_to']
                 if 'translates_to' in field:
@@ -80,24 +83,31 @@ def update_datapackage(datapackage, mappings):
     return datapackage
 
 
+def get_renaming(mapping):
+    """Return the rename plan mapping (dropped fields map to None)."""
+
+    dropped = IGNORED_FIELD_TAG, UNKNOWN_FIELD_TAG
+    return {raw_key: None if fiscal_key in dropped else fiscal_key
+            for raw_key, fiscal_key in mapping.items()}
+
+
 def apply_mapping(row, mappings=None, resource_index=None):
     """Rename data keys with a valid mapping and drop the rest."""
 
-    for raw_key, fiscal_key in mappings[resource_index].items():
-        if fiscal_key in ('_ignored', '_unknown'):
-            del row[raw_key]
-        else:
-            row[fiscal_key] = row.pop(raw_key)
+    renaming = get_renaming(mappings[resource_index])
+    return compile_renamer(row, renaming)(row)
+
+
+def process_resources(resources, mappings):
+    """Rename the rows of each resource with a plan compiled once."""
 
-    return row
+    for resource, mapping in zip(resources, mappings):
+        yield rename_rows(resource, get_renaming(mapping))
 
 
 if __name__ == '__main__':
     _, datapackage_, resources_ = ingest()
     mappings_ = build_mapping_tables(datapackage_)
     datapackage_ = update_datapackage(datapackage_, mappings_)
-    new_resources_ = process(resources_,
-                             apply_mapping,
-                             mappings=mappings_,
-                             pass_resource_index=True)
+    new_resources_ = process_resources(resources_, mappings_)
     spew(datapackage_, new_resources_)
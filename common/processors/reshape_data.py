@@ -1,51 +1,62 @@
-"""This processor reshapes the data to match the fiscal schema."""
+"""This processor reshapes the data to match the fiscal schema.
+
+Rows are projected onto the fiscal fields with a plan compiled once per
+resource (see `common.renaming`): the fiscal fields found in the source
+are picked in one go and the others are filled with `None`. Output rows
+(and the resource schema) follow the order of the fiscal schema.
+
+"""
 
 from datapackage_pipelines.wrapper import ingest
 from datapackage_pipelines.wrapper import spew
-from common.utilities import get_fiscal_field_names
+from common.renaming import compile_renamer, rename_rows
+from common.schema import get_fiscal_schema
+
+
+def _get_plan(fiscal_fields):
+    fiscal_fields = tuple(fiscal_fields)
+    return {key: key for key in fiscal_fields}, dict.fromkeys(fiscal_fields)
 
 
 def process_row(row, fiscal_fields):
     """Add and remove appropriate columns.
+
+    :param fiscal_fields: the fiscal field names
     """
-    surplus_keys = set(row) - set(fiscal_fields)
-    missing_keys = set(fiscal_fields) - set(row)
-    for key in missing_keys:
-        row[key] = None
-    for key in surplus_keys:
-        del row[key]
-    assert set(row) == set(fiscal_fields)
-    return row
+    mapping, template = _get_plan(fiscal_fields)
+    rename = compile_renamer(row, mapping, keep_others=False,
+                             template=template)
+    return rename(row)
 
 
 def process_resources(resources, fiscal_fields):
     """Return an iterator of row iterators.
+
+    :param fiscal_fields: the fiscal field names (in output order)
     """
+    mapping, template = _get_plan(fiscal_fields)
     for resource in resources:
-        def process_rows(resource_):
-            for i, row in enumerate(resource_):
-                yield process_row(row, fiscal_fields)
+        yield rename_rows(resource, mapping, keep_others=False,
+                          template=template)
 
-        yield process_rows(resource)
+
+def update_datapackage(datapackage):
+    """Add missing fiscal fields and drop the others from the schema.
+    """
+    fiscal_schema = get_fiscal_schema()
+    for resource in datapackage['resources']:
+        fields = {field['name']: field
+                  for field in resource['schema']['fields']}
+        resource['schema']['fields'] = [
+            fields.get(name) or {'name': name, 'type': 'string'}
+            for name in fiscal_schema.field_names
+        ]
+    return datapackage
 
 
 if __name__ == '__main__':
     parameters_, datapackage_, resources_ = ingest()
-    for resource in datapackage_['resources']:
-        fiscal_fields_ = set(get_fiscal_field_names())
-        fields = resource['schema']['fields']
-        new_fields = []
-        for field in fields:
-            if field['name'] in fiscal_fields_:
-                new_fields.append(field)
-                fiscal_fields_.remove(field['name'])
-        for f in fiscal_fields_:
-            new_fields.append({
-                'name': f,
-                'type': 'string'
-            })
-        resource['schema']['fields'] = new_fields
-
-    fiscal_fields_ = set(get_fiscal_field_names())
+    datapackage_ = update_datapackage(datapackage_)
+    fiscal_fields_ = get_fiscal_schema().field_names
     new_resources_ = process_resources(resources_, fiscal_fields_)
     spew(datapackage_, new_resources_)
@@ -26,9 +26,11 @@ The processor toggles field types to match changes in the data.
 # TODO: relax the single resource constraint in `sniff_and_cast` processor
 import re
 
-import petl
-
+from collections import Counter, defaultdict
 from copy import deepcopy
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
 from logging import warning, info
 from datapackage_pipelines.wrapper import ingest, spew
 from tableschema.exceptions import CastError
@@ -71,10 +73,153 @@ class CasterNotFound(Exception):
         )
 
 
+class BaseCaster(object):
+    """Cast values of one field with one format using tableschema.
+
+    The `tableschema.Field` object is built once. Subclasses implement a
+    native fast path for string values in `_cast_string`, which must behave
+    exactly like tableschema or return `NO_MATCH`. Everything else is
+    delegated to the `Field` object.
+
+    """
+
+    NO_MATCH = object()
+
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self.field = Field(descriptor)
+        self.is_native = not descriptor.get('constraints')
+
+    def __call__(self, value):
+        """Return the cast value or raise a `CastError`."""
+
+        cast_value = self.try_cast(value)
+        if cast_value is self.NO_MATCH:
+            return self.field.cast_value(value)
+        return cast_value
+
+    def try_cast(self, value):
+        """Return the cast value or `NO_MATCH` (this is cheaper than raising)."""
+
+        if self.is_native and type(value) is str:
+            if value == '':
+                return None
+            return self._cast_string(value)
+
+        try:
+            return self.field.cast_value(value)
+        except CastError:
+            return self.NO_MATCH
+
+    def _cast_string(self, value):
+        try:
+            return self.field.cast_value(value)
+        except CastError:
+            return self.NO_MATCH
+
+
+class NumberCaster(BaseCaster):
+    """A native number caster: one `str.translate` then `Decimal`."""
+
+    DIGITS = set('0123456789')
+    BARE_NUMBER_REGEX = re.compile(r'((^\D*)|(\D*$))')
+
+    def __init__(self, descriptor):
+        super(NumberCaster, self).__init__(descriptor)
+        group_char = descriptor.get('groupChar', '')
+        decimal_char = descriptor.get('decimalChar', '.')
+        self.bare_number = descriptor.get('bareNumber', True)
+
+        translations = {}
+        if group_char:
+            translations[group_char] = None
+        if decimal_char != '.':
+            translations[decimal_char] = '.'
+        self.translation_table = str.maketrans(translations)
+
+    def _cast_string(self, value):
+        value = ''.join(value.split()).translate(self.translation_table)
+
+        if not self.bare_number:
+            if not value or value[0] not in self.DIGITS \
+                    or value[-1] not in self.DIGITS:
+                value = self.BARE_NUMBER_REGEX.sub('', value)
+
+        try:
+            return Decimal(value)
+        except (InvalidOperation, ValueError):
+            return self.NO_MATCH
+
+
+class DateCaster(BaseCaster):
+    """A native date caster with a parser for fixed-width numeric formats.
+
+    Dates are highly repetitive so parsed strings are also memoized.
+
+    """
+
+    CACHE_SIZE = 4096
+    FIXED_WIDTH_DIRECTIVES = {'%Y': r'(\d{4})', '%m': r'(\d{2})', '%d': r'(\d{2})'}
+    FIXED_WIDTH_SEPARATORS = set('-/.')
+
+    def __init__(self, descriptor):
+        super(DateCaster, self).__init__(descriptor)
+        format_ = descriptor.get('format', 'default')
+        if format_ == 'default':
+            format_ = '%Y-%m-%d'
+        elif format_.startswith('fmt:'):
+            format_ = format_.replace('fmt:', '')
+
+        self.format = format_
+        self.regex, self.directives = self._compile(format_)
+        self._cast_string = lru_cache(self.CACHE_SIZE)(self._parse)
+
+        if format_ == 'any':
+            self.is_native = False
+
+    @classmethod
+    def _compile(cls, format_):
+        """Return a regex and the directive order, if the format is simple."""
+
+        pattern = ''
+        directives = []
+        tokens = re.split('(%.)', format_)
+
+        for token in tokens:
+            if token in cls.FIXED_WIDTH_DIRECTIVES:
+                pattern += cls.FIXED_WIDTH_DIRECTIVES[token]
+                directives.append(token)
+            elif set(token) <= cls.FIXED_WIDTH_SEPARATORS:
+                pattern += re.escape(token)
+            else:
+                return None, None
+
+        if sorted(directives) != ['%Y', '%d', '%m']:
+            return None, None
+
+        return re.compile(pattern, re.ASCII), directives
+
+    def _parse(self, value):
+        if self.regex:
+            match = self.regex.fullmatch(value)
+            if match:
+                parts = dict(zip(self.directives, map(int, match.groups())))
+                try:
+                    return date(parts['%Y'], parts['%m'], parts['%d'])
+                except ValueError:
+                    return self.NO_MATCH
+
+        try:
+            return datetime.strptime(value, self.format).date()
+        except ValueError:
+            return self.NO_MATCH
+
+
 class BaseSniffer(object):
     """A class that tries very hard to find an appropriate caster."""
 
     jst_type_class = None
+    caster_class = BaseCaster
     format_keys = []
     format_guesses = []
 
@@ -95,55 +240,51 @@ class BaseSniffer(object):
         self.nb_failures = 0
         self.failures = []
         self.casters = []
+        self._cast_order = None
         self.init_casters(field)
 
     def init_casters(self, field):
-        casters = []
-        # if all(self.format.values()):
-        #     _field = deepcopy(field).update(self.format)
-        #     casters.append((self.jst_type_class(_field), 0, self.format))
+        """Rank the format guesses against the sample values.
+
+        Each guess is evaluated over the whole sample column in one pass
+        and only the values that it could not parse are handed over to the
+        next guess. Distinct values are evaluated once and weighted by their
+        number of occurrences. Each value is credited to the first guess
+        that parses it, so the ranking is the same as trying every value
+        against every guess in turn.
+
+        """
+
+        casters = [(self._get_caster(field, fmt), 0, deepcopy(fmt))
+                   for fmt in self.format_guesses]
+
+        value_counts = Counter(value for value in self.sample_values if value)
+        error_messages = defaultdict(set)
+        unresolved = list(value_counts)
+
+        for idx, (caster, _, fmt) in enumerate(casters):
+            if not unresolved:
+                break
 
-        for fmt in self.format_guesses:
-            _field = deepcopy(field)
-            _field.update(fmt)
-            _field.setdefault('format', 'default')
-            _field['type'] = self.jst_type_class
+            successes = 0
+            failed = []
 
-            def get_caster(format_, __field):
-                def caster(v):
-                    f = Field(__field)
-                    return f.cast_value(v)
-                return caster
+            for raw_value in unresolved:
+                messages = error_messages[raw_value]
+                if self._try_caster(caster, fmt, raw_value, messages):
+                    successes += value_counts[raw_value]
+                else:
+                    failed.append(raw_value)
 
-            casters.append((get_caster(format, _field), 0, deepcopy(fmt)))
+            casters[idx] = (caster, successes, fmt)
+            unresolved = failed
 
+        unresolved = set(unresolved)
         for raw_value in self.sample_values:
-            if raw_value:
-                success = False
-                error_messages = set()
-                for idx in range(len(casters)):
-                    caster, successes, fmt = casters[idx]
-                    try:
-                        assert self._pre_cast_checks_ok(fmt, raw_value), \
-                            "Pre cast check failed for %r, %s" % (fmt, raw_value)
-                        casted = self._prepare_value(fmt, raw_value)
-                        casted = caster(casted)
-                        assert self._post_cast_check_ok(fmt, casted), \
-                            "Post cast check failed for %r, %s, %r" % (fmt, casted, raw_value)
-                        casters[idx] = (caster, successes+1, fmt)
-                        success = True
-                        break
-                    except CastError as e:
-                        for err in e.errors:
-                            error_messages.add("CastError %s for %r, %s" % (err, fmt, raw_value))
-                    except TypeError as e:
-                        error_messages.add("TypeError %s for %r, %s" % (e, fmt, raw_value))
-                        raise
-                    except AssertionError as e:
-                        error_messages.add(str(e))
-                if not success:
-                    self.nb_failures += 1
-                    self.failures.append([raw_value, list(error_messages)])
+            if raw_value in unresolved:
+                self.nb_failures += 1
+                messages = list(error_messages[raw_value])
+                self.failures.append([raw_value, messages])
 
         casters.sort(key=lambda x: x[1], reverse=True)
         self.casters = casters
@@ -154,19 +295,64 @@ class BaseSniffer(object):
 
         raise CasterNotFound(self)
 
+    def _get_caster(self, field, fmt):
+        """Return a caster function for one format guess."""
+
+        _field = deepcopy(field)
+        _field.update(fmt)
+        _field.setdefault('format', 'default')
+        _field['type'] = self.jst_type_class
+        return self.caster_class(_field)
+
+    def _try_caster(self, caster, fmt, raw_value, error_messages):
+        """Return whether the caster parses the value, else log errors."""
+
+        try:
+            assert self._pre_cast_checks_ok(fmt, raw_value), \
+                "Pre cast check failed for %r, %s" % (fmt, raw_value)
+            casted = self._prepare_value(fmt, raw_value)
+            casted = caster(casted)
+            assert self._post_cast_check_ok(fmt, casted), \
+                "Post cast check failed for %r, %s, %r" % (fmt, casted, raw_value)
+            return True
+        except CastError as e:
+            for err in e.errors:
+                error_messages.add("CastError %s for %r, %s" % (err, fmt, raw_value))
+        except TypeError as e:
+            error_messages.add("TypeError %s for %r, %s" % (e, fmt, raw_value))
+            raise
+        except AssertionError as e:
+            error_messages.add(str(e))
+        return False
+
     def cast(self, raw_value):
-        exc = None
-        bad_value = None
-        for caster, _, fmt in self.casters:
-            try:
-                raw_value = self._prepare_value(fmt, raw_value)
-                return caster(raw_value)
-            except (CastError) as e:
-                bad_value = raw_value
-                exc = e
-        assert exc is not None
-        logging.error('Problematic value: %r', bad_value)
-        raise exc
+        """Cast a value with the first caster that can parse it.
+
+        Casters are tried in order of hits, starting with the ranking found
+        by the sniffer. When a caster gets more hits than the one before it,
+        the two swap places, so that the most frequent format comes first.
+
+        """
+
+        if self._cast_order is None:
+            self._cast_order = [[successes, caster, fmt]
+                                for caster, successes, fmt in self.casters]
+
+        for position, entry in enumerate(self._cast_order):
+            _, caster, fmt = entry
+            raw_value = self._prepare_value(fmt, raw_value)
+            cast_value = caster.try_cast(raw_value)
+
+            if cast_value is not caster.NO_MATCH:
+                entry[0] += 1
+                if position and entry[0] > self._cast_order[position - 1][0]:
+                    self._cast_order[position - 1:position + 1] = \
+                        [entry, self._cast_order[position - 1]]
+                return cast_value
+
+        logging.error('Problematic value: %r', raw_value)
+        _, caster, _ = self._cast_order[-1]
+        return caster.field.cast_value(raw_value)
 
     def _prepare_value(self, fmt, value):
         return value
@@ -181,9 +367,7 @@ class BaseSniffer(object):
     def _get_field_sample(resource_sample, field):
         """Return a subset of the relevant data column."""
 
-        sample_table = petl.fromdicts(resource_sample)
-        sample_column = list(petl.values(sample_table, field['name']))
-        return sample_column
+        return [row.get(field['name']) for row in resource_sample]
 
     def _log_success(self):
         message = (
@@ -211,12 +395,14 @@ class DateSniffer(BaseSniffer):
     format_keys = ['format']
     format_guesses = DATE_FORMATS
     jst_type_class = 'date'
+    caster_class = DateCaster
 
 
 class NumberSniffer(BaseSniffer):
     format_keys = ['decimalChar', 'groupChar']
     format_guesses = NUMBER_FORMATS
     jst_type_class = 'number'
+    caster_class = NumberCaster
 
     def _pre_cast_checks_ok(self, fmt, value):
         if value is not None:
@@ -229,15 +415,21 @@ class NumberSniffer(BaseSniffer):
                 if decimal_index < group_index:
                     return False
 
-            pattern = ('[0-9]+' + '([{groupChar}][0-9]{{3}})*' + '([{decimalChar}][0-9]{{1,2}})?').format(**fmt)
-            pattern = '^[^0-9]*' + pattern + '[^0-9]*$'
-            regex = re.compile(pattern)
+            regex = self._get_regex(fmt['groupChar'], fmt['decimalChar'])
             match = regex.match(value)
             if not match:
                 return False
 
         return True
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _get_regex(group_char, decimal_char):
+        fmt = {'groupChar': group_char, 'decimalChar': decimal_char}
+        pattern = ('[0-9]+' + '([{groupChar}][0-9]{{3}})*' + '([{decimalChar}][0-9]{{1,2}})?').format(**fmt)
+        pattern = '^[^0-9]*' + pattern + '[^0-9]*$'
+        return re.compile(pattern)
+
     # noinspection PyMethodMayBeStatic
     def _post_cast_check_ok(self, fmt, value):
         if value is not None:
@@ -336,14 +528,20 @@ def concatenate_data_sample(data_sample, resource):
         yield row
 
 
+def sniff_and_cast(datapackage, resources, parameters):
+    """Sniff casters on a sample of the single resource and cast values."""
+
+    resources = list(resources)
+    resource = resources[0]
+    assert(len(resources) == 1)
+    resource_sample, resource_left_over = extract_data_sample(resource)
+    casters = get_casters(datapackage, resource_sample, parameters=parameters)
+    resource = concatenate_data_sample(resource_sample, resource_left_over)
+    kwargs = dict(casters=casters, pass_row_index=True)
+    return process([resource], cast_values, **kwargs)
+
+
 if __name__ == '__main__':
     parameters_, datapackage_, resources_ = ingest()
-    resources_ = list(resources_)
-    resource_ = resources_[0]
-    assert(len(resources_) == 1)
-    resource_sample_, resource_left_over_ = extract_data_sample(resource_)
-    casters_ = get_casters(datapackage_, resource_sample_, parameters=parameters_)
-    resource_ = concatenate_data_sample(resource_sample_, resource_left_over_)
-    kwargs = dict(casters=casters_, pass_row_index=True)
-    new_resources_ = process([resource_], cast_values, **kwargs)
+    new_resources_ = sniff_and_cast(datapackage_, resources_, parameters_)
     spew(datapackage_, new_resources_)
@@ -1,41 +1,33 @@
 """A processor to stream data from files."""
 
 import os
-import json
 
-import cchardet as chardet
 from tabulator import Stream
 from logging import warning, info
 from datapackage_pipelines.wrapper import ingest, spew
-from petl import look, fromdicts
 from common.config import LOG_SAMPLE_SIZE
-from common.utilities import format_to_json, sanitize_field_names
+from common.encoding import detect_encoding
+from common.utilities import (
+    format_to_json,
+    sanitize_field_names,
+    get_json_keys
+)
 
 
 def get_json_headers(path):
     """Return all field names encountered in the file."""
 
-    keys = set()
-
-    with open(path) as stream:
-        rows = json.loads(stream.read())
-        for row in rows:
-            keys.update(set(row))
-        return list(keys)
+    return sorted(get_json_keys(path))
 
 
 def get_encoding(parameters, resource):
     """Return either the specified encoding or a best guess."""
 
-    with open(resource['path'], 'rb') as stream:
-        text = stream.read()
-        encoding = chardet.detect(text)['encoding']
-
-    if parameters.get('encoding'):
-        encoding = parameters.get('encoding')
     if resource.get('encoding'):
-        encoding = resource.get('encoding')
-    return encoding
+        return resource.get('encoding')
+    if parameters.get('encoding'):
+        return parameters.get('encoding')
+    return detect_encoding(resource['path'])
 
 
 def get_skip_rows(row_to_skip):
@@ -70,26 +62,11 @@ def force_strings(rows):
         yield (index, headers, values_as_strings)
 
 
-def fill_missing_fields(path):
-    """Pre-fill incomplete JSON rows (to avoid fields mixing up)."""
-
-    headers = get_json_headers(path)
-
-    with open(path) as stream:
-        rows = json.loads(stream.read())
-
-    for row in rows:
-        for header in headers:
-            if header not in row:
-                row[header] = None
-
-    with open(path, 'w+') as stream:
-        stream.write(format_to_json(rows))
-
-
 def log_sample_table(stream):
     """Record a tabular representation of the stream sample to the log."""
 
+    from petl import look, fromdicts
+
     samples = list(map(lambda x: dict(zip(stream.headers, x)), stream.sample))
     table = look(fromdicts(samples), limit=len(stream.sample))
     info('Data sample =\n%s', table)
@@ -148,13 +125,17 @@ def stream_local_file(datapackage, **parameters):
             parameters['post_parse'].append(force_strings)
 
         if extension == '.json':
-            fill_missing_fields(path)
             parameters['post_parse'].append(force_strings)
 
         info('Ingesting file = %s', path)
         info('Ingestion parameters = %s', format_to_json(parameters))
 
-        parameters.update(headers=get_headers(parameters, path))
+        if extension == '.json':
+            # Keyed rows are streamed: missing keys are filled by tabulator
+            headers = sanitize_field_names(get_json_headers(path))
+        else:
+            headers = get_headers(parameters, path)
+        parameters.update(headers=headers)
 
         with Stream(path, **parameters) as stream:
             check_fields_match(resource, stream)
@@ -16,5 +16,6 @@ def update_datapackage(datapackage):
     return
 
 
-_, datapackage_, resources_ = ingest()
-spew(update_datapackage(datapackage_), resources_)
+if __name__ == '__main__':
+    _, datapackage_, resources_ = ingest()
+    spew(update_datapackage(datapackage_), resources_)
@@ -1,48 +1,99 @@
-"""Map the raw columns names to fiscal fields where indicated."""
+"""Validate the fiscal data and profile its columns.
+
+Validation
+----------
+
+Threshold columns must have at least the given percentage of values that
+are not empty, and the columns of `allowed_values` can only hold the
+listed values (or 'unknown'). All the problems of a resource are reported
+together, in one `ValueError` raised after its last row.
+
+Profiling
+---------
+
+The columns are profiled on the way (see `common.profiling`). The profile
+of each resource is written to a JSON file (next to the fiscal zip file by
+default) after its last row, before any validation error is raised.
+
+"""
+
+import json
 
 from datapackage_pipelines.wrapper import ingest, spew
+from common.config import PROFILE_FILE, PROFILE_TOP_K
+from common.profiling import TableProfile, is_empty
 
-parameters_, datapackage_, resources_ = ingest()
+# The number of bad values quoted in the error message
+MAX_BAD_VALUES = 10
 
-thresholds = parameters_['thresholds']
-allowed_values = parameters_['allowed_values']
-threshold_columns = thresholds.keys()
-allowed_value_columns = allowed_values.keys()
 
+def save_profiles(profiles, path):
+    with open(path, 'w', encoding='utf-8') as stream:
+        # Decimals and dates are written as strings
+        json.dump({'resources': [profile.to_dict() for profile in profiles]},
+                  stream, indent=4, ensure_ascii=False, default=str)
 
-def is_empty(value):
-    if value is None:
-        return True
-    if type(value) is str and value.strip() == '':
-        return True
-    return False
 
+def check_thresholds(profile, thresholds):
+    errors = []
+    for column, threshold in thresholds.items():
+        nb_empty = profile.count_empty(column)
+        counter = profile.nb_rows
+        ratio_percent = 100 - (100 * nb_empty) // counter
+        if ratio_percent < threshold:
+            errors.append(
+                '%s: Got %d good values (out of %d), which is %d%% '
+                '(below the threshold of %d%%)' %
+                (column, counter - nb_empty, counter, ratio_percent, threshold)
+            )
+    return errors
+
+
+def process(resources, thresholds, allowed_values,
+            profile_file=PROFILE_FILE, top_k=PROFILE_TOP_K):
+    profiles = []
 
-def process(resources):
     def process_single(resource):
-        counter = 0
-        nones = dict((c, 0) for c in threshold_columns)
+        profile = TableProfile(top_k)
+        profiles.append(profile)
+        bad_values = {column: {} for column in allowed_values}
+
         for row in resource:
-            counter += 1
-            for column in threshold_columns:
-                value = row.get(column)
-                if is_empty(value):
-                    nones[column] += 1
-            for column in allowed_value_columns:
+            profile.add(row)
+            for column, allowed in allowed_values.items():
                 value = row.get(column)
                 if not is_empty(value) and value != 'unknown':
-                    if value not in allowed_values[column]:
-                        raise ValueError('%s: Got %r whereas allowed values for this column are %r' %
-                                         (column, value, allowed_values[column]))
+                    if value not in allowed:
+                        counts = bad_values[column]
+                        counts[value] = counts.get(value, 0) + 1
             yield row
-        for column in threshold_columns:
-            ratio_percent = 100 - (100*nones[column])//counter
-            if ratio_percent < thresholds[column]:
-                raise ValueError('%s: Got %d good values (out of %d), which is %d%% (below the threshold of %d%%)' %
-                                 (column, counter-nones[column], counter, ratio_percent, thresholds[column]))
+
+        if profile_file:
+            save_profiles(profiles, profile_file)
+
+        errors = []
+        for column, counts in bad_values.items():
+            if counts:
+                errors.append(
+                    '%s: Got %d bad values %r whereas allowed values for '
+                    'this column are %r' %
+                    (column, sum(counts.values()),
+                     sorted(counts, key=str)[:MAX_BAD_VALUES],
+                     allowed_values[column])
+                )
+        if profile.nb_rows:
+            errors.extend(check_thresholds(profile, thresholds))
+        if errors:
+            raise ValueError('\n'.join(errors))
 
     for resource_ in resources:
         yield process_single(resource_)
 
 
-spew(datapackage_, process(resources_))
+if __name__ == '__main__':
+    parameters_, datapackage_, resources_ = ingest()
+    new_resources_ = process(resources_,
+                             parameters_['thresholds'],
+                             parameters_['allowed_values'],
+                             parameters_.get('profile-file', PROFILE_FILE))
+    spew(datapackage_, new_resources_)
@@ -0,0 +1,231 @@
+"""Profile the columns of a data stream in a single pass.
+
+Context
+-------
+
+The validation step sees every row of the fiscal data before it is zipped.
+Profiling the data there avoids a second pass (or loading a pandas frame)
+over concatenations of millions of rows. Memory only grows with the number
+of columns: each column keeps a few counters and two fixed-size sketches.
+
+Statistics
+----------
+
+For each column, the profile counts values and empty values, estimates the
+number of distinct values with a HyperLogLog sketch and keeps:
+
+    * the minimum, maximum and sum of numbers (amounts)
+    * the range of dates (datetimes count as their date)
+    * the most frequent other values (with the space-saving algorithm)
+
+Distinct counts and frequencies are estimates. Hashes are salted per
+process, so estimates may vary slightly between runs.
+
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from math import log
+
+# HyperLogLog registers (2 ** 12 registers give a ~1.6% standard error)
+HLL_PRECISION = 12
+# Space-saving keeps at least this many candidates per top value reported
+TOP_K_FACTOR = 2
+
+_MASK = (1 << 64) - 1
+_NUMBER_TYPES = {int, float, Decimal}
+_DATE_TYPES = {date, datetime}
+
+
+def is_empty(value):
+    if value is None:
+        return True
+    if type(value) is str and value.strip() == '':
+        return True
+    return False
+
+
+class HyperLogLog(object):
+    """Estimate the number of distinct values in fixed memory."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self._nb_bits = 64 - precision
+        self._suffix_mask = (1 << self._nb_bits) - 1
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        # Python's hash of small integers is the integer itself, so mix the
+        # bits (with the MurmurHash3 finalizer) before using them
+        hash_ = hash(value) & _MASK
+        hash_ ^= hash_ >> 33
+        hash_ = (hash_ * 0xff51afd7ed558ccd) & _MASK
+        hash_ ^= hash_ >> 33
+        hash_ = (hash_ * 0xc4ceb9fe1a85ec53) & _MASK
+        hash_ ^= hash_ >> 33
+
+        index = hash_ >> self._nb_bits
+        rank = self._nb_bits - (hash_ & self._suffix_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        nb_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / nb_registers)
+        estimate = alpha * nb_registers ** 2 / sum(
+            2.0 ** -rank for rank in self.registers
+        )
+
+        nb_zeros = self.registers.count(0)
+        if estimate <= 2.5 * nb_registers and nb_zeros:
+            estimate = nb_registers * log(nb_registers / nb_zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving(object):
+    """Track the most frequent values in fixed memory.
+
+    Up to twice the capacity of values are counted. Beyond that, only the
+    most frequent values are kept, and new values start from the highest
+    count dropped so far (so counts are upper bounds). Values seen more
+    often than once per `capacity` values are never dropped.
+
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self._floor = 0
+
+    def add(self, value):
+        counts = self.counts
+        if value in counts:
+            counts[value] += 1
+        else:
+            counts[value] = self._floor + 1
+            if len(counts) > 2 * self.capacity:
+                self._prune()
+
+    def _prune(self):
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])
+        self._floor = ranked[self.capacity][1]
+        self.counts = dict(ranked[:self.capacity])
+
+    def top(self, k):
+        """Return the k most frequent values and their counts."""
+
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:k]
+
+
+class ColumnProfile(object):
+    """The statistics of one column."""
+
+    def __init__(self, top_k):
+        self.top_k = top_k
+        self.nb_values = 0
+        self.nb_empty = 0
+        self.distinct = HyperLogLog()
+        self.frequent = SpaceSaving(top_k * TOP_K_FACTOR)
+        self.minimum = None
+        self.maximum = None
+        self.total = None
+        self.first_date = None
+        self.last_date = None
+
+    def add(self, value):
+        self.nb_values += 1
+        type_ = type(value)
+
+        if type_ in _NUMBER_TYPES:
+            self.distinct.add(value)
+            if self.total is None:
+                self.minimum = self.maximum = self.total = value
+            else:
+                if value < self.minimum:
+                    self.minimum = value
+                elif value > self.maximum:
+                    self.maximum = value
+                try:
+                    self.total += value
+                except TypeError:
+                    self.total = float(self.total) + float(value)
+
+        elif type_ in _DATE_TYPES:
+            self.distinct.add(value)
+            if type_ is datetime:
+                # Dates and datetimes don't compare, so keep the date only
+                value = value.date()
+            if self.first_date is None:
+                self.first_date = self.last_date = value
+            elif value < self.first_date:
+                self.first_date = value
+            elif value > self.last_date:
+                self.last_date = value
+
+        elif value is None:
+            self.nb_empty += 1
+
+        elif value in self.frequent.counts:
+            # Already counted as a distinct value
+            self.frequent.counts[value] += 1
+
+        elif type_ is str and value.strip() == '':
+            self.nb_empty += 1
+
+        else:
+            self.distinct.add(value)
+            self.frequent.add(value)
+
+    def to_dict(self, nb_rows):
+        """Return the statistics (rows without the column count as empty)."""
+
+        nb_empty = self.nb_empty + nb_rows - self.nb_values
+        profile = {
+            'empty': nb_empty,
+            'empty_ratio': nb_empty / nb_rows if nb_rows else None,
+            'distinct': self.distinct.count(),
+        }
+        if self.total is not None:
+            profile.update(min=self.minimum, max=self.maximum,
+                           sum=self.total)
+        if self.first_date is not None:
+            profile.update(first_date=self.first_date,
+                           last_date=self.last_date)
+        if self.frequent.counts:
+            profile['top'] = self.frequent.top(self.top_k)
+        return profile
+
+
+class TableProfile(object):
+    """The statistics of all the columns of a resource.
+
+    :param top_k: the number of frequent values reported per column
+
+    """
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self.nb_rows = 0
+        self.columns = {}
+
+    def add(self, row):
+        self.nb_rows += 1
+        columns = self.columns
+        for column, value in row.items():
+            if column not in columns:
+                columns[column] = ColumnProfile(self.top_k)
+            columns[column].add(value)
+
+    def count_empty(self, column):
+        """Return the number of rows where the column is empty or missing."""
+
+        if column not in self.columns:
+            return self.nb_rows
+        profile = self.columns[column]
+        return profile.nb_empty + self.nb_rows - profile.nb_values
+
+    def to_dict(self):
+        return {
+            'rows': self.nb_rows,
+            'fields': {column: profile.to_dict(self.nb_rows)
+                       for column, profile in self.columns.items()}
+        }
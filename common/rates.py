@@ -0,0 +1,296 @@
+"""A local store of monthly exchange rates to euros.
+
+Context
+-------
+
+Sources that are not in euros are converted with monthly exchange rates.
+These used to be fetched from a remote API one month at a time and saved
+in a JSON file. The rate store imports whole history files instead (the
+reference rates of the ECB, in CSV or XML) into a SQLite table indexed by
+currency and month.
+
+Rates
+-----
+
+A rate is the value of one unit of a currency in euros (the ECB publishes
+the inverse). Each month gets the rate of its first day in the history
+file. The JSON file of the processors seeds the store, without replacing
+imported rates, so the store holds at least the rates it used to hold.
+
+Gaps between two known months can be filled by linear interpolation.
+
+Usage
+-----
+
+This module supports python3. For help: python3 -m common.rates --help.
+
+"""
+
+import os
+import csv
+import json
+import sqlite3
+
+from os.path import dirname
+from click import group, argument, option, echo, secho
+
+from common.cache import hash_files
+from common.config import CURRENCIES_FILE, RATES_STORE_FILE
+
+_TABLES = (
+    'CREATE TABLE IF NOT EXISTS rates '
+    '(currency TEXT, month INTEGER, rate REAL, '
+    'PRIMARY KEY (currency, month)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS imports (hash TEXT PRIMARY KEY)',
+)
+
+
+def get_key(currency, year, month):
+    """Return the key of a rate in the JSON rates file."""
+
+    return '%s-%d-%02d' % (currency, year, month)
+
+
+def _to_month(year, month):
+    return year * 12 + month - 1
+
+
+def _from_month(month):
+    return month // 12, month % 12 + 1
+
+
+def read_json_rates(path=CURRENCIES_FILE):
+    """Return the rates of the JSON rates file."""
+
+    with open(path) as stream:
+        currencies = json.load(stream)
+
+    for key, rate in currencies.items():
+        currency, year, month = key.split('-')
+        yield currency, int(year), int(month), rate
+
+
+def _first_rates_of_the_month(daily_rates):
+    first_days = {}
+    for day, currency, value in daily_rates:
+        if value in ('', 'N/A'):
+            continue
+        year, month, day = map(int, day.split('-'))
+        key = currency, year, month
+        if key not in first_days or day < first_days[key][0]:
+            first_days[key] = day, 1 / float(value)
+
+    for (currency, year, month), (_, rate) in first_days.items():
+        yield currency, year, month, rate
+
+
+def read_ecb_csv(path):
+    """Return the monthly rates of an ECB history file in CSV format."""
+
+    def daily_rates():
+        with open(path, newline='') as stream:
+            reader = csv.reader(stream)
+            currencies = next(reader)[1:]
+            for line in reader:
+                for currency, value in zip(currencies, line[1:]):
+                    if currency.strip():
+                        yield line[0], currency.strip(), value.strip()
+
+    return _first_rates_of_the_month(daily_rates())
+
+
+def read_ecb_xml(path):
+    """Return the monthly rates of an ECB history file in XML format."""
+
+    # Only needed to import rates
+    from xml.etree.ElementTree import iterparse
+
+    def daily_rates():
+        for _, element in iterparse(path):
+            day = element.get('time')
+            if day:
+                for child in element:
+                    yield day, child.get('currency'), child.get('rate')
+                element.clear()
+
+    return _first_rates_of_the_month(daily_rates())
+
+
+class RateStore(object):
+    """Monthly exchange rates indexed by currency and month.
+
+    :param path: the path to the SQLite file
+
+    """
+
+    def __init__(self, path=RATES_STORE_FILE):
+        os.makedirs(dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30)
+        with self._connection:
+            for table in _TABLES:
+                self._connection.execute(table)
+
+    def close(self):
+        self._connection.close()
+
+    def import_rates(self, rates, replace=True):
+        """Save rates in bulk and return how many were given.
+
+        :param rates: an iterable of (currency, year, month, rate)
+        :param replace: whether to replace the rates already in the store
+
+        """
+
+        query = 'INSERT OR {} INTO rates VALUES (?, ?, ?)'.format(
+            'REPLACE' if replace else 'IGNORE'
+        )
+        rows = [(currency, _to_month(year, month), rate)
+                for currency, year, month, rate in rates]
+        with self._connection:
+            self._connection.executemany(query, rows)
+        return len(rows)
+
+    def import_file(self, path, replace=True):
+        """Import a history file (or the JSON rates file) once.
+
+        Files are recognized by their extension. The file is skipped if
+        the store already holds its content. Return the number of rates
+        that were imported.
+
+        """
+
+        hash_ = hash_files([path])
+        if self._connection.execute('SELECT 1 FROM imports WHERE hash = ?',
+                                    (hash_,)).fetchone():
+            return 0
+
+        if path.endswith('.json'):
+            rates = read_json_rates(path)
+        elif path.endswith('.xml'):
+            rates = read_ecb_xml(path)
+        else:
+            rates = read_ecb_csv(path)
+
+        nb_rates = self.import_rates(rates, replace)
+        with self._connection:
+            self._connection.execute('INSERT INTO imports VALUES (?)',
+                                     (hash_,))
+        return nb_rates
+
+    def get_currencies(self):
+        """Return the currencies of the store."""
+
+        return [currency for currency, in self._connection.execute(
+            'SELECT DISTINCT currency FROM rates ORDER BY currency'
+        )]
+
+    def get_range(self, currency, start, end, interpolate=False):
+        """Return the known rates of a currency between two months.
+
+        :param start: the first (year, month)
+        :param end: the last (year, month)
+        :param interpolate: whether to fill the gaps between known months
+
+        :returns: a list of ((year, month), rate) in chronological order
+
+        """
+
+        start, end = _to_month(*start), _to_month(*end)
+
+        if not interpolate:
+            rows = self._connection.execute(
+                'SELECT month, rate FROM rates WHERE currency = ? '
+                'AND month BETWEEN ? AND ? ORDER BY month',
+                (currency, start, end)
+            )
+            return [(_from_month(month), rate) for month, rate in rows]
+
+        # Interpolation needs the closest known months outside the range
+        rows = self._connection.execute(
+            'SELECT month, rate FROM rates WHERE currency = ? '
+            'AND month BETWEEN '
+            '(SELECT IFNULL(MAX(month), ?) FROM rates '
+            ' WHERE currency = ? AND month <= ?) AND '
+            '(SELECT IFNULL(MIN(month), ?) FROM rates '
+            ' WHERE currency = ? AND month >= ?) '
+            'ORDER BY month',
+            (currency, start, currency, start, end, currency, end)
+        ).fetchall()
+
+        rates = []
+        for (month, rate), (next_month, next_rate) in zip(rows, rows[1:]):
+            for month_ in range(month, next_month):
+                weight = (month_ - month) / (next_month - month)
+                rates.append((month_, rate + (next_rate - rate) * weight))
+        rates.extend(rows[-1:])
+
+        return [(_from_month(month), rate)
+                for month, rate in rates if start <= month <= end]
+
+    def get_rate(self, currency, year, month, interpolate=False):
+        """Return the rate of a currency for one month (or None)."""
+
+        rates = self.get_range(currency, (year, month), (year, month),
+                               interpolate)
+        if rates:
+            return rates[0][1]
+
+    def get_rates(self, interpolate=False):
+        """Return all the rates, keyed like the JSON rates file."""
+
+        rates = {}
+        for currency, first_month, last_month in self._connection.execute(
+                'SELECT currency, MIN(month), MAX(month) '
+                'FROM rates GROUP BY currency').fetchall():
+            for (year, month), rate in self.get_range(
+                    currency, _from_month(first_month),
+                    _from_month(last_month), interpolate):
+                rates[get_key(currency, year, month)] = rate
+        return rates
+
+
+def open_rate_store(path=RATES_STORE_FILE, seed_file=CURRENCIES_FILE):
+    """Return the rate store, seeded with the JSON rates file."""
+
+    store = RateStore(path)
+    store.import_file(seed_file, replace=False)
+    return store
+
+
+# Command line
+# -----------------------------------------------------------------------------
+
+
+@group()
+def main():
+    """Manage the exchange rate store."""
+
+
+@main.command('import')
+@argument('paths', type=str, nargs=-1)
+def import_files(paths):
+    """Import ECB history files (CSV or XML)."""
+
+    store = open_rate_store()
+    for path in paths:
+        nb_rates = store.import_file(path)
+        secho('{}: imported {} monthly rates'.format(path, nb_rates),
+              fg='green')
+
+
+@main.command('show')
+@argument('currency', type=str)
+@option('--start', type=(int, int), default=(1999, 1), help='YEAR MONTH')
+@option('--end', type=(int, int), default=(2099, 12), help='YEAR MONTH')
+@option('--interpolate', is_flag=True, help='Fill the gaps.')
+def show_rates(currency, start, end, interpolate):
+    """Print the monthly rates of a currency."""
+
+    store = open_rate_store()
+    for (year, month), rate in store.get_range(currency, start, end,
+                                               interpolate):
+        echo('{} {:.10f}'.format(get_key(currency, year, month), rate))
+
+
+if __name__ == '__main__':
+    main()
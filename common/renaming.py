@@ -0,0 +1,120 @@
+"""Rename, drop and add the keys of rows with a precompiled plan.
+
+Context
+-------
+
+Several steps map raw field names onto fiscal field names: `map_fields`,
+`map_columns`, `concatenate` (with the aliases that `generate.py` collects
+from the `maps_to` properties) and `reshape_data`. Renaming keys one by one
+with `del` and `pop` resizes each row many times, which adds up on wide
+sources where most raw columns are `_ignored`.
+
+Rename plans
+------------
+
+A plan is compiled once per resource from the keys of its first row. It is
+an `itemgetter` over the kept source keys and the tuple of output keys, so
+each output row is built in one step. The plan is compiled again when a row
+does not have the same keys (which only happens with ragged sources).
+
+"""
+
+from itertools import chain
+from operator import itemgetter
+
+
+def _get_getter(keys):
+    if len(keys) > 1:
+        return itemgetter(*keys)
+    if keys:
+        key = keys[0]
+        return lambda row: (row[key],)
+    return lambda row: ()
+
+
+def compile_renamer(source_fields, mapping, keep_others=True, template=None):
+    """Return a function that renames the keys of a row in one step.
+
+    :param source_fields: the keys of the input rows
+    :param mapping: a dict from source keys to output keys (None drops them)
+    :param keep_others: whether to keep the source keys missing from the
+        mapping (under the same name) or to drop them
+    :param template: an optional dict of default output values, whose
+        order is the order of the output rows
+
+    If several source keys map to the same output key, the last value
+    that is not None wins.
+
+    """
+
+    pairs = []
+    for key in source_fields:
+        new_key = mapping.get(key, key if keep_others else None)
+        if new_key is not None:
+            pairs.append((key, new_key))
+
+    getter = _get_getter(tuple(key for key, _ in pairs))
+    new_keys = tuple(new_key for _, new_key in pairs)
+    has_aliases = len(set(new_keys)) < len(new_keys)
+
+    if has_aliases:
+        def rename(row):
+            new_row = template.copy() if template else {}
+            new_row.update((key, value)
+                           for key, value in zip(new_keys, getter(row))
+                           if value is not None)
+            return new_row
+    elif template:
+        def rename(row):
+            new_row = template.copy()
+            new_row.update(zip(new_keys, getter(row)))
+            return new_row
+    else:
+        def rename(row):
+            return dict(zip(new_keys, getter(row)))
+
+    return rename
+
+
+def rename_rows(rows, mapping, keep_others=True, template=None):
+    """Rename the rows of a resource with a plan compiled once.
+
+    The parameters are the same as `compile_renamer`. The source keys are
+    taken from the first row, and again from any row with other keys.
+
+    """
+
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        return
+
+    source_keys = set(first_row)
+    rename = compile_renamer(first_row, mapping, keep_others, template)
+    for row in chain([first_row], rows):
+        if row.keys() != source_keys:
+            source_keys = set(row)
+            rename = compile_renamer(row, mapping, keep_others, template)
+        yield rename(row)
+
+
+def get_field_aliases(resources, target_fields):
+    """Return the raw field names that map to each target field.
+
+    This is the `fields` parameter of the `concatenate` step. Fields mapped
+    to `_ignored` or `_unknown` are left out, and so are the fields that
+    already have the target name.
+
+    :param resources: the resources of a source description
+    :param target_fields: the target field names
+
+    """
+
+    aliases = {name: [] for name in target_fields}
+    for resource in resources:
+        for field in (resource.get('schema') or {}).get('fields', []):
+            maps_to = field.get('maps_to')
+            if maps_to is not None and not maps_to.startswith('_'):
+                if field['name'] not in aliases[maps_to] + [maps_to]:
+                    aliases[maps_to].append(field['name'])
+    return aliases
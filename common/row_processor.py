@@ -2,13 +2,14 @@
 
 import logging
 import copy
-import petl
 import json
 import itertools
 import collections
 import os
 import sys
 
+from common.config import BLOCK_SIZE
+
 
 def processor():
     return "%-32s" % os.path.basename(sys.argv[0]).split('.')[0].title()
@@ -43,6 +44,9 @@ def _check_parameters(*configuration):
 
 
 def _write_to_log(parameter_view, sample_rows, resource_index):
+    # Imported here to keep processor start-up fast
+    import petl
+
     parameter_view = json.dumps(parameter_view, ensure_ascii=False, indent=4)
     table_view = petl.look(petl.fromdicts(sample_rows))
 
@@ -61,6 +65,71 @@ def _get_sample_rows(row_generator, sample_size):
         return sample_rows
 
 
+def _get_blocks(rows, block_size):
+    """Yield lists of up to `block_size` consecutive rows with the same keys.
+
+    Ragged rows go into separate blocks, so that block processors see the
+    same keys as their row counterparts (rather than padded columns).
+
+    """
+
+    block, keys = [], None
+    for row in rows:
+        if block and (len(block) == block_size or row.keys() != keys):
+            yield block
+            block = []
+        if not block:
+            keys = row.keys()
+        block.append(row)
+    if block:
+        yield block
+
+
+def rows_to_block(rows):
+    """Transpose a list of rows into a block (a `dict` of columns).
+
+    Rows are normally homogeneous. If they are not, missing values are
+    padded with `None` so that every column has one value per row
+    (`process_blocks` never passes such rows).
+
+    """
+
+    if not rows:
+        return collections.OrderedDict()
+
+    keys = rows[0].keys()
+    if not all(row.keys() == keys for row in rows):
+        keys = collections.OrderedDict.fromkeys(
+            key for row in rows for key in row
+        )
+        return collections.OrderedDict(
+            (key, [row.get(key) for row in rows]) for key in keys
+        )
+
+    return collections.OrderedDict(
+        (key, [row[key] for row in rows]) for key in keys
+    )
+
+
+def block_length(block):
+    """Return the number of rows in a block."""
+
+    return len(next(iter(block.values()), []))
+
+
+def block_to_rows(block, nb_rows):
+    """Transpose a block back into a generator of rows."""
+
+    if not block:
+        for _ in range(nb_rows):
+            yield {}
+        return
+
+    keys = list(block)
+    for values in zip(*block.values()):
+        yield dict(zip(keys, values))
+
+
 Index = collections.namedtuple('Index', ['resource', 'row'])
 
 
@@ -72,7 +141,8 @@ def process(resources,
             verbose=True,
             parameters={},
             datapackage=None,
-            nothing_to_report='_pass'):
+            nothing_to_report='_pass',
+            processor_name=None):
     """Apply a row processor to each row of each datapackage resource.
 
     The function provides the following boilerplate functionality:
@@ -91,6 +161,7 @@ def process(resources,
     :param parameters: the processing parameters found in `pipeline-spec.yaml`
     :param datapackage: required to override pipeline parameters
     :param nothing_to_report: tells the stats collector to skip this row
+    :param processor_name: defaults to the name of the running script
 
     :raises: `TypeError` if any of the parameters sets is not a `dict`
 
@@ -110,7 +181,8 @@ def process(resources,
             if datapackage:
                 parameters_ = _override_parameters(parameters_,
                                                    datapackage,
-                                                   resource_index)
+                                                   resource_index,
+                                                   processor_name)
 
             def process_rows(resource_):
                 """Return a generator of rows."""
@@ -137,3 +209,86 @@ def process(resources,
                 _write_to_log(parameters_, sample_rows, resource_index)
 
     return process_resources(parameters), processor_report
+
+
+# noinspection PyDefaultArgument
+def process_blocks(resources,
+                   block_processor,
+                   block_size=BLOCK_SIZE,
+                   sample_size=15,
+                   verbose=True,
+                   parameters={},
+                   datapackage=None,
+                   nothing_to_report='_pass',
+                   processor_name=None):
+    """Apply a block processor to blocks of rows of each resource.
+
+    This is the columnar counterpart of `process`. Consecutive rows with the
+    same keys are grouped into blocks of up to `block_size` and handed over to the block processor as a
+    `dict` of columns (lists of equal length), so that a whole column can
+    be injected or dropped in one operation. The block processor returns
+    the new block and a report, which is either `nothing_to_report` or a
+    `dict` of reports keyed by the row position inside the block.
+
+    The boilerplate functionality is the same as `process` and so is the
+    output: the statistics are keyed by the row index in the resource.
+
+    :param resources: a generator of generators of rows
+    :param block_processor: a function that processes one block of data
+    :param block_size: the maximum number of rows per block
+    :param sample_size: the size of the data sample
+    :param verbose: whether to log the parameters and the data sample
+    :param parameters: the processing parameters found in `pipeline-spec.yaml`
+    :param datapackage: required to override pipeline parameters
+    :param nothing_to_report: tells the stats collector to skip this block
+    :param processor_name: defaults to the name of the running script
+
+    :raises: `TypeError` if any of the parameters sets is not a `dict`
+
+    :returns: the new_resource (a generator of generators)
+    :returns: the processor report (a list of dicts)
+
+    """
+
+    processor_report = []
+
+    def process_resources(parameters_):
+        """Return a generator of resources."""
+
+        for resource_index, resource in enumerate(resources):
+            resource_report = {}
+
+            if datapackage:
+                parameters_ = _override_parameters(parameters_,
+                                                   datapackage,
+                                                   resource_index,
+                                                   processor_name)
+
+            def process_rows(resource_):
+                """Return a generator of rows."""
+
+                offset = 0
+                for rows in _get_blocks(resource_, block_size):
+                    block, block_report = block_processor(
+                        rows_to_block(rows), **parameters_
+                    )
+
+                    if block_report != nothing_to_report:
+                        resource_report.update(
+                            (offset + i, report)
+                            for i, report in block_report.items()
+                        )
+
+                    yield from block_to_rows(block, len(rows))
+                    offset += len(rows)
+
+            processor_report.append(resource_report)
+
+            row_generator = process_rows(resource)
+            sample_rows = list(_get_sample_rows(row_generator, sample_size))
+            yield itertools.chain(sample_rows, row_generator)
+
+            if verbose:
+                _write_to_log(parameters_, sample_rows, resource_index)
+
+    return process_resources(parameters), processor_report
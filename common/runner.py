@@ -0,0 +1,568 @@
+"""This module runs a source pipeline inside a single process.
+
+    Context
+    -------
+
+    The datapackage-pipelines runner executes each step of a pipeline-spec.yaml
+    file in its own process. Steps talk to each other through pipes, so each
+    row is encoded to JSON and decoded again at every step. On large sources,
+    most of the wall-clock time goes into serialization.
+
+    Fused execution
+    ---------------
+
+    The fused runner imports the row functions of the common processors and
+    chains them into a single generator pipeline. Steps that cannot be fused
+    (for example `dump.to_zip` or `fiscal.model`) fall back to a subprocess
+    that speaks the datapackage-pipelines protocol, so only those steps pay
+    the serialization cost.
+
+    Stage cache
+    -----------
+
+    The output of the steps at the beginning of each pipeline, up to the
+    first step that writes files (the profile of `validate_values` or the
+    missing rates of `currency_convert` for example), is saved under the
+    `.stages` folder of the source, keyed by content. By default, only the
+    output of the deepest of these steps is saved, so re-running an
+    unchanged pipeline skips them all.
+    With --every-step, the output of each step is saved, and re-running a
+    pipeline after editing the parameters of a late step resumes from the
+    last unchanged step. Use --no-cache to run everything from scratch.
+
+    Usage
+    -----
+
+    This module supports python3. For help: python3 -m common.runner --help.
+
+"""
+
+import os
+import sys
+import json
+import yaml
+import logging
+
+from copy import deepcopy
+from threading import Thread
+from subprocess import Popen, PIPE
+from os.path import join, abspath
+from click import command, argument, option, secho
+from datapackage_pipelines.specs.resolver import resolve_executor
+from datapackage_pipelines.utilities.resources import (
+    streaming,
+    PROP_STREAMING
+)
+from datapackage_pipelines.utilities.extended_json import json as extended_json
+
+from common.config import (
+    CACHED_SUBPROCESS_STEPS,
+    OUTPUT_STEPS,
+    PIPELINE_FILE,
+    PROCESSORS_DIR,
+    ROOT_DIR,
+    STAGE_CACHE_DIR,
+)
+from common.utilities import process
+from common.renaming import rename_rows
+from common import row_processor, stages
+from common.processors import (
+    read_description,
+    ingest_local_file,
+    map_values,
+    add_constants,
+    add_row_id,
+    reshape_data,
+    show_sample_in_console,
+    add_geocodes,
+    add_categories,
+    handle_amounts,
+    fingerprint_beneficiaries,
+    sniff_and_cast,
+    currency_convert,
+    validate_values,
+    dump_to_parquet,
+    concatenate_identical_resources,
+    parse_currency_fields,
+    convert_excel_dates,
+    mutate_datapackage,
+)
+
+
+FUSED_STEPS = {}
+
+
+def fused(name):
+    """Register an in-process replacement for a pipeline step."""
+
+    def register(step):
+        FUSED_STEPS[name] = step
+        return step
+
+    return register
+
+
+# In-process steps
+# -----------------------------------------------------------------------------
+#
+# Each step receives the step parameters, the datapackage and a list of row
+# generators. It returns the new datapackage and a list of row generators,
+# just like the `__main__` block of the matching processor.
+
+
+@fused('read_description')
+def _read_description(parameters, datapackage, resources):
+    datapackage = read_description.create_datapackage(**parameters)
+    return datapackage, [iter([]) for _ in datapackage['resources']]
+
+
+@fused('ingest_local_file')
+def _ingest_local_file(parameters, datapackage, resources):
+    workers = parameters.get('workers', ingest_local_file.INGESTION_WORKERS)
+    resources = ingest_local_file.ingest_resources(datapackage, workers)
+    return datapackage, list(resources)
+
+
+@fused('map_values')
+def _map_values(parameters, datapackage, resources):
+    lookup_tables = map_values.build_lookup_tables(parameters['mappings'])
+    resources = process(resources, map_values.map_aliases,
+                        lookup_tables=lookup_tables)
+    return datapackage, resources
+
+
+@fused('add_constants')
+def _add_constants(parameters, datapackage, resources):
+    resources, _ = row_processor.process_blocks(
+        resources,
+        add_constants.inject_constants_block,
+        datapackage=datapackage,
+        parameters=parameters,
+        processor_name='add_constants'
+    )
+    return datapackage, resources
+
+
+@fused('concatenate')
+def _concatenate(parameters, datapackage, resources):
+    fields = parameters.get('fields', {})
+    target = parameters.get('target', {})
+    target.setdefault('name', 'concat')
+    target.setdefault('path', 'data/' + target['name'] + '.csv')
+    target.update(mediatype='text/csv',
+                  schema=dict(fields=[]),
+                  profile='tabular-data-resource')
+    target[PROP_STREAMING] = True
+
+    field_mapping = {}
+    for target_field, source_fields in fields.items():
+        for source_field in source_fields or []:
+            if source_field in field_mapping:
+                message = 'Duplicate appearance of %s (%r)'
+                raise RuntimeError(message % (source_field, field_mapping))
+            field_mapping[source_field] = target_field
+        if target_field in field_mapping:
+            raise RuntimeError('Duplicate appearance of %s' % target_field)
+        field_mapping[target_field] = target_field
+
+    needed_fields = list(fields)
+    for resource in datapackage['resources']:
+        for field in resource.get('schema', {}).get('fields', []):
+            name = field_mapping.get(field['name'])
+            if name in needed_fields:
+                field['name'] = name
+                target['schema']['fields'].append(field)
+                needed_fields.remove(name)
+    for name in needed_fields:
+        target['schema']['fields'].append(dict(name=name, type='string'))
+
+    datapackage['resources'] = [target]
+    empty_row = dict.fromkeys(fields)
+
+    def concatenate(resources_):
+        for resource_ in resources_:
+            for new_row in rename_rows(resource_, field_mapping,
+                                       keep_others=False,
+                                       template=empty_row):
+                assert new_row != empty_row, \
+                    'Got an empty row after concatenation'
+                yield new_row
+
+    return datapackage, [concatenate(resources)]
+
+
+@fused('add_row_id')
+def _add_row_id(parameters, datapackage, resources):
+    return datapackage, add_row_id.process(parameters['prefix'], resources)
+
+
+@fused('reshape_data')
+def _reshape_data(parameters, datapackage, resources):
+    datapackage = reshape_data.update_datapackage(datapackage)
+    fiscal_fields = reshape_data.get_fiscal_schema().field_names
+    return datapackage, reshape_data.process_resources(resources,
+                                                       fiscal_fields)
+
+
+@fused('show_sample_in_console')
+def _show_sample_in_console(parameters, datapackage, resources):
+    sample_size = parameters.get('sample_size',
+                                 show_sample_in_console.DEFAULT_SAMPLE_SIZE)
+    resources = show_sample_in_console.process_resources(
+        resources, sample_size, parameters.get('fields'))
+    return datapackage, resources
+
+
+@fused('add_geocodes')
+def _add_geocodes(parameters, datapackage, resources):
+    resources, _ = row_processor.process_blocks(
+        resources,
+        add_geocodes.add_geocodes_block,
+        parameters=parameters,
+        verbose=False
+    )
+    return datapackage, resources
+
+
+@fused('add_categories')
+def _add_categories(parameters, datapackage, resources):
+    resources, _ = row_processor.process_blocks(
+        resources,
+        add_categories.inject_categories_block,
+        datapackage=datapackage,
+        parameters=parameters,
+        processor_name='add_categories'
+    )
+    return datapackage, resources
+
+
+@fused('handle_amounts')
+def _handle_amounts(parameters, datapackage, resources):
+    resources = handle_amounts.process(resources,
+                                       parameters['column-order'],
+                                       parameters['target-column'],
+                                       parameters['kind-column'])
+    return datapackage, resources
+
+
+@fused('fingerprint_beneficiaries')
+def _fingerprint_beneficiaries(parameters, datapackage, resources):
+    options = fingerprint_beneficiaries.get_options(parameters)
+    return datapackage, fingerprint_beneficiaries.process(resources, **options)
+
+
+@fused('sniff_and_cast')
+def _sniff_and_cast(parameters, datapackage, resources):
+    resources = sniff_and_cast.sniff_and_cast(datapackage, resources,
+                                              parameters)
+    return datapackage, resources
+
+
+@fused('currency_convert')
+def _currency_convert(parameters, datapackage, resources):
+    currency_column = parameters['currency-column']
+    datapackage = currency_convert.update_datapackage(datapackage,
+                                                      currency_column)
+
+    resources = currency_convert.process(
+        resources,
+        parameters['column'],
+        parameters['currency'],
+        currency_column,
+        parameters['date-columns'],
+        currency_convert.load_rate_index(parameters.get('interpolate', False))
+    )
+    return datapackage, resources
+
+
+@fused('validate_values')
+def _validate_values(parameters, datapackage, resources):
+    resources = validate_values.process(
+        resources,
+        parameters['thresholds'],
+        parameters['allowed_values'],
+        parameters.get('profile-file', validate_values.PROFILE_FILE)
+    )
+    return datapackage, resources
+
+
+@fused('dump_to_parquet')
+def _dump_to_parquet(parameters, datapackage, resources):
+    resources = dump_to_parquet.process(
+        datapackage,
+        resources,
+        parameters.get('out-path', dump_to_parquet.FISCAL_PARQUET_DIR),
+        parameters.get('partition-by', dump_to_parquet.PARTITION_FIELDS)
+    )
+    return datapackage, resources
+
+
+@fused('concatenate_identical_resources')
+def _concatenate_identical_resources(parameters, datapackage, resources):
+    single_resource = concatenate_identical_resources.concatenate(resources)
+    datapackage['resources'] = [datapackage['resources'][0]]
+    return datapackage, [single_resource]
+
+
+@fused('parse_currency_fields')
+def _parse_currency_fields(parameters, datapackage, resources):
+    return datapackage, process(resources,
+                                parse_currency_fields.parse_currencies,
+                                **parameters)
+
+
+@fused('convert_excel_dates')
+def _convert_excel_dates(parameters, datapackage, resources):
+    resources = convert_excel_dates.process_resources(
+        resources, parameters['date-fields'], parameters['date-mode'])
+    return datapackage, resources
+
+
+@fused('mutate_datapackage')
+def _mutate_datapackage(parameters, datapackage, resources):
+    datapackage = mutate_datapackage.set_extension_to_csv(datapackage)
+    return datapackage, resources
+
+
+# Subprocess fallback
+# -----------------------------------------------------------------------------
+
+
+def _feed_subprocess(stdin, datapackage, resources, errors):
+    """Write the datapackage and the rows to the processor's input."""
+
+    try:
+        stdin.write('{}\n')
+        stdin.write(json.dumps(datapackage, sort_keys=True) + '\n')
+        stdin.write('\n')
+        for resource in resources:
+            for row in resource:
+                stdin.write(extended_json.dumpl(row, sort_keys=True) + '\n')
+            stdin.write('\n')
+    except BrokenPipeError:
+        logging.error('The subprocess closed its input prematurely')
+    except Exception as error:
+        # Upstream steps run in this thread, so their errors surface here
+        errors.append(error)
+    finally:
+        stdin.close()
+
+
+def _read_subprocess(process_, nb_resources, name, errors):
+    """Return a list of row generators read from the processor's output."""
+
+    stdout = process_.stdout
+
+    def check_exit_code():
+        exit_code = process_.wait()
+        if errors:
+            raise errors[0]
+        if exit_code != 0:
+            message = '{} failed with exit code {}'
+            raise RuntimeError(message.format(name, exit_code))
+
+    def read_rows(is_last):
+        for line in iter(stdout.readline, ''):
+            line = line.strip()
+            if not line:
+                break
+            yield extended_json.loadl(line)
+
+        if is_last:
+            stdout.read()
+            check_exit_code()
+
+    if nb_resources == 0:
+        stdout.read()
+        check_exit_code()
+
+    return [read_rows(i + 1 == nb_resources) for i in range(nb_resources)]
+
+
+def run_in_subprocess(step, datapackage, resources, folder):
+    """Run a step as a datapackage-pipelines processor."""
+
+    os.environ.setdefault('DPP_PROCESSOR_PATH', PROCESSORS_DIR)
+    errors = []
+    executor = resolve_executor(step, folder, errors)
+    if errors:
+        raise RuntimeError(errors[0])
+
+    parameters = json.dumps(step.get('parameters', {}))
+    args = [sys.executable, executor, '0', parameters, 'False', '']
+    environment = dict(os.environ)
+    python_path = environment.get('PYTHONPATH')
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, python_path]))
+
+    logging.info('Running %s in a subprocess', step['run'])
+    process_ = Popen(args, stdin=PIPE, stdout=PIPE, cwd=folder,
+                     env=environment, universal_newlines=True)
+
+    # Upstream steps may clean up once their resources are exhausted, so
+    # the next resource is only pulled when the previous one has been fed.
+    streamed = (resource
+                for resource, descriptor
+                in zip(resources, datapackage['resources'])
+                if streaming(descriptor))
+    feeder_errors = []
+    feeder = Thread(target=_feed_subprocess,
+                    args=(process_.stdin, datapackage, streamed, feeder_errors))
+    feeder.daemon = True
+    feeder.start()
+
+    # The processor echoes the dependencies first
+    process_.stdout.readline()
+    datapackage = json.loads(process_.stdout.readline())
+    process_.stdout.readline()
+
+    nb_resources = len(list(filter(streaming, datapackage['resources'])))
+    new_resources = _read_subprocess(process_, nb_resources,
+                                     step['run'], feeder_errors)
+
+    return datapackage, new_resources
+
+
+# Pipeline execution
+# -----------------------------------------------------------------------------
+
+
+def is_fused(step):
+    """Whether the step can run inside the runner process."""
+
+    if step['run'] not in FUSED_STEPS:
+        return False
+    if step['run'] == 'concatenate':
+        return not step.get('parameters', {}).get('sources')
+    return True
+
+
+def writes_files(step):
+    """Whether the step writes files (so it must run every time)."""
+
+    parameters = step.get('parameters') or {}
+    if step['run'] not in OUTPUT_STEPS:
+        return False
+    if step['run'] == 'fingerprint_beneficiaries':
+        options = fingerprint_beneficiaries.get_options(parameters)
+        return options['store_file'] is not None
+    if step['run'] == 'validate_values':
+        return bool(parameters.get('profile-file',
+                                   validate_values.PROFILE_FILE))
+    return True
+
+
+def is_cacheable(step):
+    """Whether the output of the step can be cached."""
+
+    if writes_files(step):
+        return False
+    return is_fused(step) or step['run'] in CACHED_SUBPROCESS_STEPS
+
+
+def get_cached_steps(steps):
+    """Return the number of steps at the start that can be cached."""
+
+    nb_steps = 0
+    for step in steps:
+        if not is_cacheable(step):
+            break
+        nb_steps += 1
+    return nb_steps
+
+
+def run_pipeline(steps, folder, cache_dir=None, every_step=False):
+    """Chain all the steps and consume the output of the last one.
+
+    With a `cache_dir`, the output of the deepest cacheable step (of each
+    cacheable step with `every_step`) is saved there and the pipeline
+    resumes from the deepest step whose output is already cached (see
+    `common.stages`).
+
+    """
+
+    datapackage, resources = {'resources': []}, []
+    nb_cached = get_cached_steps(steps) if cache_dir else 0
+    keys = stages.get_stage_keys(steps[:nb_cached], folder) if nb_cached else []
+    start = 0
+
+    for index in reversed(range(nb_cached)):
+        if stages.has_snapshot(cache_dir, keys[index]):
+            logging.info('Resuming after %s from the cache', steps[index]['run'])
+            datapackage, resources = stages.load_snapshot(cache_dir, keys[index])
+            start = index + 1
+            break
+
+    if cache_dir:
+        stages.prune_snapshots(cache_dir, keys)
+
+    for index, step in enumerate(steps[start:], start):
+        # Each processor used to own a private copy of the descriptor (and
+        # the rows are consumed lazily), so in-place edits must not leak.
+        parameters = deepcopy(step.get('parameters') or {})
+        datapackage = deepcopy(datapackage)
+
+        if is_fused(step):
+            logging.info('Fusing %s', step['run'])
+            step_function = FUSED_STEPS[step['run']]
+            datapackage, resources = step_function(parameters,
+                                                   datapackage,
+                                                   resources)
+        else:
+            datapackage, resources = run_in_subprocess(step, datapackage,
+                                                       resources, folder)
+
+        if index == nb_cached - 1 or (every_step and index < nb_cached):
+            writer = stages.SnapshotWriter(cache_dir, keys[index],
+                                           deepcopy(datapackage))
+            resources = writer.wrap(resources)
+
+    nb_rows = 0
+    for resource in resources:
+        for _ in resource:
+            nb_rows += 1
+
+    return datapackage, nb_rows
+
+
+def load_pipelines(folder):
+    """Return the pipelines found in the folder's spec file."""
+
+    with open(join(folder, PIPELINE_FILE)) as stream:
+        return yaml.load(stream)
+
+
+@command()
+@argument('folder', type=str)
+@option('--pipeline-id', help='Run one pipeline only.')
+@option('--no-cache', is_flag=True, help='Ignore and skip the stage cache.')
+@option('--every-step', is_flag=True, help='Cache the output of every step.')
+def main(folder, pipeline_id, no_cache, every_step):
+    """Run the pipelines of a source folder in a single process."""
+
+    folder = abspath(folder)
+    pipelines = load_pipelines(folder)
+    current_directory = os.getcwd()
+
+    try:
+        os.chdir(folder)
+        for id_, pipeline in pipelines.items():
+            if pipeline_id and id_ != pipeline_id:
+                continue
+
+            steps = pipeline['pipeline']
+            nb_fused = len(list(filter(is_fused, steps)))
+            message = '{}: {} steps, {} fused'
+            secho(message.format(id_, len(steps), nb_fused), fg='blue')
+
+            cache_dir = None
+            if not no_cache:
+                cache_dir = join(folder, STAGE_CACHE_DIR, id_)
+            _, nb_rows = run_pipeline(steps, folder, cache_dir, every_step)
+            secho('{}: processed {} rows'.format(id_, nb_rows), fg='blue')
+
+    finally:
+        os.chdir(current_directory)
+
+
+if __name__ == '__main__':
+    main()
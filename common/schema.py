@@ -0,0 +1,126 @@
+"""The fiscal schema, model and metadata, loaded once per process.
+
+Context
+-------
+
+The fiscal specifications are three YAML files in the specifications
+folder. Processors used to open and parse them each time they needed a
+field name. The `FiscalSchema` object parses them once, checks them and
+precomputes the lookups that processors need.
+
+Caching
+-------
+
+The compiled object is pickled in the cache folder next to a hash of the
+three files and of this module, so it is only built again when one of them
+changes.
+
+"""
+
+import logging
+
+from copy import deepcopy
+from functools import lru_cache
+
+from common.cache import load_or_build
+from common.config import (
+    FISCAL_SCHEMA_FILE,
+    FISCAL_MODEL_FILE,
+    FISCAL_METADATA_FILE,
+    FISCAL_SCHEMA_CACHE_FILE,
+)
+
+
+class FiscalSchema(object):
+    """The fiscal specifications with precomputed field lookups.
+
+    :param schema: the content of fiscal.schema.yaml
+    :param model: the content of fiscal.model.yaml
+    :param metadata: the content of fiscal.metadata.yaml
+
+    """
+
+    def __init__(self, schema, model, metadata):
+        self._schema = schema
+        self._model = model
+        self._metadata = metadata
+        self._check()
+
+        fields = schema['fields']
+        self.field_names = tuple(field['name'] for field in fields)
+        self.field_set = frozenset(self.field_names)
+        self.index = {name: i for i, name in enumerate(self.field_names)}
+        self.types = self._get_property('type')
+        self.os_types = self._get_property('osType')
+        self.titles = self._get_property('title')
+
+    def _check(self):
+        names = [field['name'] for field in self._schema['fields']]
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise ValueError('Duplicate fiscal fields: %s' % duplicates)
+
+        for measure in self._model.get('measures', {}).values():
+            if measure['source'] not in names:
+                raise ValueError('Unknown measure %s' % measure['source'])
+
+    @property
+    def schema(self):
+        return deepcopy(self._schema)
+
+    @property
+    def model(self):
+        return deepcopy(self._model)
+
+    @property
+    def metadata(self):
+        return deepcopy(self._metadata)
+
+    def _get_property(self, key):
+        return {field['name']: field[key]
+                for field in self._schema['fields']
+                if key in field}
+
+    def get_property(self, key):
+        """Return a lookup table from field name to a field property."""
+
+        precomputed = {
+            'type': self.types,
+            'osType': self.os_types,
+            'title': self.titles,
+        }
+        if key in precomputed:
+            return dict(precomputed[key])
+        return self._get_property(key)
+
+    def sort(self, names):
+        """Return the names in schema order (the others go last)."""
+
+        return sorted(names, key=lambda name: self.index.get(name, len(self.index)))
+
+
+def read_fiscal_schema():
+    """Parse the specification files (without the cache)."""
+
+    # Only needed when the cached schema is stale
+    import yaml
+
+    specifications = []
+    for path in (FISCAL_SCHEMA_FILE, FISCAL_MODEL_FILE, FISCAL_METADATA_FILE):
+        with open(path) as stream:
+            specifications.append(yaml.safe_load(stream))
+
+    return FiscalSchema(*specifications)
+
+
+@lru_cache(maxsize=1)
+def get_fiscal_schema():
+    """Return the fiscal schema (loaded once per process)."""
+
+    # The pickle goes stale when the class changes too
+    paths = FISCAL_SCHEMA_FILE, FISCAL_MODEL_FILE, FISCAL_METADATA_FILE, __file__
+    fiscal_schema = load_or_build(paths,
+                                  FISCAL_SCHEMA_CACHE_FILE,
+                                  read_fiscal_schema)
+    logging.debug('Loaded %d fiscal fields', len(fiscal_schema.field_names))
+    return fiscal_schema
@@ -0,0 +1,236 @@
+"""Cache the output of pipeline steps on disk, keyed by content.
+
+Context
+-------
+
+Iterating on the parameters of a step near the end of a pipeline (say the
+thresholds of `validate_values`) used to mean re-ingesting and re-sniffing
+the whole source. The fused runner snapshots the output of each step, so
+that the next run resumes from the deepest step that has not changed.
+
+Keys
+----
+
+The key of a step is a hash of the key of the previous step, the code of
+the processor and the parameters of the step. The chain starts with a hash
+of the source files declared in the description and of the files shared by
+all processors (the `common` modules, the specifications, the codelists and
+the geocodes). Changing any of these invalidates the step and all the steps
+after it, and nothing else.
+
+Snapshots
+---------
+
+A snapshot is a folder holding the datapackage and one pickle file per
+resource. Rows are written in chunks of rows sharing the same keys, stored
+as tuples of values. The folder is written under a temporary name and
+renamed once every resource has been consumed, so a snapshot left by an
+interrupted run is never read.
+
+Only the steps at the beginning of a pipeline are cached, up to the first
+step that writes files (`validate_values`, `currency_convert`,
+`dump_to_parquet` or `dump.to_zip` for example), because those
+side-effects must happen on every run. Steps that run in a
+subprocess are cached if they only transform their input (`fiscal.model`).
+By default, the runner only snapshots the deepest of these steps.
+
+"""
+
+import os
+import json
+import pickle
+import logging
+
+from glob import glob
+from hashlib import sha1
+from shutil import rmtree
+from os.path import join, isdir, isfile, exists, basename
+
+from datapackage_pipelines.specs.resolver import resolve_executor
+
+from common.config import (
+    ROOT_DIR,
+    PROCESSORS_DIR,
+    SPECIFICATIONS_DIR,
+    CODELISTS_DIR,
+    GEOCODES_FILE,
+    BLOCK_SIZE,
+)
+
+DATAPACKAGE_SNAPSHOT = 'datapackage.pickle'
+RESOURCE_SNAPSHOT = 'resource-{}.pickle'
+SHARED_DEPENDENCIES = [
+    join(ROOT_DIR, 'common', '*.py'),
+    join(PROCESSORS_DIR, '*.json'),
+    join(SPECIFICATIONS_DIR, '*'),
+    join(CODELISTS_DIR, '*'),
+    GEOCODES_FILE,
+]
+
+
+def hash_files(paths):
+    """Return a hash of the names and contents of the files."""
+
+    hash_ = sha1()
+    for path in sorted(paths):
+        hash_.update(basename(path).encode())
+        with open(path, 'rb') as stream:
+            for chunk in iter(lambda: stream.read(2 ** 20), b''):
+                hash_.update(chunk)
+    return hash_.hexdigest()
+
+
+def _get_source_paths(steps, folder):
+    """Return the local files declared in the source description."""
+
+    paths = []
+    for step in steps:
+        datapackage = (step.get('parameters') or {}).get('datapackage', {})
+        for resource in datapackage.get('resources', []):
+            path = join(folder, resource.get('path', ''))
+            if isfile(path):
+                paths.append(path)
+    return paths
+
+
+def _get_code_hash(step, folder):
+    errors = []
+    try:
+        executor = resolve_executor(step, folder, errors)
+    except Exception:
+        executor = None
+    if not executor or errors:
+        return step['run']
+    return hash_files([executor])
+
+
+def get_stage_keys(steps, folder):
+    """Return the cache key of each step (the key of its output)."""
+
+    shared_paths = [path
+                    for pattern in SHARED_DEPENDENCIES
+                    for path in glob(pattern)
+                    if isfile(path)]
+
+    key = sha1()
+    key.update(hash_files(_get_source_paths(steps, folder)).encode())
+    key.update(hash_files(shared_paths).encode())
+    key = key.hexdigest()
+
+    keys = []
+    for step in steps:
+        parameters = json.dumps(step.get('parameters') or {},
+                                sort_keys=True, default=repr)
+        hash_ = sha1(key.encode())
+        hash_.update(step['run'].encode())
+        hash_.update(_get_code_hash(step, folder).encode())
+        hash_.update(parameters.encode())
+        key = hash_.hexdigest()
+        keys.append(key)
+
+    return keys
+
+
+def has_snapshot(cache_dir, key):
+    return isfile(join(cache_dir, key, DATAPACKAGE_SNAPSHOT))
+
+
+def read_rows(path):
+    """Return the rows of a file written by `write_rows`."""
+
+    with open(path, 'rb') as stream:
+        while True:
+            try:
+                fields, chunk = pickle.load(stream)
+            except EOFError:
+                break
+            for values in chunk:
+                yield dict(zip(fields, values))
+
+
+def load_snapshot(cache_dir, key):
+    """Return the datapackage and the row generators of a snapshot."""
+
+    directory = join(cache_dir, key)
+    with open(join(directory, DATAPACKAGE_SNAPSHOT), 'rb') as stream:
+        datapackage = pickle.load(stream)
+
+    resources = [
+        read_rows(join(directory, RESOURCE_SNAPSHOT.format(i)))
+        for i in range(len(datapackage['resources']))
+    ]
+    return datapackage, resources
+
+
+def write_rows(rows, path, chunk_size=BLOCK_SIZE):
+    """Yield the rows, writing them to a file on the way."""
+
+    with open(path, 'wb') as stream:
+        def flush():
+            pickle.dump((fields, chunk), stream, pickle.HIGHEST_PROTOCOL)
+
+        fields, chunk = None, []
+        for row in rows:
+            # Downstream steps modify rows in place, so copy the values
+            keys = tuple(row)
+            if keys != fields or len(chunk) == chunk_size:
+                if chunk:
+                    flush()
+                fields, chunk = keys, []
+            chunk.append(tuple(row.values()))
+            yield row
+        if chunk:
+            flush()
+
+
+class SnapshotWriter(object):
+    """Write the output of a step to disk while it streams through."""
+
+    def __init__(self, cache_dir, key, datapackage, chunk_size=BLOCK_SIZE):
+        self.directory = join(cache_dir, key)
+        self.temporary_directory = '{}.{}'.format(self.directory, os.getpid())
+        self.nb_resources = len(datapackage['resources'])
+        self.chunk_size = chunk_size
+        self.nb_done = 0
+
+        rmtree(self.temporary_directory, ignore_errors=True)
+        os.makedirs(self.temporary_directory)
+        self._write_datapackage(datapackage)
+
+    def _write_datapackage(self, datapackage):
+        path = join(self.temporary_directory, DATAPACKAGE_SNAPSHOT)
+        with open(path, 'wb') as stream:
+            pickle.dump(datapackage, stream, pickle.HIGHEST_PROTOCOL)
+        if self.nb_resources == 0:
+            self._commit()
+
+    def _commit(self):
+        if exists(self.directory):
+            rmtree(self.temporary_directory, ignore_errors=True)
+        else:
+            os.rename(self.temporary_directory, self.directory)
+
+    def write_rows(self, index, rows):
+        """Yield the rows of a resource, writing them on the way."""
+
+        path = join(self.temporary_directory, RESOURCE_SNAPSHOT.format(index))
+        yield from write_rows(rows, path, self.chunk_size)
+
+        self.nb_done += 1
+        if self.nb_done == self.nb_resources:
+            self._commit()
+
+    def wrap(self, resources):
+        for i, rows in enumerate(resources):
+            yield self.write_rows(i, rows)
+
+
+def prune_snapshots(cache_dir, keys):
+    """Delete the snapshots that are not part of the current pipeline."""
+
+    if not isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name not in keys:
+            logging.debug('Removing stale snapshot %s', name)
+            rmtree(join(cache_dir, name), ignore_errors=True)
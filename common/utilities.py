@@ -1,29 +1,50 @@
-"""A place for useful functions and classes that don't have a home."""
+"""A place for useful functions and classes that don't have a home.
+
+Processors import this module in their own process, so importing it must
+stay cheap: heavy dependencies are imported by the functions that use them
+and nothing is loaded at import time.
+
+"""
 
 import json
-import yaml
 import logging
 import os
-import csv
 
-from datapackage import DataPackage
 from os.path import isfile, join
-from petl import fromdicts, look, fromcsv, dicts
-from slugify import slugify
+
+from .geocodes import get_registry
+from .schema import get_fiscal_schema
 
 from .config import (
     CODELISTS_DIR,
-    FISCAL_SCHEMA_FILE,
-    FISCAL_METADATA_FILE,
-    FISCAL_MODEL_FILE,
     STATUS_FILE,
-    GEOCODES_FILE,
     VERBOSE,
     LOG_SAMPLE_SIZE,
     JSON_FORMAT,
     DATA_DIR, PROCESSORS_DIR)
 
 
+# noinspection PyPep8Naming
+class cached_property(object):
+    """A property computed once per instance.
+
+    This is `functools.cached_property` from python 3.8: the value is saved
+    in the instance dict, which takes precedence over the descriptor.
+
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.name = function.__name__
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.function(instance)
+        return value
+
+
 def format_to_json(blob):
     return json.dumps(blob, **JSON_FORMAT)
 
@@ -41,23 +62,37 @@ def sanitize_field_names(raw_fields):
     return clean_fields
 
 
+def get_json_keys(path):
+    """Return all keys found in the objects of a JSON array.
+
+    The file is parsed as a stream of events (no objects are built), so
+    memory is bounded whatever the size of the file.
+
+    """
+
+    import ijson
+
+    keys = set()
+
+    with open(path, 'rb') as stream:
+        for prefix, event, value in ijson.parse(stream):
+            if event == 'map_key' and prefix == 'item':
+                keys.add(value)
+
+    return keys
+
+
 def get_nuts_codes():
     """Return a list of valid NUTS codes."""
 
-    with open(GEOCODES_FILE) as stream:
-        lines = csv.DictReader(stream)
-        geocodes = []
-        for i, line in enumerate(lines):
-            # The first line has an empty NUTS-code
-            if i > 0:
-                geocode = line['NUTS-Code']
-                geocodes.append(geocode)
-
-    logging.debug('Loaded %d NUTS geocodes', len(geocodes))
-    return tuple(geocodes)
+    # The first line has an empty NUTS-code
+    rows = get_registry().rows[1:]
+    return tuple(row['NUTS-Code'] for row in rows)
 
 
-GEOCODES = list(dicts(fromcsv(GEOCODES_FILE)))
+def get_geocodes():
+    """Return the lines of the geocodes file as a list of dictionaries."""
+    return get_registry().rows
 
 
 def get_all_codelists():
@@ -76,6 +111,8 @@ def get_all_codelists():
 def get_codelist(codelist_file):
     """Return one codelist as a dictionary."""
 
+    import yaml
+
     filepath = os.path.join(CODELISTS_DIR, codelist_file + '.yaml')
     with open(filepath) as stream:
         text = stream.read()
@@ -85,25 +122,24 @@ def get_codelist(codelist_file):
 def get_fiscal_datapackage(skip_validation=False, source=None):
     """Create the master fiscal datapackage from parts."""
 
-    with open(FISCAL_METADATA_FILE) as stream:
-        fiscal_datapackage = yaml.load(stream.read())
+    from datapackage import DataPackage
+    from slugify import slugify
+
+    fiscal_schema = get_fiscal_schema()
 
     if source:
         datapackage = source
         datapackage['name'] = slugify(os.getcwd().lstrip(DATA_DIR)).lower()
     else:
-        datapackage = fiscal_datapackage
+        datapackage = fiscal_schema.metadata
 
-    with open(FISCAL_SCHEMA_FILE) as stream:
-        schema = yaml.load(stream.read())
-        datapackage['resources'][0]['schema'] = schema
-        datapackage['resources'][0].update(mediatype='text/csv')
-        datapackage['resources'] = [datapackage['resources'][0]]
+    datapackage['resources'][0]['schema'] = fiscal_schema.schema
+    datapackage['resources'][0].update(mediatype='text/csv')
+    datapackage['resources'] = [datapackage['resources'][0]]
 
-        # TODO: Update the resource properties in the fiscal data-package
+    # TODO: Update the resource properties in the fiscal data-package
 
-    with open(FISCAL_MODEL_FILE) as stream:
-        datapackage['model'] = yaml.load(stream.read())
+    datapackage['model'] = fiscal_schema.model
 
     if not skip_validation:
         DataPackage(datapackage, schema='fiscal').validate()
@@ -113,20 +149,12 @@ def get_fiscal_datapackage(skip_validation=False, source=None):
 
 def get_fiscal_field_names():
     """Return the list of fiscal fields names."""
-
-    with open(FISCAL_SCHEMA_FILE) as stream:
-        schema = yaml.load(stream.read())
-
-    return [field_['name'] for field_ in schema['fields']]
+    return list(get_fiscal_schema().field_names)
 
 
 def get_fiscal_fields(key):
     """Return a lookup table matching the field name to another property."""
-
-    with open(FISCAL_SCHEMA_FILE) as stream:
-        schema = yaml.load(stream.read())
-
-    return {field_['name']: field_[key] for field_ in schema['fields']}
+    return get_fiscal_schema().get_property(key)
 
 
 def write_feedback(section, messages, folder=os.getcwd()):
@@ -158,9 +186,6 @@ def get_available_processors():
     return modules
 
 
-processor_names = get_available_processors()
-
-
 def process(resources,
             row_processor,
             pass_resource_index=False,
@@ -194,9 +219,42 @@ def process(resources,
                     sample_rows.append(new_row)
 
             if verbose:
+                from petl import fromdicts, look
                 table = look(fromdicts(sample_rows), limit=LOG_SAMPLE_SIZE)
                 message = 'Output of processor %s for resource %s is...\n%s'
                 args = row_processor.__name__, resource_index, table
                 logging.info(message, *args)
 
         yield process_rows(resource)
+
+
+def close_after(resources, close):
+    """Yield the resources and call `close` once all their rows are read.
+
+    Cleaning up when the generator of resources is exhausted is too early
+    when the consumer collects the resources before reading their rows
+    (a subprocess step for example). Here, `close` is called once the last
+    resource is exhausted and no other resource is left, whatever the
+    order in which they are consumed.
+
+    """
+
+    nb_pending = 0
+    is_exhausted = False
+
+    def close_if_done():
+        if is_exhausted and nb_pending == 0:
+            close()
+
+    def track(resource):
+        nonlocal nb_pending
+        yield from resource
+        nb_pending -= 1
+        close_if_done()
+
+    for resource_ in resources:
+        nb_pending += 1
+        yield track(resource_)
+
+    is_exhausted = True
+    close_if_done()
@@ -0,0 +1,139 @@
+"""Unit-tests for the `concatenate_all_pipelines` processor."""
+
+import json
+
+from glob import glob
+from os.path import join
+from zipfile import ZipFile
+
+from pytest import importorskip, raises
+
+from common.columnar import ParquetDatasetWriter
+from common.processors.concatenate_all_pipelines import (
+    format_data_sample,
+    read_fiscal_zip,
+    concatenate)
+
+
+def _zip(tmpdir, name, *csv_texts):
+    path = str(tmpdir.join(name))
+    with ZipFile(path, 'w') as zipped_files:
+        zipped_files.writestr('datapackage.json', '{}')
+        for i, csv_text in enumerate(csv_texts):
+            zipped_files.writestr('data/resource%s.csv' % i, csv_text)
+    return path
+
+
+def test_format_data_sample_returns_a_table():
+    expected_representation = (
+        "+-------+\n"
+        "| col1  |\n"
+        "+=======+\n"
+        "| 'foo' |\n"
+        "+-------+\n"
+        "| 'bar' |\n"
+        "+-------+\n"
+    )
+    rows = [{'col1': 'foo'}, {'col1': 'bar'}]
+    assert format_data_sample(rows) == expected_representation
+
+
+def test_read_fiscal_zip_keeps_the_subset_of_fields(tmpdir):
+    path = _zip(tmpdir, 'fiscal.datapackage.zip',
+                'amount,foo,fund\r\n1,x,ERDF\r\n\r\n2,y\r\n',
+                'fund,amount\r\nESF,3\r\n')
+
+    rows = list(read_fiscal_zip(path, frozenset(['amount', 'fund'])))
+
+    assert rows == [
+        {'amount': '1', 'fund': 'ERDF'},
+        {'amount': '2', 'fund': ''},
+        {'amount': '3', 'fund': 'ESF'},
+    ]
+
+
+def test_read_fiscal_zip_decodes_utf8(tmpdir):
+    path = _zip(tmpdir, 'fiscal.datapackage.zip',
+                'beneficiary_name\r\n"Universität, Graz"\r\n')
+
+    rows = list(read_fiscal_zip(path, frozenset(['beneficiary_name'])))
+
+    assert rows == [{'beneficiary_name': 'Universität, Graz'}]
+
+
+def test_read_fiscal_zip_skips_bad_zip_files(tmpdir):
+    path = str(tmpdir.join('fiscal.datapackage.zip'))
+    with open(path, 'w') as stream:
+        stream.write('not a zip')
+
+    assert list(read_fiscal_zip(path, frozenset(['amount']))) == []
+
+
+def test_concatenate_keeps_the_order_of_the_datasets(tmpdir):
+    paths = [
+        _zip(tmpdir, '%s.zip' % i,
+             'project_id,fund_acronym\r\n' +
+             ''.join('%s,%s\r\n' % (j, i) for j in range(3)))
+        for i in range(4)
+    ]
+
+    fields = ['project_id', 'fund_acronym']
+    rows = list(concatenate(paths, fields=fields, workers=2,
+                            **{'cache-dir': False}))
+
+    assert rows == [{'project_id': str(j), 'fund_acronym': str(i)}
+                    for i in range(4) for j in range(3)]
+
+
+def test_concatenate_raises_on_an_invalid_subset_of_fields(tmpdir):
+    with raises(ValueError):
+        list(concatenate([], fields=['foo']))
+
+
+def test_concatenate_reads_parquet_datasets(tmpdir):
+    importorskip('pyarrow')
+    fields = [{'name': 'beneficiary_country_code'},
+              {'name': 'project_id'},
+              {'name': 'fund_acronym'}]
+    paths = []
+    for country in ['AT', 'BE']:
+        path = str(tmpdir.join(country))
+        writer = ParquetDatasetWriter(path, fields)
+        writer.write({'beneficiary_country_code': country,
+                      'project_id': '1', 'fund_acronym': 'ERDF'})
+        writer.close()
+        paths.append(path)
+
+    rows = list(concatenate(paths,
+                            fields=['project_id', 'beneficiary_country_code'],
+                            filters=[['beneficiary_country_code', '=', 'BE']],
+                            workers=1,
+                            **{'source-format': 'parquet',
+                               'cache-dir': str(tmpdir.join('cache'))}))
+
+    assert rows == [{'project_id': '1', 'beneficiary_country_code': 'BE'}]
+
+
+def test_concatenate_only_reads_the_inputs_that_changed(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    paths = [_zip(tmpdir, '%s.zip' % i, 'project_id\r\n%s\r\n' % i)
+             for i in range(3)]
+    params = {'fields': ['project_id'], 'workers': 2, 'cache-dir': cache_dir}
+
+    assert list(concatenate(paths, **params)) == [
+        {'project_id': '0'}, {'project_id': '1'}, {'project_id': '2'}
+    ]
+
+    _zip(tmpdir, '1.zip', 'project_id\r\n1\r\n10\r\n')
+    rows = list(concatenate(paths, **params))
+
+    assert rows == [{'project_id': '0'}, {'project_id': '1'},
+                    {'project_id': '10'}, {'project_id': '2'}]
+    manifest_file, = glob(join(cache_dir, '*.manifest.json'))
+    with open(manifest_file) as stream:
+        entries = json.load(stream)['inputs']
+    assert [entry['reused'] for entry in entries] == [True, False, True]
+    assert [(entry['first_row'], entry['nb_rows']) for entry in entries] == [
+        (0, 1), (1, 2), (3, 1)
+    ]
+    assert len(glob(join(cache_dir, '*.segment'))) == 3
@@ -0,0 +1,78 @@
+"""Unit-tests for the `currency_convert` processor."""
+
+from datetime import date
+from decimal import Decimal
+
+from common.rates import get_key, read_json_rates
+from common.processors.currency_convert import RateIndex, process
+
+CURRENCIES = {
+    'PLN-2014-06': 0.25,
+    'PLN-2015-06': 0.2,
+    'PLN-2015-07': 0.24,
+    'CZK-2014-06': 0.04,
+}
+
+
+def test_rate_index_returns_decimal_rates():
+    rates = RateIndex(CURRENCIES)
+    assert rates.get_rate('PLN', 2015, 7) == Decimal(0.24)
+    assert rates.get_float('PLN', 2015, 7) == 0.24
+    assert rates.get_rate('PLN', 2015, 1) is None
+    assert rates.get_rate('PLN', 2013, 12) is None
+    assert rates.get_rate('PLN', 2016, 1) is None
+    assert rates.get_rate('SEK', 2015, 7) is None
+
+
+def test_rate_index_averages_the_funding_period():
+    rates = RateIndex(CURRENCIES)
+    assert rates.get_period_rate('PLN', '2014-2016') == (
+        Decimal((0.25 + 0.2) / 2), ())
+    assert rates.get_period_rate('PLN', '2014-2017') == (
+        Decimal((0.25 + 0.2) / 2), ('PLN-2016-06',))
+    assert rates.get_period_rate('SEK', '2014-2015') == (
+        None, ('SEK-2014-06',))
+
+
+def test_rate_index_loads_the_json_rates():
+    json_rates = list(read_json_rates())
+    rates = RateIndex({get_key(currency, year, month): rate
+                       for currency, year, month, rate in json_rates})
+    for currency, year, month, rate in json_rates:
+        assert rates.get_rate(currency, year, month) == Decimal(rate)
+
+
+def test_process_converts_amounts_and_reports_missing_keys(tmpdir):
+    missing_keys_file = str(tmpdir.join('missing-keys.txt'))
+    rows = [
+        {'amount': Decimal(10), 'date': date(2015, 7, 1)},
+        {'amount': Decimal(10), 'date': None, 'funding_period': '2014-2016'},
+        {'amount': Decimal(10), 'date': date(2015, 8, 1)},
+        {'amount': Decimal(10), 'date': date(2015, 8, 9)},
+        {'amount': None, 'date': date(2020, 1, 1)},
+    ]
+    resources = process([iter(rows)], 'amount', 'PLN', 'currency', ['date'],
+                        RateIndex(CURRENCIES), missing_keys_file)
+    new_rows = [row for resource in resources for row in resource]
+
+    assert [row['amount'] for row in new_rows] == [
+        Decimal(10) * Decimal(0.24),
+        Decimal(10) * Decimal((0.25 + 0.2) / 2),
+        None,
+        None,
+        None,
+    ]
+    assert {row['currency'] for row in new_rows} == {'PLN'}
+    assert tmpdir.join('missing-keys.txt').read() == 'PLN-2015-08\n'
+
+
+def test_process_saves_missing_keys_after_the_rows_are_read(tmpdir):
+    missing_keys_file = str(tmpdir.join('missing-keys.txt'))
+    rows = [{'amount': Decimal(10), 'date': date(2015, 1, 1)}]
+    # Like a subprocess step, collect the resources before reading the rows
+    resources = list(process([iter(rows)], 'amount', 'PLN', 'currency',
+                             ['date'], RateIndex(CURRENCIES),
+                             missing_keys_file))
+    list(resources[0])
+
+    assert tmpdir.join('missing-keys.txt').read() == 'PLN-2015-01\n'
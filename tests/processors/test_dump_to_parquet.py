@@ -0,0 +1,67 @@
+"""Unit-tests for the `dump_to_parquet` processor."""
+
+from pytest import importorskip
+
+from common.columnar import read_dataset
+from common.processors.dump_to_parquet import process
+
+importorskip('pyarrow')
+
+DATAPACKAGE = {
+    'resources': [
+        {'schema': {'fields': [{'name': 'beneficiary_country_code'},
+                               {'name': 'amount', 'type': 'number'}]}},
+        {'schema': {'fields': [{'name': 'amount', 'type': 'number'}]}},
+    ]
+}
+
+
+def test_process_passes_rows_through_and_writes_the_dataset(tmpdir):
+    path = str(tmpdir.join('fiscal.parquet'))
+    resources = [
+        iter([{'beneficiary_country_code': 'AT', 'amount': 1}]),
+        iter([{'amount': 2}]),
+    ]
+
+    rows = [row
+            for resource in process(DATAPACKAGE, resources, path)
+            for row in resource]
+
+    assert rows == [{'beneficiary_country_code': 'AT', 'amount': 1},
+                    {'amount': 2}]
+    assert sorted(read_dataset(path), key=lambda row: row['amount']) == [
+        {'beneficiary_country_code': 'AT', 'amount': 1.0,
+         'funding_period': None},
+        {'beneficiary_country_code': None, 'amount': 2.0,
+         'funding_period': None},
+    ]
+
+
+def test_process_drops_the_dataset_if_the_pipeline_fails(tmpdir):
+    path = tmpdir.join('fiscal.parquet')
+
+    def failing_resource():
+        yield {'amount': 1}
+        raise RuntimeError
+
+    resources = process(DATAPACKAGE, iter([failing_resource()]), str(path))
+    try:
+        for resource in resources:
+            list(resource)
+    except RuntimeError:
+        resources.close()
+
+    assert tmpdir.listdir() == []
+
+
+def test_process_writes_the_dataset_after_the_last_row(tmpdir):
+    path = str(tmpdir.join('fiscal.parquet'))
+    resources = [iter([{'amount': 1}]), iter([{'amount': 2}])]
+
+    # Like a subprocess step, collect the resources before reading the rows
+    resources = list(process(DATAPACKAGE, resources, path))
+    assert not tmpdir.join('fiscal.parquet').check()
+    for resource in resources:
+        list(resource)
+
+    assert sorted(row['amount'] for row in read_dataset(path)) == [1.0, 2.0]
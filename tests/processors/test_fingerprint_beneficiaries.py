@@ -0,0 +1,91 @@
+"""Unit-tests for the `fingerprint_beneficiaries` processor."""
+
+import sqlite3
+
+from unittest.mock import patch
+
+from common.processors import fingerprint_beneficiaries
+from common.processors.fingerprint_beneficiaries import (
+    Fingerprinter,
+    get_options,
+    get_store_table,
+    process
+)
+
+NAMES = ['Stadt Wien', 'Universität Graz', 'Stadt Wien', None, 'Stadt Wien']
+
+
+def _run(**options):
+    rows = [{'beneficiary_name': name} for name in NAMES]
+    return [row['beneficiary_id']
+            for resource in process([iter(rows)], **options)
+            for row in resource]
+
+
+def test_process_adds_the_fingerprints():
+    assert _run() == ['Stadt wien', 'Graz universitat', 'Stadt wien',
+                      None, 'Stadt wien']
+
+
+def test_process_memoizes_fingerprints():
+    generate = fingerprint_beneficiaries.fingerprints.generate
+    with patch.object(fingerprint_beneficiaries.fingerprints, 'generate',
+                      wraps=generate) as wrapper:
+        _run(cache_size=16)
+        assert wrapper.call_count == 3
+
+
+def test_process_uses_the_store(tmpdir):
+    store_file = str(tmpdir.join('store', 'fingerprints.sqlite'))
+    ids = _run(store_file=store_file)
+
+    generate = fingerprint_beneficiaries.fingerprints.generate
+    with patch.object(fingerprint_beneficiaries.fingerprints, 'generate',
+                      wraps=generate) as wrapper:
+        assert _run(store_file=store_file) == ids
+        # Only the missing name is fingerprinted again
+        assert wrapper.call_count == 1
+
+
+def test_process_closes_the_store_after_the_last_row(tmpdir):
+    store_file = str(tmpdir.join('store', 'fingerprints.sqlite'))
+    rows = [{'beneficiary_name': name} for name in NAMES]
+    # Like a subprocess step, collect the resources before reading the rows
+    resources = list(process([iter(rows)], store_file=store_file))
+    ids = [row['beneficiary_id'] for row in resources[0]]
+
+    generate = fingerprint_beneficiaries.fingerprints.generate
+    with patch.object(fingerprint_beneficiaries.fingerprints, 'generate',
+                      wraps=generate) as wrapper:
+        assert _run(store_file=store_file) == ids
+        assert wrapper.call_count == 1
+
+
+def test_fingerprinter_counts_hits_and_misses(tmpdir):
+    fingerprinter = Fingerprinter(store_file=str(tmpdir.join('store.db')))
+    for name in NAMES:
+        fingerprinter.generate(name)
+    fingerprinter.close()
+
+    assert fingerprinter.stats == {'memo hits': 2, 'memo misses': 3,
+                                   'store misses': 2}
+
+
+def test_process_keeps_one_table_per_library_version(tmpdir):
+    store_file = str(tmpdir.join('store', 'fingerprints.sqlite'))
+    with patch.object(fingerprint_beneficiaries, 'get_store_table',
+                      return_value='fingerprints_0_1'):
+        _run(store_file=store_file)
+    _run(store_file=store_file)
+
+    with sqlite3.connect(store_file) as store:
+        tables = store.execute("SELECT name FROM sqlite_master "
+                               "WHERE type = 'table' ORDER BY name")
+        assert [table for table, in tables] == sorted([
+            'fingerprints_0_1', get_store_table()])
+
+
+def test_get_options_turns_on_the_store_on_request():
+    assert get_options({'cache-size': 8}) == {
+        'cache_size': 8, 'store_file': None}
+    assert get_options({'store': True})['store_file'] is not None
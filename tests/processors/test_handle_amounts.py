@@ -0,0 +1,69 @@
+"""Unit-tests for the `handle_amounts` processor."""
+
+from collections import Counter
+from decimal import Decimal
+
+from pytest import mark
+
+from common.processors.handle_amounts import (
+    EMPTY,
+    NON_ZERO,
+    ZERO,
+    classify,
+    process,
+    process_block
+)
+
+COLUMNS = ['eu', 'total']
+ROWS = [
+    ({'eu': '1.5', 'total': '3'}, 'eu'),
+    ({'eu': '0,00', 'total': Decimal('12.00')}, 'total'),
+    ({'eu': Decimal(0), 'total': ''}, 'eu'),
+    ({'eu': None, 'total': '-'}, None),
+    ({'total': 0}, 'total'),
+]
+
+
+@mark.parametrize('value, kind', [
+    (None, EMPTY), ('', EMPTY), (' - ', EMPTY), ('n/a', EMPTY),
+    ('0', ZERO), ('0.00', ZERO), (0, ZERO), (Decimal('0.0'), ZERO),
+    ('10', NON_ZERO), (Decimal('0.01'), NON_ZERO), (-3, NON_ZERO),
+])
+def test_classify_returns_the_kind_of_a_value(value, kind):
+    assert classify(value) == kind
+
+
+def test_process_picks_the_first_non_zero_then_zero_amount():
+    rows = [dict(row, amount='x', kind='y') for row, _ in ROWS]
+    new_rows = list(next(process([iter(rows)], COLUMNS, 'amount', 'kind')))
+
+    for new_row, (row, column) in zip(new_rows, ROWS):
+        if column:
+            assert new_row['amount'] == row[column]
+            assert new_row['kind'] == column
+        else:
+            assert new_row['amount'] == 'x'
+            assert new_row['kind'] == 'y'
+
+
+def test_process_leaves_rows_without_amount_as_they_are():
+    rows = [{'eu': None, 'total': '-'}, {'eu': '', 'total': None}]
+    new_rows = list(next(process([iter(rows)], COLUMNS, 'amount', 'kind')))
+
+    assert new_rows == rows
+
+
+def test_process_block_picks_the_same_amounts_as_process():
+    block = {
+        'eu': [row.get('eu') for row, _ in ROWS],
+        'total': [row.get('total') for row, _ in ROWS],
+    }
+    stats = Counter()
+    block, report = process_block(block, COLUMNS + ['missing'],
+                                  'amount', 'kind', stats)
+
+    assert report == '_pass'
+    assert block['kind'] == [column for _, column in ROWS]
+    assert block['amount'] == [row[column] if column else None
+                               for row, column in ROWS]
+    assert stats == {'eu': 2, 'total': 2, None: 1}
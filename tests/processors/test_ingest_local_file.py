@@ -1,6 +1,9 @@
 """Unit-tests for the `ingest_local_file` processor."""
 
-from common.processors.ingest_local_file import BaseIngestor
+from unittest.mock import patch
+
+from common.processors import ingest_local_file
+from common.processors.ingest_local_file import BaseIngestor, ingest_resources
 
 
 # noinspection PyProtectedMember
@@ -9,3 +12,58 @@ def test_lowercase_empty_values():
         [(1, ['foo'], ['bar'])])) == (1, ['foo'], ['bar'])
     assert next(BaseIngestor._lowercase_empty_values(
         [(1, ['foo'], ['None'])])) == (1, ['foo'], ['none'])
+
+
+# noinspection PyProtectedMember
+def test_csv_ingestor_reads_headers_and_rows_from_a_single_stream(tmpdir):
+    path = tmpdir.join('source.csv')
+    path.write_binary('"Name\n of project",Amount\nfoo,1\nbar,2\n'.encode())
+    resource = {
+        'name': 'source',
+        'path': str(path),
+        'encoding': 'utf-8',
+        'schema': {'fields': [{'name': 'Name of project'},
+                              {'name': 'Amount'}]}
+    }
+    ingestor = BaseIngestor.load(resource)
+    assert list(ingestor.rows) == [
+        {'Name of project': 'foo', 'Amount': '1'},
+        {'Name of project': 'bar', 'Amount': '2'},
+    ]
+    assert ingestor._stream.closed
+
+
+def test_json_ingestor_fills_missing_keys_without_touching_the_file(tmpdir):
+    path = tmpdir.join('source.json')
+    text = '[{"Name": "foo", "Amount": 1.5}, {"Name": "bar"}]'
+    path.write(text)
+    resource = {
+        'name': 'source',
+        'path': str(path),
+        'schema': {'fields': [{'name': 'Name'}, {'name': 'Amount'}]}
+    }
+    assert list(BaseIngestor.load(resource).rows) == [
+        {'Name': 'foo', 'Amount': '1.5'},
+        {'Name': 'bar', 'Amount': ''},
+    ]
+    assert path.read() == text
+
+
+def test_ingest_resources_parses_resources_in_parallel_by_default(tmpdir):
+    resources = []
+    for i in range(2):
+        path = tmpdir.join('source{}.csv'.format(i))
+        path.write_binary('Amount\n{}\n'.format(i).encode())
+        resources.append({'name': 'source{}'.format(i),
+                          'path': str(path),
+                          'encoding': 'utf-8',
+                          'schema': {'fields': [{'name': 'Amount'}]}})
+
+    with patch.object(ingest_local_file.os, 'cpu_count', return_value=4), \
+            patch.object(ingest_local_file, 'parallel_streams',
+                         wraps=ingest_local_file.parallel_streams) as parallel:
+        rows = [list(resource)
+                for resource in ingest_resources({'resources': resources})]
+        assert parallel.call_args[0][2] == 2
+
+    assert rows == [[{'Amount': '0'}], [{'Amount': '1'}]]
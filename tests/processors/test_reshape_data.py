@@ -1,7 +1,12 @@
 """Test the common reshape_data processor."""
 
 from pytest import mark
-from common.processors.reshape_data import process_resources, process_row
+from common.schema import get_fiscal_schema
+from common.processors.reshape_data import (
+    process_resources,
+    process_row,
+    update_datapackage
+)
 
 test_cases = [
     ({1: 'a', 2: 'b'}, [1, 2, 3], {1: 'a', 2: 'b', 3: None}),
@@ -17,3 +22,39 @@ def test_process_rows_function(input_row, required_fields, expected_output):
 def test_process_resources_function():
     output_resources = process_resources([[{1: 'a', 2: 'b'}]], [1, 3])
     assert next(next(output_resources)) == {1: 'a', 3: None}
+
+
+def test_process_resources_follows_the_fiscal_field_order():
+    rows = [{3: 'c', 9: 'z', 1: 'a'}, {1: 'b', 3: 'd', 9: 'y'}]
+    output_rows = list(next(process_resources([rows], [1, 2, 3])))
+    assert output_rows == [{1: 'a', 2: None, 3: 'c'},
+                           {1: 'b', 2: None, 3: 'd'}]
+    assert [list(row) for row in output_rows] == [[1, 2, 3], [1, 2, 3]]
+
+
+def test_process_resources_recompiles_the_plan_for_ragged_rows():
+    rows = [{1: 'a', 2: 'b'}, {1: 'c'}, {2: 'd', 3: 'e'}]
+    output_rows = list(next(process_resources([rows], [1, 2, 3])))
+    assert output_rows == [{1: 'a', 2: 'b', 3: None},
+                           {1: 'c', 2: None, 3: None},
+                           {1: None, 2: 'd', 3: 'e'}]
+
+
+def test_process_resources_keeps_the_extra_fields_of_later_rows():
+    rows = [{'x': 1}, {'x': 2, 'y': 5}]
+    output_rows = list(next(process_resources([rows], ['x', 'y'])))
+    assert output_rows == [{'x': 1, 'y': None}, {'x': 2, 'y': 5}]
+
+
+def test_update_datapackage_follows_the_fiscal_schema_order():
+    fiscal_names = get_fiscal_schema().field_names
+    datapackage = {'resources': [{'schema': {'fields': [
+        {'name': 'foo', 'type': 'string'},
+        {'name': fiscal_names[1], 'type': 'number'},
+        {'name': fiscal_names[0], 'type': 'date'},
+    ]}}]}
+    fields = update_datapackage(datapackage)['resources'][0]['schema']['fields']
+    assert tuple(field['name'] for field in fields) == fiscal_names
+    assert fields[0]['type'] == 'date'
+    assert fields[1]['type'] == 'number'
+    assert fields[2]['type'] == 'string'
@@ -5,6 +5,7 @@ from decimal import Decimal
 from math import floor
 from jsontableschema.types import DateType, NumberType
 from pytest import fixture, mark, raises
+from tableschema.exceptions import CastError
 from collections import UserList
 
 from common.config import (
@@ -21,7 +22,9 @@ from common.processors.sniff_and_cast import (
     select_sniffer,
     NumberSniffer,
     get_casters,
-    CasterNotFound
+    CasterNotFound,
+    NumberCaster,
+    DateCaster
 )
 
 
@@ -273,3 +276,59 @@ currency_sniffer = NumberSniffer(currency_field, sample_resources, 0)
 @mark.parametrize('value', _VALID_RAW_CURRENCIES)
 def test_number_sniffer_on_values_with_currency_units(value):
     assert currency_sniffer.cast(value)
+
+
+# Ranking format guesses
+# -----------------------------------------------------------------------------
+
+def test_number_sniffer_ranks_guesses_by_number_of_parsed_values():
+    field = {'name': 'foo', 'type': 'number'}
+    sample = [{'foo': '1.234,56'}] * 3 + [{'foo': '1,234.56'}, {'foo': ''}]
+    sniffer = NumberSniffer(field, sample, 0)
+    ranking = [(successes, fmt['decimalChar'], fmt['groupChar'])
+               for _, successes, fmt in sniffer.casters[:3]]
+    assert ranking == [(3, ',', '.'), (1, '.', ','), (0, '.', ' ')]
+
+
+# Native casters
+# -----------------------------------------------------------------------------
+
+_NUMBER_VALUES = ['1.234,56', ' 1 234,5 ', '€ 12,00', '-5,00', '1,2,3', 'foo', '']
+
+
+@mark.parametrize('format', NUMBER_FORMATS)
+@mark.parametrize('value', _NUMBER_VALUES)
+def test_number_caster_behaves_like_tableschema(format, value):
+    descriptor = dict(format, name='foo', type='number')
+    caster = NumberCaster(descriptor)
+    try:
+        expected = caster.field.cast_value(value)
+    except CastError:
+        expected = caster.NO_MATCH
+    assert caster.try_cast(value) == expected
+
+
+_DATE_VALUES = ['2015-01-31', '31.01.2015', '31/01/2015', '1/2/2015',
+                '31/02/2015', '2015', '15-01-31', 'foo', '']
+
+
+@mark.parametrize('format', DATE_FORMATS)
+@mark.parametrize('value', _DATE_VALUES)
+def test_date_caster_behaves_like_tableschema(format, value):
+    descriptor = dict(format, name='foo', type='date')
+    caster = DateCaster(descriptor)
+    try:
+        expected = caster.field.cast_value(value)
+    except CastError:
+        expected = caster.NO_MATCH
+    assert caster.try_cast(value) == expected
+
+
+# noinspection PyProtectedMember
+def test_sniffer_moves_the_most_frequent_format_first():
+    field = {'name': 'foo', 'type': 'date'}
+    sniffer = DateSniffer(field, [{'foo': '2015'}], 0)
+    assert sniffer.cast('2015') == date(2015, 1, 1)
+    for _ in range(30):
+        assert sniffer.cast('31.01.2015') == date(2015, 1, 31)
+    assert sniffer._cast_order[0][2] == {'format': '%d.%m.%Y'}
@@ -0,0 +1,43 @@
+"""Unit-tests for the `validate_values` processor."""
+
+import json
+
+from pytest import raises
+
+from common.processors.validate_values import process
+
+ROWS = [
+    {'fund': 'ERDF', 'amount': 1},
+    {'fund': 'ESF', 'amount': None},
+    {'fund': 'unknown', 'amount': 3},
+    {'fund': '', 'amount': 4},
+]
+
+
+def _run(rows, thresholds, allowed_values, profile_file):
+    resources = process([iter(rows)], thresholds, allowed_values,
+                        str(profile_file))
+    return [row for resource in resources for row in resource]
+
+
+def test_process_writes_the_profile(tmpdir):
+    profile_file = tmpdir.join('fiscal.profile.json')
+    rows = _run(ROWS, {'amount': 75}, {'fund': ['ERDF', 'ESF']}, profile_file)
+
+    assert rows == ROWS
+    profile = json.loads(profile_file.read())
+    assert profile['resources'][0]['rows'] == 4
+    assert profile['resources'][0]['fields']['amount']['sum'] == 8
+
+
+def test_process_reports_all_problems_after_the_last_row(tmpdir):
+    profile_file = tmpdir.join('fiscal.profile.json')
+    with raises(ValueError) as error:
+        _run(ROWS + [{'fund': 'CF', 'amount': None}],
+             {'amount': 75, 'fund': 50}, {'fund': ['ERDF']}, profile_file)
+
+    message = str(error.value)
+    assert "fund: Got 2 bad values ['CF', 'ESF']" in message
+    assert 'amount: Got 3 good values (out of 5), which is 60%' in message
+    assert 'fund: Got' in message.splitlines()[0]
+    assert profile_file.check()
@@ -0,0 +1,63 @@
+"""Unit-tests for the `benchmarks` package."""
+
+import csv
+
+from benchmarks.run import compare, run_benchmarks
+from benchmarks.synthetic import (
+    DELIMITER,
+    ENCODING,
+    HEADERS,
+    format_number,
+    generate_rows,
+    write_source,
+)
+
+
+def test_format_number_uses_a_decimal_comma():
+    assert format_number(1234567.891) == '1.234.567,89'
+    assert format_number(12.5) == '12,50'
+
+
+def test_generate_rows_is_reproducible_and_repeats_names():
+    rows = list(generate_rows(1000, seed=1))
+
+    assert rows == list(generate_rows(1000, seed=1))
+    assert len({row['Beneficjent'] for row in rows}) < 500
+    assert len({row['Data rozpoczęcia'][2] for row in rows}) > 1
+
+
+def test_write_source_writes_windows_1250_csv(tmpdir):
+    path = str(tmpdir.join('source.csv'))
+    write_source(10, path)
+
+    with open(path, encoding=ENCODING, newline='') as stream:
+        lines = list(csv.reader(stream, delimiter=DELIMITER))
+
+    assert lines[0] == HEADERS
+    assert len(lines) == 11
+
+
+def test_run_benchmarks_measures_the_steps(tmpdir):
+    with tmpdir.as_cwd():
+        results = run_benchmarks(50, str(tmpdir),
+                                 names=['map_values', 'reshape_data'])
+
+    assert sorted(results) == ['map_values', 'reshape_data']
+    assert results['reshape_data']['rows'] == 50
+
+
+def test_compare_flags_slower_and_bigger_steps():
+    baseline = {
+        'a': {'rows_per_second': 1000, 'peak_rss_mb': 100},
+        'b': {'rows_per_second': 1000, 'peak_rss_mb': 1},
+    }
+    results = {
+        'a': {'rows_per_second': 700, 'peak_rss_mb': 150},
+        'b': {'rows_per_second': 900, 'peak_rss_mb': 4},
+        'c': {'rows_per_second': 1, 'peak_rss_mb': 1000},
+    }
+
+    regressions = compare(results, baseline, tolerance=0.2)
+
+    assert len(regressions) == 2
+    assert all(regression.startswith('a: ') for regression in regressions)
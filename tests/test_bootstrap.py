@@ -4,7 +4,7 @@ import json
 import os
 
 from shutil import rmtree
-from common.bootstrap import Source
+from common.bootstrap import Source, collect_sources, get_description_validator
 from unittest import TestCase
 
 from common.config import DATA_DIR, PIPELINE_FILE, SOURCE_FILE
@@ -129,6 +129,34 @@ class TestInitSource(TestSource):
         self.assertEquals(self.source.validation_errors, [])
 
 
+class TestValidateSource(TestSource):
+    """Test description validation."""
+
+    def test_description_validator_is_compiled_once(self):
+        self.assertIs(get_description_validator(), get_description_validator())
+
+    def test_invalid_description_collects_sorted_errors(self):
+        self.source.description = {'name': 1}
+        self.source.validation_status = 'loaded'
+        self.source._validate()
+        self.assertEquals(self.source.validation_status, 'loaded')
+        self.assertTrue(self.source.validation_errors)
+        self.assertListEqual(self.source.validation_errors,
+                             sorted(self.source.validation_errors))
+
+
+class TestCollectSources(TestSource):
+    """Test collecting sources in worker processes."""
+
+    def test_collect_sources_in_a_pool_of_workers(self):
+        sources = collect_sources(select={'id': self.pipeline_id},
+                                  workers=2,
+                                  db_session='dummy session')
+        self.assertEquals(len(sources), 1)
+        self.assertEquals(sources[0].validation_status, 'valid')
+        self.assertEquals(sources[0].db_session, 'dummy session')
+
+
 class TestModifyPipeline(TestSource):
     """Test inserting and removing pipeline processors."""
 
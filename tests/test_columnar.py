@@ -0,0 +1,122 @@
+"""Unit-tests for the `columnar` module."""
+
+from datetime import date
+from decimal import Decimal
+from os import listdir
+
+from pytest import importorskip, mark, raises
+
+from common.columnar import NULL_PARTITION, ParquetDatasetWriter, read_dataset
+
+importorskip('pyarrow')
+
+FIELDS = [
+    {'name': 'beneficiary_country_code', 'type': 'string'},
+    {'name': 'funding_period', 'type': 'string'},
+    {'name': 'beneficiary_name', 'type': 'string'},
+    {'name': 'amount', 'type': 'number'},
+    {'name': 'approval_date', 'type': 'date'},
+]
+
+ROWS = [
+    {'beneficiary_country_code': 'AT', 'funding_period': '2014-2020',
+     'beneficiary_name': 'Graz', 'amount': Decimal('1.5'),
+     'approval_date': date(2015, 1, 1)},
+    {'beneficiary_country_code': 'BE', 'funding_period': '2007-2013',
+     'beneficiary_name': 'Liège', 'amount': Decimal('2'),
+     'approval_date': None},
+    {'beneficiary_country_code': 'AT', 'funding_period': '2007-2013',
+     'beneficiary_name': 'Wien', 'amount': 1234567890.05,
+     'approval_date': date(2010, 6, 1)},
+    {'beneficiary_country_code': None, 'funding_period': '2007-2013',
+     'beneficiary_name': '', 'amount': None,
+     'approval_date': None},
+]
+
+
+def _write(path, rows, row_group_size=2):
+    writer = ParquetDatasetWriter(str(path), FIELDS,
+                                  row_group_size=row_group_size)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+    return writer
+
+
+def _sort(rows):
+    return sorted(rows, key=lambda row: row['beneficiary_name'] or '')
+
+
+def test_writer_partitions_the_dataset(tmpdir):
+    path = tmpdir.join('fiscal.parquet')
+    _write(path, ROWS)
+
+    assert sorted(listdir(str(path))) == [
+        'beneficiary_country_code=AT',
+        'beneficiary_country_code=BE',
+        'beneficiary_country_code=' + NULL_PARTITION,
+    ]
+    assert sorted(listdir(str(path.join('beneficiary_country_code=AT')))) == [
+        'funding_period=2007-2013',
+        'funding_period=2014-2020',
+    ]
+    assert not tmpdir.join('fiscal.parquet.tmp').exists()
+
+
+def test_read_dataset_returns_typed_rows(tmpdir):
+    path = tmpdir.join('fiscal.parquet')
+    _write(path, ROWS)
+
+    rows = _sort(read_dataset(str(path)))
+
+    assert rows[0] == {'beneficiary_country_code': None,
+                       'funding_period': '2007-2013',
+                       'beneficiary_name': None,
+                       'amount': None,
+                       'approval_date': None}
+    assert rows[1] == {'beneficiary_country_code': 'AT',
+                       'funding_period': '2014-2020',
+                       'beneficiary_name': 'Graz',
+                       'amount': 1.5,
+                       'approval_date': date(2015, 1, 1)}
+    assert rows[3]['amount'] == Decimal('1234567890.05')
+
+
+@mark.parametrize('amount', ['n/a', Decimal('0.1234567'), float('inf')])
+def test_writer_raises_on_values_that_do_not_fit(tmpdir, amount):
+    writer = ParquetDatasetWriter(str(tmpdir.join('fiscal.parquet')), FIELDS)
+    writer.write(ROWS[0])
+
+    with raises(ValueError) as error:
+        writer.write(dict(ROWS[1], amount=amount))
+    assert 'amount column (row 2 of resource 0)' in str(error.value)
+    writer.abort()
+
+
+def test_read_dataset_projects_and_filters(tmpdir):
+    path = tmpdir.join('fiscal.parquet')
+    _write(path, ROWS, row_group_size=1)
+
+    rows = read_dataset(str(path),
+                        columns=['beneficiary_name', 'amount'],
+                        filters=[('beneficiary_country_code', '=', 'AT'),
+                                 ('funding_period', 'in', ['2014-2020'])])
+
+    assert list(rows) == [{'beneficiary_name': 'Graz', 'amount': 1.5}]
+
+
+def test_read_dataset_raises_on_unknown_operators(tmpdir):
+    path = tmpdir.join('fiscal.parquet')
+    _write(path, ROWS)
+
+    with raises(ValueError):
+        list(read_dataset(str(path), filters=[('amount', 'like', 1)]))
+
+
+def test_abort_leaves_no_dataset(tmpdir):
+    path = tmpdir.join('fiscal.parquet')
+    writer = ParquetDatasetWriter(str(path), FIELDS, row_group_size=1)
+    writer.write(ROWS[0])
+    writer.abort()
+
+    assert tmpdir.listdir() == []
@@ -0,0 +1,66 @@
+"""Unit-tests for the `descriptions` module."""
+
+import os
+
+from unittest.mock import patch
+from pytest import fixture, raises
+from yaml.scanner import ScannerError
+from jsonschema import Draft4Validator
+
+from common import descriptions
+from common.descriptions import load_yaml, get_validation_errors
+
+
+@fixture
+def cache_file(tmpdir):
+    return str(tmpdir.join('cache', 'descriptions.sqlite'))
+
+
+# noinspection PyShadowingNames
+def test_load_yaml_only_parses_modified_files(tmpdir, cache_file):
+    path = tmpdir.join('source.description.yaml')
+    path.write('title: foo\nresources: [1, 2]\n')
+    with patch.object(descriptions.yaml, 'load',
+                      wraps=descriptions.yaml.load) as parse:
+        assert load_yaml(str(path), cache_file) == {'title': 'foo',
+                                                    'resources': [1, 2]}
+        assert load_yaml(str(path), cache_file)['title'] == 'foo'
+        os.utime(str(path), (0, 0))
+        assert load_yaml(str(path), cache_file)['title'] == 'foo'
+        assert parse.call_count == 1
+
+        path.write('title: bar\n')
+        assert load_yaml(str(path), cache_file) == {'title': 'bar'}
+        assert parse.call_count == 2
+
+
+# noinspection PyShadowingNames
+def test_load_yaml_returns_a_fresh_copy(tmpdir, cache_file):
+    path = tmpdir.join('pipeline-spec.yaml')
+    path.write('pipeline: []\n')
+    load_yaml(str(path), cache_file)['pipeline'].append('foo')
+    assert load_yaml(str(path), cache_file) == {'pipeline': []}
+
+
+# noinspection PyShadowingNames
+def test_load_yaml_raises_parsing_errors(tmpdir, cache_file):
+    path = tmpdir.join('broken.yaml')
+    path.write('title: foo\n\tbar: [\n')
+    with raises(ScannerError):
+        load_yaml(str(path), cache_file)
+
+
+# noinspection PyShadowingNames
+def test_get_validation_errors_is_cached(tmpdir, cache_file):
+    schema_file = tmpdir.join('schema.json')
+    schema_file.write('{}')
+    validator = Draft4Validator({'required': ['title']})
+    with patch.object(validator, 'iter_errors',
+                      wraps=validator.iter_errors) as validate:
+        for _ in range(2):
+            errors = get_validation_errors({'foo': 1}, validator,
+                                           str(schema_file), cache_file)
+            assert errors == ["'title' is a required property"]
+        assert get_validation_errors({'title': 1}, validator,
+                                     str(schema_file), cache_file) == []
+        assert validate.call_count == 2
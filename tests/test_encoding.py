@@ -0,0 +1,51 @@
+"""Unit-tests for the `encoding` module."""
+
+import json
+
+from pytest import fixture
+
+from common import encoding
+from common.encoding import detect_encoding, sample_file
+
+_TEXT = 'Begünstigter;Förderbetrag;Straße;Gemeinde Völkermarkt\n'
+
+
+@fixture
+def cache_file(tmpdir, monkeypatch):
+    cache_file_ = str(tmpdir.join('encodings.json'))
+    monkeypatch.setattr(encoding, 'CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(encoding, 'ENCODING_CACHE_FILE', cache_file_)
+    return cache_file_
+
+
+def test_sample_file_reads_small_files_entirely(tmpdir):
+    path = tmpdir.join('small.csv')
+    path.write_binary(_TEXT.encode('utf-8'))
+    assert sample_file(str(path)) == [_TEXT.encode('utf-8')]
+
+
+def test_sample_file_returns_prefix_and_chunks_of_large_files(tmpdir):
+    path = tmpdir.join('large.csv')
+    path.write_binary((_TEXT * 10000).encode('utf-8'))
+    samples = sample_file(str(path), prefix_size=100, chunk_size=200,
+                          nb_chunks=5)
+    assert len(samples) == 6
+    assert len(samples[0]) == 100
+    assert all(sample.startswith(_TEXT[:5].encode()) for sample in samples)
+
+
+# noinspection PyShadowingNames
+def test_detect_encoding_caches_the_result(tmpdir, cache_file):
+    path = tmpdir.join('utf8.csv')
+    path.write_binary((_TEXT * 100).encode('utf-8'))
+    detected = detect_encoding(str(path))
+    assert detected.lower() == 'utf-8'
+
+    with open(cache_file) as stream:
+        cache = json.load(stream)
+    assert list(cache.values()) == [detected]
+
+    cache = {key: 'cached encoding' for key in cache}
+    with open(cache_file, 'w') as stream:
+        json.dump(cache, stream)
+    assert detect_encoding(str(path)) == 'cached encoding'
@@ -0,0 +1,62 @@
+"""Unit-tests for the `geocodes` module."""
+
+from pytest import fixture
+
+from common.geocodes import GeocodeRegistry, get_registry, read_geocodes
+
+
+@fixture
+def registry():
+    return GeocodeRegistry(read_geocodes())
+
+
+# noinspection PyShadowingNames
+def test_registry_returns_the_first_line_of_duplicate_codes(registry):
+    first_lines = {}
+    for row in read_geocodes():
+        first_lines.setdefault(row['NUTS-Code'], row)
+
+    assert len(registry) == len(first_lines)
+    for code, row in first_lines.items():
+        assert registry.get(code) is not None
+        assert registry.describe(code) == row['Description']
+    assert registry.describe('XX') == 'NUTS LEVEL 1'
+    assert registry.describe('nonsense') is None
+
+
+# noinspection PyShadowingNames
+def test_search_returns_codes_by_prefix_and_level(registry):
+    assert registry.search('AT2', level=3) == ['AT211', 'AT212', 'AT213',
+                                               'AT221', 'AT222', 'AT223',
+                                               'AT224', 'AT225', 'AT226']
+    assert registry.search('AT', level=1) == ['AT1', 'AT2', 'AT3', 'ATZ']
+    assert 'AT' in registry.search('AT')
+    assert registry.search('nonsense') == []
+
+
+# noinspection PyShadowingNames
+def test_parents_resolves_the_chain_to_the_country(registry):
+    assert registry.parents('AT221') == ['AT22', 'AT2', 'AT']
+    assert registry.parents('AT') == []
+    assert registry.parents('nonsense') == []
+
+
+def test_get_registry_uses_the_snapshot(tmpdir):
+    path = tmpdir.join('geocodes.csv')
+    path.write_text('Code,Parent,NUTS-Code,Description\n'
+                    '1,,XX,Root\n'
+                    '2,1,AT,Österreich\n', encoding='utf-8')
+    cache_file = str(tmpdir.join('cache', 'geocodes.pickle'))
+
+    registry = get_registry(str(path), cache_file)
+    assert registry.describe('AT') == 'Österreich'
+    assert tmpdir.join('cache', 'geocodes.pickle').check()
+
+    get_registry.cache_clear()
+    assert get_registry(str(path), cache_file).rows == registry.rows
+
+    path.write_text('Code,Parent,NUTS-Code,Description\n'
+                    '1,,XX,Root\n', encoding='utf-8')
+    get_registry.cache_clear()
+    assert 'AT' not in get_registry(str(path), cache_file)
+    get_registry.cache_clear()
@@ -0,0 +1,80 @@
+"""Unit-tests for the `manifest` module."""
+
+from os import utime
+from unittest.mock import patch
+
+from common.manifest import Manifest, hash_input, read_segment, stat_input
+
+ROWS = [{'project_id': '1'}, {'project_id': '2'}]
+
+
+def _read(path):
+    return iter(ROWS)
+
+
+def test_hash_input_covers_folders(tmpdir):
+    folder = tmpdir.mkdir('fiscal.parquet')
+    folder.mkdir('a=1').join('part-0.parquet').write('foo')
+    hash_ = hash_input(str(folder))
+
+    folder.mkdir('a=2').join('part-0.parquet').write('foo')
+
+    assert hash_input(str(folder)) != hash_
+    assert stat_input(str(folder))[0] == 6
+
+
+def test_manifest_only_hashes_modified_inputs(tmpdir):
+    path = tmpdir.join('fiscal.datapackage.zip')
+    path.write('foo')
+    cache_dir = str(tmpdir.join('cache'))
+
+    manifest = Manifest(cache_dir, {}, {})
+    entry = manifest.add_input(str(path))
+    manifest.set_rows(entry, 2)
+    manifest.save()
+
+    with patch('common.manifest.hash_input') as hash_input_:
+        manifest = Manifest(cache_dir, {}, {})
+        assert manifest.add_input(str(path))['hash'] == entry['hash']
+        assert not hash_input_.called
+
+        utime(str(path), (0, 0))
+        Manifest(cache_dir, {}, {}).add_input(str(path))
+        assert hash_input_.called
+
+
+def test_read_segment_saves_and_reuses_rows(tmpdir):
+    path = tmpdir.join('fiscal.datapackage.zip')
+    path.write('foo')
+    cache_dir = str(tmpdir.join('cache'))
+    manifest = Manifest(cache_dir, {}, {})
+    entry = manifest.add_input(str(path))
+    assert not entry['reused']
+
+    assert list(read_segment(entry, _read, cache_dir)) == ROWS
+
+    entry = Manifest(cache_dir, {}, {}).add_input(str(path))
+    assert entry['reused']
+    assert list(read_segment(entry, None, cache_dir)) == ROWS
+
+
+def test_save_deletes_unused_segments(tmpdir):
+    path = tmpdir.join('fiscal.datapackage.zip')
+    path.write('foo')
+    cache_dir = tmpdir.join('cache')
+    manifest = Manifest(str(cache_dir), {}, {})
+    entry = manifest.add_input(str(path))
+    list(read_segment(entry, _read, str(cache_dir)))
+    manifest.set_rows(entry, 2)
+    manifest.save()
+
+    path.write('bar')
+    manifest = Manifest(str(cache_dir), {}, {})
+    entry = manifest.add_input(str(path))
+    list(read_segment(entry, _read, str(cache_dir)))
+    manifest.set_rows(entry, 2)
+    manifest.save()
+
+    segments = [name for name in cache_dir.listdir()
+                if name.basename.endswith('.segment')]
+    assert [segment.basename for segment in segments] == [entry['segment']]
@@ -0,0 +1,29 @@
+"""Unit-tests for the `parallel` module."""
+
+from pytest import raises
+
+from common.parallel import parallel_streams
+
+
+def _count_to(n):
+    for i in range(n):
+        yield {'n': n, 'i': i}
+
+
+def _fail_after(n):
+    for row in _count_to(n):
+        yield row
+    assert False, 'Failed after %s rows' % n
+
+
+def test_parallel_streams_preserve_the_order_of_rows_and_resources():
+    sizes = [2500, 0, 10, 1001]
+    resources = parallel_streams(_count_to, sizes, workers=2)
+    assert [list(resource) for resource in resources] == \
+        [list(_count_to(n)) for n in sizes]
+
+
+def test_parallel_streams_raise_worker_errors():
+    resources = parallel_streams(_fail_after, [5, 5], workers=2)
+    with raises(AssertionError):
+        list(resources[0])
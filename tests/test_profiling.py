@@ -0,0 +1,72 @@
+"""Unit-tests for the `profiling` module."""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from pytest import approx
+
+from common.profiling import HyperLogLog, SpaceSaving, TableProfile
+
+
+def test_hyperloglog_estimates_distinct_values():
+    for nb_values in (10, 1000, 50000):
+        sketch = HyperLogLog()
+        for i in range(nb_values):
+            sketch.add(i)
+            sketch.add(i)
+        assert sketch.count() == approx(nb_values, rel=0.05)
+
+    sketch = HyperLogLog()
+    for i in range(20000):
+        sketch.add('beneficiary %s' % (i % 3000))
+    assert sketch.count() == approx(3000, rel=0.05)
+
+
+def test_space_saving_finds_frequent_values():
+    # Values seen more than once per capacity are guaranteed to be kept
+    sketch = SpaceSaving(10)
+    for i in range(1000):
+        sketch.add('ERDF' if i % 2 else 'value %s' % i)
+        if i % 3 == 0:
+            sketch.add('ESF')
+
+    top = sketch.top(2)
+    assert [value for value, _ in top] == ['ERDF', 'ESF']
+    assert top[0][1] >= 500
+    assert len(sketch.counts) <= 20
+
+
+def test_table_profile_collects_column_statistics():
+    profile = TableProfile(top_k=2)
+    rows = [
+        {'amount': Decimal('10.5'), 'date': date(2015, 3, 1), 'fund': 'ESF'},
+        {'amount': Decimal(-2), 'date': None, 'fund': 'ERDF'},
+        {'amount': 7, 'date': date(2014, 1, 1), 'fund': 'ESF'},
+        {'amount': None, 'date': date(2016, 1, 1)},
+    ]
+    for row in rows:
+        profile.add(row)
+
+    assert profile.count_empty('fund') == 1
+    assert profile.count_empty('missing') == 4
+
+    fields = profile.to_dict()['fields']
+    assert fields['amount'] == {'empty': 1, 'empty_ratio': 0.25, 'distinct': 3,
+                                'min': -2, 'max': Decimal('10.5'),
+                                'sum': Decimal('15.5')}
+    assert fields['date']['first_date'] == date(2014, 1, 1)
+    assert fields['date']['last_date'] == date(2016, 1, 1)
+    assert fields['fund']['top'] == [('ESF', 2), ('ERDF', 1)]
+    assert fields['fund']['distinct'] == 2
+
+
+def test_table_profile_accepts_dates_and_datetimes_in_one_column():
+    profile = TableProfile()
+    for value in [datetime(2015, 3, 1, 12), date(2014, 1, 1),
+                  datetime(2016, 1, 1, 8, 30), date(2015, 6, 1)]:
+        profile.add({'date': value})
+
+    fields = profile.to_dict()['fields']
+    assert fields['date']['first_date'] == date(2014, 1, 1)
+    assert fields['date']['last_date'] == date(2016, 1, 1)
+    assert fields['date']['distinct'] == 4
@@ -0,0 +1,75 @@
+"""Unit-tests for the `rates` module."""
+
+from pytest import approx, fixture
+
+from common.rates import RateStore, open_rate_store, read_json_rates
+
+ECB_CSV = """Date,USD,PLN,SEK,
+2015-03-02,1.1189,4.1562,N/A,
+2015-02-03,1.1329,4.1740,9.4270,
+2015-02-02,1.1338,4.2015,9.4235,
+2015-01-05,1.1915,4.3006,9.4635,
+"""
+
+ECB_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<gesmes:Envelope xmlns:gesmes="http://www.gesmes.org/xml/2002-08-01"
+                 xmlns="http://www.ecb.int/vocabulary/2002-08-01/eurofxref">
+  <Cube>
+    <Cube time="2015-03-02"><Cube currency="PLN" rate="4.1562"/></Cube>
+    <Cube time="2015-02-03"><Cube currency="PLN" rate="4.1740"/></Cube>
+    <Cube time="2015-02-02"><Cube currency="PLN" rate="4.2015"/></Cube>
+    <Cube time="2015-01-05"><Cube currency="PLN" rate="4.3006"/></Cube>
+  </Cube>
+</gesmes:Envelope>
+"""
+
+
+@fixture
+def store(tmpdir):
+    return RateStore(str(tmpdir.join('cache', 'rates.sqlite')))
+
+
+# noinspection PyShadowingNames
+def test_import_file_reads_the_first_rate_of_each_month(store, tmpdir):
+    for name, content in (('history.csv', ECB_CSV), ('history.xml', ECB_XML)):
+        path = tmpdir.join(name)
+        path.write(content)
+        assert store.import_file(str(path)) > 0
+        assert store.import_file(str(path)) == 0
+
+        assert store.get_rate('PLN', 2015, 2) == approx(1 / 4.2015)
+        assert store.get_rate('PLN', 2015, 3) == approx(1 / 4.1562)
+        assert store.get_rate('PLN', 2015, 4) is None
+
+    assert store.get_currencies() == ['PLN', 'SEK', 'USD']
+    assert store.get_rate('SEK', 2015, 3) is None
+
+
+# noinspection PyShadowingNames
+def test_get_range_interpolates_the_gaps(store):
+    store.import_rates([('PLN', 2014, 11, 0.2), ('PLN', 2015, 2, 0.26)])
+
+    assert store.get_range('PLN', (2014, 1), (2015, 12)) == [
+        ((2014, 11), 0.2), ((2015, 2), 0.26)
+    ]
+    assert store.get_range('PLN', (2014, 12), (2015, 6), interpolate=True) == [
+        ((2014, 12), approx(0.22)),
+        ((2015, 1), approx(0.24)),
+        ((2015, 2), 0.26),
+    ]
+    assert store.get_rate('PLN', 2015, 1, interpolate=True) == approx(0.24)
+    assert store.get_rate('PLN', 2015, 3, interpolate=True) is None
+    assert len(store.get_rates(interpolate=True)) == 4
+
+
+def test_open_rate_store_seeds_without_replacing_rates(tmpdir):
+    path = str(tmpdir.join('rates.sqlite'))
+    currency, year, month, rate = next(read_json_rates())
+
+    store = RateStore(path)
+    store.import_rates([(currency, year, month, 42.0)])
+    store.close()
+
+    store = open_rate_store(path)
+    assert store.get_rate(currency, year, month) == 42.0
+    assert len(store.get_rates()) == len(list(read_json_rates()))
@@ -0,0 +1,68 @@
+"""Unit-tests for the `renaming` module."""
+
+from common.renaming import compile_renamer, get_field_aliases, rename_rows
+
+
+def test_compile_renamer_renames_drops_and_keeps_keys():
+    rename = compile_renamer(['a', 'b', 'c'], {'a': 'x', 'b': None})
+    assert rename({'a': 1, 'b': 2, 'c': 3}) == {'x': 1, 'c': 3}
+
+    rename = compile_renamer(['a', 'b', 'c'], {'a': 'x'}, keep_others=False)
+    assert rename({'a': 1, 'b': 2, 'c': 3}) == {'x': 1}
+
+    rename = compile_renamer(['c'], {'c': 'c'}, keep_others=False)
+    assert rename({'c': 3}) == {'c': 3}
+
+    rename = compile_renamer(['c'], {}, keep_others=False)
+    assert rename({'c': 3}) == {}
+
+
+def test_compile_renamer_follows_the_template_order():
+    template = dict.fromkeys(['z', 'x', 'y'])
+    rename = compile_renamer(['a', 'y'], {'a': 'x'}, template=template)
+    new_row = rename({'a': 1, 'y': 2})
+
+    assert list(new_row.items()) == [('z', None), ('x', 1), ('y', 2)]
+    assert template == dict.fromkeys(['z', 'x', 'y'])
+
+
+def test_compile_renamer_keeps_the_last_alias_that_is_not_none():
+    rename = compile_renamer(['a', 'b', 'c'], {'a': 'x', 'b': 'x', 'c': 'x'},
+                             template={'x': None})
+    assert rename({'a': 1, 'b': 2, 'c': None}) == {'x': 2}
+    assert rename({'a': None, 'b': None, 'c': None}) == {'x': None}
+
+
+def test_rename_rows_compiles_the_plan_again_for_ragged_rows():
+    rows = [{'a': 1, 'b': 2}, {'a': 3}, {'b': 4, 'c': 5}]
+    assert list(rename_rows(rows, {'a': 'x'})) == [
+        {'x': 1, 'b': 2},
+        {'x': 3},
+        {'b': 4, 'c': 5},
+    ]
+    assert list(rename_rows([], {'a': 'x'})) == []
+
+
+def test_rename_rows_keeps_the_extra_keys_of_later_rows():
+    rows = [{'a': 1}, {'a': 2, 'b': 3}]
+    assert list(rename_rows(rows, {'a': 'A'})) == [{'A': 1}, {'A': 2, 'b': 3}]
+
+    rows = [{'a': 1, 'c': 0}, {'a': 2, 'b': 3}]
+    assert list(rename_rows(rows, {'a': 'A', 'b': 'B'}, keep_others=False)) \
+        == [{'A': 1}, {'A': 2, 'B': 3}]
+
+
+def test_get_field_aliases_collects_the_raw_names():
+    resources = [
+        {'schema': {'fields': [{'name': 'Betrag', 'maps_to': 'amount'},
+                               {'name': 'amount', 'maps_to': 'amount'},
+                               {'name': 'Notiz', 'maps_to': '_ignored'}]}},
+        {'schema': {'fields': [{'name': 'Betrag', 'maps_to': 'amount'},
+                               {'name': 'Summe', 'maps_to': 'amount'},
+                               {'name': 'Datum'}]}},
+        {'schema': None},
+    ]
+    assert get_field_aliases(resources, ['amount', 'date']) == {
+        'amount': ['Betrag', 'Summe'],
+        'date': [],
+    }
@@ -10,6 +10,9 @@ from common.row_processor import (
     _override_parameters,
     _get_sample_rows,
     process,
+    process_blocks,
+    rows_to_block,
+    block_to_rows,
     _check_parameters)
 
 
@@ -137,3 +140,53 @@ def test__process__collects_expected_statistics():
 
     for i in range(50, 100):
         assert stats[0][i] is None
+
+
+# Test the columnar (block) mode
+# -----------------------------------------------------------------------------
+
+
+def test__rows_to_block__pads_heterogeneous_rows():
+    block = rows_to_block([{'foo': 1, 'bar': 2}, {'foo': 3, 'baz': 4}])
+    assert block == {'foo': [1, 3], 'bar': [2, None], 'baz': [None, 4]}
+
+
+def test__block_to_rows__is_the_inverse_of_rows_to_block():
+    rows = [{'foo': i, 'bar': str(i)} for i in range(0, 5)]
+    assert list(block_to_rows(rows_to_block(rows), len(rows))) == rows
+
+
+def _cast_block_to_float(block):
+    report = {}
+    for i, value in enumerate(block['foo']):
+        try:
+            block['foo'][i] = float(value)
+        except TypeError:
+            report[i] = value
+    block['bar'] = ['constant'] * len(block['foo'])
+    return block, report or '_pass'
+
+
+def test__process_blocks__returns_rows_and_statistics():
+    rows = [{'foo': i} for i in range(0, 50)] + [{'foo': None}] * 50
+    new_resources, stats = process_blocks([rows], _cast_block_to_float,
+                                          block_size=7)
+    new_rows = list(next(new_resources))
+
+    assert len(new_rows) == 100
+    assert new_rows[49] == {'foo': 49.0, 'bar': 'constant'}
+    assert sorted(stats[0]) == list(range(50, 100))
+
+
+def test__process_blocks__keeps_ragged_rows_apart():
+    rows = [{'foo': 1}, {'foo': 2}, {'foo': 3, 'baz': 4}, {'foo': 5}]
+    keys = []
+
+    def record_keys(block):
+        keys.append(sorted(block))
+        return block, '_pass'
+
+    new_resources, _ = process_blocks([rows], record_keys, block_size=7)
+
+    assert list(next(new_resources)) == rows
+    assert keys == [['foo'], ['baz', 'foo'], ['foo']]
@@ -0,0 +1,206 @@
+"""Unit-tests for the fused pipeline runner."""
+
+from unittest.mock import patch
+
+from datapackage_pipelines.utilities.resources import PROP_STREAMING
+
+from common.runner import (
+    is_fused,
+    run_in_subprocess,
+    run_pipeline,
+    writes_files,
+    FUSED_STEPS,
+)
+from common.stages import get_stage_keys, has_snapshot
+
+
+def _datapackage():
+    return {
+        'name': 'dummy',
+        'resources': [
+            {
+                'name': 'dummy-resource-{}'.format(i),
+                'path': 'dummy-{}.csv'.format(i),
+                PROP_STREAMING: True,
+                'schema': {'fields': [
+                    {'name': 'foo', 'type': 'string'},
+                    {'name': 'bar', 'type': 'string'},
+                ]}
+            }
+            for i in range(2)
+        ]
+    }
+
+
+def _resources():
+    return [
+        iter([{'foo': 'a', 'bar': '1'}, {'foo': 'b', 'bar': '2'}]),
+        iter([{'foo': 'c', 'bar': '3'}]),
+    ]
+
+
+def test_is_fused_returns_false_for_steps_without_a_row_function():
+    assert is_fused({'run': 'map_values'})
+    assert is_fused({'run': 'concatenate', 'parameters': {'fields': {}}})
+    assert not is_fused({'run': 'dump.to_zip'})
+    assert not is_fused({'run': 'concatenate',
+                         'parameters': {'sources': ['foo']}})
+
+
+def test_writes_files_follows_the_step_parameters():
+    assert writes_files({'run': 'currency_convert'})
+    assert writes_files({'run': 'validate_values'})
+    assert not writes_files({'run': 'validate_values',
+                             'parameters': {'profile-file': None}})
+    assert writes_files({'run': 'fingerprint_beneficiaries',
+                         'parameters': {'store': True}})
+    assert not writes_files({'run': 'fingerprint_beneficiaries',
+                             'parameters': {'store': False}})
+    assert not writes_files({'run': 'add_row_id'})
+
+
+def test_fused_concatenate_renames_aliases_and_fills_missing_fields():
+    parameters = {'fields': {'spam': ['foo'], 'eggs': []}}
+    step = FUSED_STEPS['concatenate']
+    datapackage, resources = step(parameters, _datapackage(), _resources())
+
+    assert len(datapackage['resources']) == 1
+    fields = datapackage['resources'][0]['schema']['fields']
+    assert [field['name'] for field in fields] == ['spam', 'eggs']
+    assert list(resources[0]) == [
+        {'spam': 'a', 'eggs': None},
+        {'spam': 'b', 'eggs': None},
+        {'spam': 'c', 'eggs': None},
+    ]
+
+
+def test_run_in_subprocess_streams_rows_through_the_processor(tmpdir):
+    step = {'run': 'concatenate_identical_resources'}
+    datapackage, resources = run_in_subprocess(step,
+                                               _datapackage(),
+                                               _resources(),
+                                               str(tmpdir))
+
+    assert len(datapackage['resources']) == 1
+    assert [row['foo'] for row in resources[0]] == ['a', 'b', 'c']
+
+
+def test_run_pipeline_chains_fused_and_subprocess_steps(tmpdir):
+    steps = [
+        {'run': 'concatenate_identical_resources', 'parameters': {}},
+        {'run': 'add_row_id', 'parameters': {'prefix': 'xx'}},
+        {'run': 'mutate_datapackage'},
+    ]
+    FUSED_STEPS['_dummy_source'] = lambda p, d, r: (_datapackage(), _resources())
+    try:
+        steps.insert(0, {'run': '_dummy_source'})
+        _, nb_rows = run_pipeline(steps, str(tmpdir))
+    finally:
+        del FUSED_STEPS['_dummy_source']
+
+    assert nb_rows == 3
+
+
+def test_run_pipeline_resumes_from_the_stage_cache(tmpdir):
+    calls = []
+
+    def source(parameters, datapackage, resources):
+        calls.append(parameters)
+        return _datapackage(), _resources()
+
+    steps = [
+        {'run': '_dummy_source', 'parameters': {}},
+        {'run': 'add_row_id', 'parameters': {'prefix': 'xx'}},
+    ]
+    cache_dir = str(tmpdir.join('stages'))
+    FUSED_STEPS['_dummy_source'] = source
+    try:
+        assert run_pipeline(steps, str(tmpdir), cache_dir, True)[1] == 3
+        assert run_pipeline(steps, str(tmpdir), cache_dir, True)[1] == 3
+        steps[1]['parameters']['prefix'] = 'yy'
+        assert run_pipeline(steps, str(tmpdir), cache_dir, True)[1] == 3
+    finally:
+        del FUSED_STEPS['_dummy_source']
+
+    assert len(calls) == 1
+    assert len(tmpdir.join('stages').listdir()) == 2
+
+
+@patch('common.runner.CACHED_SUBPROCESS_STEPS',
+       ['concatenate_identical_resources'])
+def test_run_pipeline_only_caches_the_deepest_step(tmpdir):
+    calls = []
+
+    def source(parameters, datapackage, resources):
+        calls.append(parameters)
+        return _datapackage(), _resources()
+
+    steps = [
+        {'run': '_dummy_source', 'parameters': {}},
+        {'run': 'concatenate_identical_resources', 'parameters': {}},
+        {'run': 'add_row_id', 'parameters': {'prefix': 'xx'}},
+        {'run': 'dump_to_parquet', 'parameters': {}},
+        {'run': 'mutate_datapackage'},
+    ]
+    cache_dir = str(tmpdir.join('stages'))
+    FUSED_STEPS['_dummy_source'] = source
+    try:
+        with patch('common.runner.dump_to_parquet.process',
+                   lambda datapackage, resources, *args: resources):
+            assert run_pipeline(steps, str(tmpdir), cache_dir)[1] == 3
+            assert run_pipeline(steps, str(tmpdir), cache_dir)[1] == 3
+    finally:
+        del FUSED_STEPS['_dummy_source']
+
+    keys = get_stage_keys(steps[:3], str(tmpdir))
+    assert len(calls) == 1
+    assert len(tmpdir.join('stages').listdir()) == 1
+    assert has_snapshot(cache_dir, keys[2])
+
+
+def test_run_in_subprocess_pulls_resources_lazily(tmpdir):
+    events = []
+
+    def process(resources):
+        try:
+            for resource in resources:
+                yield (events.append(row['foo']) or row for row in resource)
+        finally:
+            events.append('done')
+
+    step = {'run': 'concatenate_identical_resources'}
+    _, resources = run_in_subprocess(step,
+                                     _datapackage(),
+                                     process(_resources()),
+                                     str(tmpdir))
+
+    assert [row['foo'] for row in resources[0]] == ['a', 'b', 'c']
+    assert events == ['a', 'b', 'c', 'done']
+
+
+def test_run_pipeline_runs_the_steps_that_write_files_every_time(tmpdir):
+    calls = []
+
+    def source(parameters, datapackage, resources):
+        calls.append(parameters)
+        return _datapackage(), _resources()
+
+    profile_file = tmpdir.join('fiscal.profile.json')
+    steps = [
+        {'run': '_dummy_source', 'parameters': {}},
+        {'run': 'add_row_id', 'parameters': {'prefix': 'xx'}},
+        {'run': 'validate_values', 'parameters': {
+            'thresholds': {}, 'allowed_values': {},
+            'profile-file': str(profile_file)}},
+    ]
+    cache_dir = str(tmpdir.join('stages'))
+    FUSED_STEPS['_dummy_source'] = source
+    try:
+        assert run_pipeline(steps, str(tmpdir), cache_dir)[1] == 3
+        profile_file.remove()
+        assert run_pipeline(steps, str(tmpdir), cache_dir)[1] == 3
+    finally:
+        del FUSED_STEPS['_dummy_source']
+
+    assert len(calls) == 1
+    assert profile_file.check()
@@ -0,0 +1,76 @@
+"""Unit-tests for the `schema` module."""
+
+from pytest import raises
+from unittest.mock import patch
+
+from common import schema
+from common.schema import FiscalSchema, get_fiscal_schema, read_fiscal_schema
+
+SCHEMA = {'fields': [{'name': 'amount', 'osType': 'value', 'type': 'number'},
+                     {'name': 'date', 'osType': 'date:generic'},
+                     {'name': 'admin', 'osType': 'administrative-classification:generic:code'}]}
+MODEL = {'measures': {'amount': {'source': 'amount'}}}
+METADATA = {'name': 'fiscal'}
+
+
+def test_fiscal_schema_precomputes_lookups():
+    fiscal_schema = FiscalSchema(SCHEMA, MODEL, METADATA)
+
+    assert fiscal_schema.field_names == ('amount', 'date', 'admin')
+    assert fiscal_schema.field_set == {'amount', 'date', 'admin'}
+    assert fiscal_schema.index == {'amount': 0, 'date': 1, 'admin': 2}
+    assert fiscal_schema.get_property('osType')['date'] == 'date:generic'
+    assert fiscal_schema.os_types['amount'] == 'value'
+    assert fiscal_schema.types == {'amount': 'number'}
+    assert fiscal_schema.sort(['foo', 'admin', 'amount']) == ['amount', 'admin', 'foo']
+
+
+def test_fiscal_schema_returns_copies():
+    fiscal_schema = FiscalSchema(SCHEMA, MODEL, METADATA)
+    fiscal_schema.schema['fields'].pop()
+    fiscal_schema.model['measures'].clear()
+
+    assert len(fiscal_schema.schema['fields']) == 3
+    assert fiscal_schema.model == MODEL
+
+
+def test_fiscal_schema_raises_on_inconsistent_specifications():
+    with raises(ValueError):
+        FiscalSchema({'fields': SCHEMA['fields'] * 2}, MODEL, METADATA)
+    with raises(ValueError):
+        FiscalSchema(SCHEMA, {'measures': {'x': {'source': 'x'}}}, METADATA)
+
+
+def test_get_fiscal_schema_uses_the_snapshot(tmpdir):
+    cache_file = str(tmpdir.join('fiscal.schema.pickle'))
+    get_fiscal_schema.cache_clear()
+
+    with patch.object(schema, 'FISCAL_SCHEMA_CACHE_FILE', cache_file):
+        with patch.object(schema, 'read_fiscal_schema',
+                          wraps=read_fiscal_schema) as read:
+            fiscal_schema = get_fiscal_schema()
+            get_fiscal_schema.cache_clear()
+            assert get_fiscal_schema().field_names == fiscal_schema.field_names
+            assert read.call_count == 1
+
+    get_fiscal_schema.cache_clear()
+    assert tmpdir.join('fiscal.schema.pickle').check()
+
+
+def test_get_fiscal_schema_is_rebuilt_when_the_module_changes(tmpdir):
+    cache_file = str(tmpdir.join('fiscal.schema.pickle'))
+    module_file = tmpdir.join('schema.py')
+    module_file.write('old')
+    get_fiscal_schema.cache_clear()
+
+    with patch.object(schema, 'FISCAL_SCHEMA_CACHE_FILE', cache_file), \
+            patch.object(schema, '__file__', str(module_file)):
+        with patch.object(schema, 'read_fiscal_schema',
+                          wraps=read_fiscal_schema) as read:
+            get_fiscal_schema()
+            get_fiscal_schema.cache_clear()
+            module_file.write('new')
+            get_fiscal_schema()
+            assert read.call_count == 2
+
+    get_fiscal_schema.cache_clear()
@@ -0,0 +1,79 @@
+"""Unit-tests for the `stages` module."""
+
+from datetime import date
+from decimal import Decimal
+
+from common.stages import (
+    SnapshotWriter,
+    get_stage_keys,
+    has_snapshot,
+    load_snapshot,
+    prune_snapshots,
+)
+
+
+def _steps():
+    return [
+        {'run': 'add_row_id', 'parameters': {'prefix': 'xx'}},
+        {'run': 'validate_values', 'parameters': {'thresholds': {'foo': 5}}},
+    ]
+
+
+def test_get_stage_keys_only_changes_from_the_modified_step(tmpdir):
+    steps = _steps()
+    keys = get_stage_keys(steps, str(tmpdir))
+    assert get_stage_keys(steps, str(tmpdir)) == keys
+
+    steps[1]['parameters']['thresholds']['foo'] = 10
+    new_keys = get_stage_keys(steps, str(tmpdir))
+    assert new_keys[0] == keys[0]
+    assert new_keys[1] != keys[1]
+
+
+def test_get_stage_keys_depends_on_the_source_files(tmpdir):
+    tmpdir.join('source.csv').write('foo\n1\n')
+    steps = [{'run': 'read_description',
+              'parameters': {'datapackage': {
+                  'resources': [{'path': 'source.csv'}]}}}]
+    keys = get_stage_keys(steps, str(tmpdir))
+
+    tmpdir.join('source.csv').write('foo\n2\n')
+    assert get_stage_keys(steps, str(tmpdir)) != keys
+
+
+def test_snapshot_is_only_available_once_all_resources_are_consumed(tmpdir):
+    datapackage = {'resources': [{'name': 'spam'}, {'name': 'eggs'}]}
+    rows = [{'foo': Decimal('1.5'), 'bar': date(2000, 1, 1)},
+            {'foo': None, 'bar': None},
+            {'baz': 'different keys'}]
+
+    writer = SnapshotWriter(str(tmpdir), 'key', datapackage, chunk_size=1)
+    resources = list(writer.wrap([iter(rows), iter([])]))
+    assert list(resources[0]) == rows
+    assert not has_snapshot(str(tmpdir), 'key')
+    assert list(resources[1]) == []
+    assert has_snapshot(str(tmpdir), 'key')
+
+    cached_datapackage, cached_resources = load_snapshot(str(tmpdir), 'key')
+    assert cached_datapackage == datapackage
+    assert [list(resource) for resource in cached_resources] == [rows, []]
+
+
+def test_snapshot_rows_are_copied_before_downstream_changes(tmpdir):
+    datapackage = {'resources': [{'name': 'spam'}]}
+    writer = SnapshotWriter(str(tmpdir), 'key', datapackage)
+
+    for row in next(writer.wrap([iter([{'foo': 1}, {'foo': 2}])])):
+        row['foo'] = 'changed'
+
+    _, resources = load_snapshot(str(tmpdir), 'key')
+    assert list(resources[0]) == [{'foo': 1}, {'foo': 2}]
+
+
+def test_prune_snapshots_removes_stale_keys(tmpdir):
+    for key in ('old', 'new'):
+        SnapshotWriter(str(tmpdir), key, {'resources': []})
+
+    prune_snapshots(str(tmpdir), ['new'])
+    assert not has_snapshot(str(tmpdir), 'old')
+    assert has_snapshot(str(tmpdir), 'new')
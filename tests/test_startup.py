@@ -0,0 +1,90 @@
+"""Start-up time budget for processor modules.
+
+Each processor runs in its own process, once per pipeline step, so the time
+it takes to import adds up quickly. The budget only covers the processor's
+own imports: datapackage-pipelines is imported first and not counted.
+
+The budget is relative to the time it takes to import datapackage-pipelines
+(which every processor pays anyway), so that it holds on slow or loaded
+machines.
+
+"""
+
+import json
+import sys
+
+from os.path import isfile, join
+from subprocess import check_output
+
+from pytest import fixture, mark
+
+from common.config import PROCESSORS_DIR, ROOT_DIR
+from common.utilities import get_available_processors
+
+# A fraction of the import time of datapackage-pipelines
+STARTUP_BUDGET = 0.3
+HEAVY_MODULES = {'ijson', 'pandas', 'petl', 'pip', 'sqlalchemy', 'yaml'}
+
+# Import datapackage-pipelines once, then time each processor in a fork
+_TIMER = """
+import importlib, json, os, sys, time, traceback
+start = time.perf_counter()
+import datapackage_pipelines.wrapper
+timings = {'': {'seconds': time.perf_counter() - start}}
+for name in sys.argv[1:]:
+    read_end, write_end = os.pipe()
+    if os.fork() == 0:
+        try:
+            before = set(sys.modules)
+            start = time.perf_counter()
+            importlib.import_module('common.processors.' + name)
+            timing = {
+                'seconds': time.perf_counter() - start,
+                'modules': sorted({module.split('.')[0]
+                                   for module in set(sys.modules) - before})
+            }
+        except BaseException:
+            timing = {'error': traceback.format_exc()}
+        with os.fdopen(write_end, 'w') as stream:
+            json.dump(timing, stream)
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as stream:
+        timings[name] = json.loads(stream.read() or '{"error": "no output"}')
+    os.wait()
+print(json.dumps(timings))
+"""
+
+
+def _processors():
+    return [name
+            for name in sorted(get_available_processors())
+            if isfile(join(PROCESSORS_DIR, name + '.py'))]
+
+
+@fixture(scope='module')
+def timings():
+    """Return the best of three import timings for each processor.
+
+    The timing of datapackage-pipelines itself is under the empty name.
+
+    """
+
+    names = _processors()
+    runs = [json.loads(check_output([sys.executable, '-c', _TIMER] + names,
+                                    cwd=ROOT_DIR,
+                                    universal_newlines=True).splitlines()[-1])
+            for _ in range(3)]
+
+    return {name: min((run[name] for run in runs),
+                      key=lambda timing: timing.get('seconds', 0))
+            for name in [''] + names}
+
+
+# noinspection PyShadowingNames
+@mark.parametrize('name', _processors())
+def test_processor_imports_within_budget(name, timings):
+    timing = timings[name]
+    assert 'error' not in timing, timing['error']
+    assert not HEAVY_MODULES.intersection(timing['modules'])
+    assert timing['seconds'] < STARTUP_BUDGET * timings['']['seconds']
@@ -11,9 +11,12 @@ from common.utilities import (
     get_codelist,
     get_fiscal_datapackage,
     process,
+    close_after,
+    cached_property,
     get_nuts_codes,
     get_available_processors,
-    GEOCODES)
+    get_json_keys,
+    get_geocodes)
 
 
 def test_get_available_processors_returns_list_of_strings():
@@ -52,6 +55,20 @@ def test_process_returns_a_generator_of_generators():
     assert next(next(process([['foo']], lambda x: x))) == 'foo'
 
 
+def test_close_after_waits_for_the_last_row():
+    events = []
+    resources = close_after([iter([1, 2]), iter([3])],
+                            lambda: events.append('close'))
+    for resource in list(resources):
+        events.extend(resource)
+    assert events == [1, 2, 3, 'close']
+
+    events = []
+    for resource in close_after([iter([1])], lambda: events.append('close')):
+        events.extend(resource)
+    assert events == [1, 'close']
+
+
 def test_nuts_codes_in_data_tree_are_valid():
     nuts_codes = get_nuts_codes()
     for node in glob(DATA_DIR + '/*/*'):
@@ -67,6 +84,26 @@ def test_nuts_codes_in_data_tree_are_valid():
 
 
 def test_get_geocodes_returns_a_list_of_dicts():
-    assert isinstance(GEOCODES, list)
-    for line in GEOCODES:
+    geocodes = get_geocodes()
+    assert isinstance(geocodes, list)
+    for line in geocodes:
         assert isinstance(line, dict)
+
+
+def test_get_json_keys_returns_the_keys_of_all_rows(tmpdir):
+    path = tmpdir.join('rows.json')
+    path.write('[{"a": 1, "b": {"nested": 2}}, {"c": [{"d": null}]}, {}]')
+    assert get_json_keys(str(path)) == {'a', 'b', 'c'}
+
+
+def test_cached_property_computes_the_value_once():
+    calls = []
+
+    class Spam(object):
+        @cached_property
+        def eggs(self):
+            calls.append(self)
+            return len(calls)
+
+    spam = Spam()
+    assert (spam.eggs, spam.eggs, Spam().eggs) == (1, 1, 2)